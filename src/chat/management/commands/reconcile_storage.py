@@ -0,0 +1,58 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+from users.models import User
+from chat.models import ChatFile, ChatAudio, RoomStorage
+
+
+def expected_usage():
+    """
+    Returns the {(user_id, group_id, party_id): bytes} chat storage usage aggregated from the files themselves.
+    """
+    usage = defaultdict(int)
+    files = ChatFile.objects.values('user_id', 'group_id', 'party_id').annotate(
+        size=Sum(Coalesce('file_size', Value(0)) + Coalesce('preview_file_size', Value(0)))).order_by()
+    audios = ChatAudio.objects.values('user_id', 'group_id', 'party_id').annotate(
+        size=Sum(Coalesce('file_size', Value(0)))).order_by()
+    for row in list(files) + list(audios):
+        usage[(row['user_id'], row['group_id'], row['party_id'])] += row['size']
+    return usage
+
+
+class Command(BaseCommand):
+    help = 'Checks the RoomStorage ledger and the users\' chat_storage against the chat files and audios they are ' \
+           'derived from, and rewrites the drifted ones with --fix.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            usage = expected_usage()
+            rooms = {(user_id, group_id, party_id): storage for user_id, group_id, party_id, storage in
+                     RoomStorage.objects.select_for_update().values_list('user_id', 'group_id', 'party_id', 'storage')}
+            users = defaultdict(int)
+            for (user_id, group_id, party_id), size in usage.items():
+                users[user_id] += size
+            drifted_rooms = {key: usage.get(key, 0) for key in set(usage) | set(rooms)
+                             if (key[1] or key[2]) and usage.get(key, 0) != rooms.get(key, 0)}
+            drifted_users = {}
+            for user_id, chat_storage in User.objects.filter(id__in=users.keys()).values_list('id', 'chat_storage') \
+                    .union(User.objects.exclude(chat_storage=0).values_list('id', 'chat_storage')):
+                if users.get(user_id, 0) != chat_storage:
+                    drifted_users[user_id] = (chat_storage, users.get(user_id, 0))
+            for (user_id, group_id, party_id), size in drifted_rooms.items():
+                self.stdout.write('room user=%s group=%s party=%s: ledger %d, files %d' % (
+                    user_id, group_id, party_id, rooms.get((user_id, group_id, party_id), 0), size))
+            for user_id, (chat_storage, size) in drifted_users.items():
+                self.stdout.write('user %s: chat_storage %d, files %d' % (user_id, chat_storage, size))
+            if options['fix']:
+                for (user_id, group_id, party_id), size in drifted_rooms.items():
+                    RoomStorage.objects.update_or_create(user_id=user_id, group_id=group_id, party_id=party_id,
+                                                         defaults={'storage': size})
+                for user_id, (chat_storage, size) in drifted_users.items():
+                    User.objects.filter(id=user_id).update(chat_storage=size)
+        self.stdout.write('Found %d drifted rooms and %d drifted users%s' % (
+            len(drifted_rooms), len(drifted_users), ', fixed' if options['fix'] else ''))
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_auto_20240617_0603'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatfile',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='chat_chatfi_user_id_b08c86_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0020_group_storage'),
+        ('stick_protocol', '0001_migrations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0005_timeline_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomStorage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storage', models.BigIntegerField(default=0)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='room_storages', to='groups.group')),
+                ('party', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='room_storages', to='stick_protocol.party')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_storages', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='roomstorage',
+            constraint=models.UniqueConstraint(condition=models.Q(group__isnull=False), fields=('user', 'group'), name='unique_user_group_storage'),
+        ),
+        migrations.AddConstraint(
+            model_name='roomstorage',
+            constraint=models.UniqueConstraint(condition=models.Q(party__isnull=False), fields=('user', 'party'), name='unique_user_party_storage'),
+        ),
+    ]
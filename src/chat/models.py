@@ -1,15 +1,14 @@
 import os
-from django.db import models
+from collections import defaultdict
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
 from custom_storages import StaticStorage
 from django.core.files.storage import FileSystemStorage
-from sticknet.settings import DEBUG, TESTING
+from sticknet.settings import DEBUG
 from django.contrib.auth import get_user_model
 from groups.models import Group, Cipher
 from stick_protocol.models import Party
-if not TESTING:
-    from custom_storages import S3
-else:
-    from mock_custom_storages import S3
+from jobs.tasks import enqueue_storage_deletes
 
 User = get_user_model()
 
@@ -30,11 +29,41 @@ class ChatAlbum(models.Model):
     auto_month = models.CharField(max_length=20, blank=True, null=True)
 
     def delete(self, using=None, keep_parents=False):
-        for file in self.chatfile_set.all():
-            file.delete()
+        ChatFile.objects.delete_files(self.chatfile_set.all(), update_albums=False)
         super(ChatAlbum, self).delete(using, keep_parents)
 
 
+class ChatFileManager(models.Manager):
+
+    def delete_files(self, files, update_albums=True):
+        """
+        Deletes the `files` queryset, frees their owners' chat storage, decrements their albums' counters and enqueues
+        the deletion of their storage objects in batches.
+        """
+        keys, freed = [], defaultdict(int)
+        photos, videos = defaultdict(int), defaultdict(int)
+        for user_id, group_id, party_id, album_id, uri_key, preview_uri_key, file_size, preview_file_size, duration \
+                in files.values_list('user_id', 'group_id', 'party_id', 'album_id', 'uri_key', 'preview_uri_key',
+                                     'file_size', 'preview_file_size', 'duration'):
+            if uri_key:
+                keys.append(uri_key)
+                freed[(user_id, group_id, party_id)] -= file_size or 0
+            if preview_uri_key:
+                keys.append(preview_uri_key)
+                freed[(user_id, group_id, party_id)] -= preview_file_size or 0
+            if album_id:
+                (photos if duration == 0 else videos)[album_id] += 1
+        with transaction.atomic():
+            RoomStorage.objects.add(freed)
+            if update_albums:
+                for album_id, count in photos.items():
+                    ChatAlbum.objects.filter(id=album_id).update(photos_count=F('photos_count') - count)
+                for album_id, count in videos.items():
+                    ChatAlbum.objects.filter(id=album_id).update(videos_count=F('videos_count') - count)
+            files.delete()
+            enqueue_storage_deletes(keys)
+
+
 class ChatFile(models.Model):
     uri_key = models.CharField(unique=True, blank=True, null=True, max_length=36)
     preview_uri_key = models.CharField(unique=True, blank=True, null=True, max_length=36)
@@ -56,21 +85,13 @@ class ChatFile(models.Model):
     stick_id = models.CharField(max_length=100)
     message_id = models.CharField(max_length=20, blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+    objects = ChatFileManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-timestamp', '-id'])]
 
     def delete(self, using=None, keep_parents=False):
-        if self.uri_key:
-            S3().delete_file(self.uri_key)
-            self.user.chat_storage -= self.file_size
-        if self.preview_uri_key:
-            S3().delete_file(self.preview_uri_key)
-            self.user.chat_storage -= self.preview_file_size
-        if self.album:
-            if self.duration == 0:
-                self.album.photos_count -= 1
-            else:
-                self.album.videos_count -= 1
-            self.album.save()
-        super(ChatFile, self).delete(using, keep_parents)
+        ChatFile.objects.delete_files(ChatFile.objects.filter(id=self.id))
 
 
 class ChatAudio(models.Model):
@@ -86,10 +107,55 @@ class ChatAudio(models.Model):
 
     def delete(self, using=None, keep_parents=False):
         if self.uri_key:
-            S3().delete_file(self.uri_key)
-            self.user.chat_storage -= self.file_size
+            enqueue_storage_deletes([self.uri_key])
+            RoomStorage.objects.add({(self.user_id, self.group_id, self.party_id): -(self.file_size or 0)})
         super(ChatAudio, self).delete(using, keep_parents)
 
+
+class RoomStorageManager(models.Manager):
+
+    def add(self, usage):
+        """
+        Applies a {(user_id, group_id, party_id): bytes} dict of chat storage deltas to the ledger and to the users'
+        chat_storage. Every change is an F() increment, so concurrent uploads and deletes never overwrite each other.
+        """
+        users = defaultdict(int)
+        for (user_id, group_id, party_id), size in usage.items():
+            if not size:
+                continue
+            users[user_id] += size
+            if not group_id and not party_id:
+                continue
+            room = self.filter(user_id=user_id, group_id=group_id, party_id=party_id)
+            if not room.update(storage=F('storage') + size):
+                try:
+                    with transaction.atomic():
+                        self.create(user_id=user_id, group_id=group_id, party_id=party_id, storage=size)
+                except IntegrityError:
+                    room.update(storage=F('storage') + size)
+        for user_id, size in users.items():
+            User.objects.filter(id=user_id).update(chat_storage=F('chat_storage') + size)
+
+
+class RoomStorage(models.Model):
+    """
+    The bytes of chat files and audios a user has uploaded to a group or a party. Kept up to date by
+    RoomStorage.objects.add, and checked against the files themselves by the `reconcile_storage` command.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='room_storages')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='room_storages', blank=True, null=True)
+    party = models.ForeignKey(Party, on_delete=models.CASCADE, related_name='room_storages', blank=True, null=True)
+    storage = models.BigIntegerField(default=0)
+    objects = RoomStorageManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'group'], condition=Q(group__isnull=False),
+                                    name='unique_user_group_storage'),
+            models.UniqueConstraint(fields=['user', 'party'], condition=Q(party__isnull=False),
+                                    name='unique_user_party_storage'),
+        ]
+
 #####
 
 fs = FileSystemStorage(location='../media/', base_url='/media/')
@@ -9,13 +9,15 @@ else:
 
 from .models import ChatFile, ChatAlbum, ChatAudio
 from groups.serializers import CipherSerializer
+from sticknet.presigned_fields import PresignedUrlsMixin, PresignedListSerializer
 
-class ChatFileSerializer(serializers.ModelSerializer):
+class ChatFileSerializer(PresignedUrlsMixin, serializers.ModelSerializer):
     presigned_url = serializers.SerializerMethodField()
     preview_presigned_url = serializers.SerializerMethodField()
     class Meta:
         model = ChatFile
         fields = '__all__'
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
     def setup_eager_loading(queryset):
@@ -23,18 +25,17 @@ class ChatFileSerializer(serializers.ModelSerializer):
         return queryset
 
     def get_presigned_url(self, object):
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
     def get_preview_presigned_url(self, object):
-        if not object.preview_uri_key:
-            return None
-        return S3().get_file(object.preview_uri_key)
+        return self.presigned_url(object.preview_uri_key)
 
-class ChatAudioSerializer(serializers.ModelSerializer):
+class ChatAudioSerializer(PresignedUrlsMixin, serializers.ModelSerializer):
     presigned_url = serializers.SerializerMethodField()
     class Meta:
         model = ChatAudio
         fields = '__all__'
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
     def setup_eager_loading(queryset):
@@ -42,17 +43,23 @@ class ChatAudioSerializer(serializers.ModelSerializer):
         return queryset
 
     def get_presigned_url(self, object):
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
 
-def get_album_cover(album):
-    cover = ChatFile.objects.filter(album=album).last()
+def get_album_cover(album, cover=None):
+    """
+    Returns the cover of `album`, its latest file. Pass `cover` when the latest file is already in memory, e.g. the
+    last file of a batch that was just uploaded to the album.
+    """
+    if cover is None:
+        cover = ChatFile.objects.filter(album=album).last()
     if cover:
+        urls = S3().get_files([cover.uri_key, cover.preview_uri_key])
         return {
             'uri_key': cover.uri_key,
             'preview_uri_key': cover.preview_uri_key,
-            'presigned_url': S3().get_file(cover.uri_key),
-            'preview_presigned_url': S3().get_file(cover.preview_uri_key),
+            'presigned_url': urls.get(cover.uri_key),
+            'preview_presigned_url': urls.get(cover.preview_uri_key),
             'type': cover.type,
             'file_size': cover.file_size,
             'preview_file_size': cover.preview_file_size,
@@ -62,7 +69,7 @@ def get_album_cover(album):
             'stick_id': cover.stick_id,
             'party_id': cover.party_id,
             'name': cover.name,
-            'user': cover.user.id
+            'user': cover.user_id
         }
     return None
 
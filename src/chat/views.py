@@ -1,7 +1,8 @@
 import json
+from collections import defaultdict
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import ChatFile, ChatAlbum, ChatAudio
+from .models import ChatFile, ChatAlbum, ChatAudio, RoomStorage
 from .serializers import ChatAlbumSerializer, \
     ChatAudioSerializer
 from rest_framework import permissions, generics, status
@@ -9,8 +10,10 @@ from rest_framework import permissions, generics, status
 from groups.models import Group, Cipher
 from stick_protocol.models import Party
 from .serializers import ChatFileSerializer, get_album_cover
-from django.db.models import Q
-from photos.pagination import DynamicPagination
+from django.db import transaction
+from django.db.models import Q, F
+from photos.pagination import DynamicPagination, TimelinePagination
+from sticknet.projection import ProjectedListMixin
 from django.utils import timezone
 from vault.views import trim_file_name
 
@@ -44,38 +47,46 @@ class UploadChatFiles(APIView):
                 album = ChatAlbum.objects.create(group=group,
                                                  party=party,
                                                  auto_month=curr_month)
-        for i in range(len(files)):
-            file = files[i]
-            name = trim_file_name(file['name'])
-            fileObject = ChatFile.objects.create(uri_key=file['uri_key'],
-                                                 cipher=file['cipher'],
-                                                 file_size=file['file_size'],
-                                                 name=name,
-                                                 type=file['type'],
-                                                 duration=file['duration'],
-                                                 created_at=file['created_at'],
-                                                 stick_id=request.data['stick_id'],
-                                                 message_id=request.data['message_id'],
-                                                 party=party,
-                                                 user=request.user,
-                                                 group=group,
-                                                 album=album)
-            if album:
-                if fileObject.duration == 0:
-                    album.photos_count += 1
-                else:
-                    album.videos_count += 1
-                album.save()
-            if i == len(files) - 1:
-                fileObject.is_album_cover = True
+        chat_files = []
+        uploaded_size = 0
+        photos_count, videos_count = 0, 0
+        for file in files:
+            fileObject = ChatFile(uri_key=file['uri_key'],
+                                  cipher=file['cipher'],
+                                  file_size=file['file_size'],
+                                  name=trim_file_name(file['name']),
+                                  type=file['type'],
+                                  duration=file['duration'],
+                                  created_at=file['created_at'],
+                                  stick_id=request.data['stick_id'],
+                                  message_id=request.data['message_id'],
+                                  party=party,
+                                  user=request.user,
+                                  group=group,
+                                  album=album)
             if 'preview_uri_key' in file:
                 fileObject.preview_uri_key = file['preview_uri_key']
                 fileObject.preview_cipher = file['preview_cipher']
                 fileObject.preview_file_size = file['preview_file_size']
                 fileObject.width = file['width']
                 fileObject.height = file['height']
-                fileObject.save()
-
+                uploaded_size += file['preview_file_size']
+            if fileObject.duration == 0:
+                photos_count += 1
+            else:
+                videos_count += 1
+            uploaded_size += file['file_size']
+            chat_files.append(fileObject)
+        if chat_files:
+            chat_files[-1].is_album_cover = True
+        with transaction.atomic():
+            ChatFile.objects.bulk_create(chat_files)
+            if album:
+                ChatAlbum.objects.filter(id=album.id).update(photos_count=F('photos_count') + photos_count,
+                                                             videos_count=F('videos_count') + videos_count)
+                album.refresh_from_db(fields=['photos_count', 'videos_count'])
+            RoomStorage.objects.add({(request.user.id, group and group.id, party and party.id): uploaded_size})
+        for file, fileObject in zip(files, chat_files):
             item = {'id': fileObject.id,
                     'uri_key': file['uri_key'],
                     'cipher': file['cipher'],
@@ -85,7 +96,7 @@ class UploadChatFiles(APIView):
                     'duration': file['duration'],
                     'created_at': file['created_at'],
                     'timestamp': fileObject.timestamp,
-                    'user': fileObject.user.id,
+                    'user': request.user.id,
                     'messageId': request.data['message_id']}
             if 'timestamp' in file:
                 item['client_timestamp'] = file['timestamp']
@@ -96,15 +107,11 @@ class UploadChatFiles(APIView):
                 item['width'] = file['width']
                 item['height'] = file['height']
             filesList.append(item)
-            request.user.chat_storage += file['file_size']
-            if 'preview_uri_key' in file:
-                request.user.chat_storage += file['preview_file_size']
-        request.user.save()
         response['files'] = filesList
         if album:
             response['album'] = {'id': album.id,
                                  'timestamp': album.timestamp,
-                                 'cover': get_album_cover(album),
+                                 'cover': get_album_cover(album, chat_files[-1] if chat_files else None),
                                  'photos_count': album.photos_count,
                                  'videos_count': album.videos_count,
                                  'auto_month': album.auto_month}
@@ -136,8 +143,7 @@ class UploadChatAudio(APIView):
                 'file_size': audio['file_size'],
                 'duration': audio['duration'],
                 'timestamp': audioObject.timestamp}
-        request.user.chat_storage += audio['file_size']
-        request.user.save()
+        RoomStorage.objects.add({(request.user.id, group and group.id, party and party.id): audio['file_size']})
         return Response({'audio': item})
 
 
@@ -204,7 +210,7 @@ class FetchSingleChatAlbum(generics.GenericAPIView):
         })
 
 
-class FetchAlbumPhotos(generics.ListAPIView):
+class FetchAlbumPhotos(ProjectedListMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ChatFileSerializer
     pagination_class = DynamicPagination
@@ -226,22 +232,29 @@ class DeleteChatFiles(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        files = ChatFile.objects.filter(id__in=request.data['ids'])
+        selected, ids = defaultdict(list), []
+        for id, album_id in ChatFile.objects.filter(id__in=request.data['ids'], user=request.user) \
+                .values_list('id', 'album_id'):
+            if album_id:
+                selected[album_id].append(id)
+            else:
+                ids.append(id)
         album_timestamp = None
         is_album_deleted = False
         re_fetch_cover = True
         album = None
         cover = None
-        for file in files:
-            if file.user == request.user:
-                album_timestamp = file.album.timestamp
-                if file.album and file.album.photos_count == 1:
-                    is_album_deleted = True
-                    re_fetch_cover = False
-                    file.album.delete()
-                else:
-                    album = file.album
-                    file.delete()
+        for album_id, selected_album in ChatAlbum.objects.in_bulk(selected).items():
+            album_timestamp = selected_album.timestamp
+            # An album is deleted with its last files, rather than left empty.
+            if len(selected[album_id]) >= selected_album.photos_count + selected_album.videos_count:
+                is_album_deleted = True
+                re_fetch_cover = False
+                selected_album.delete()
+            else:
+                album = selected_album
+                ids += selected[album_id]
+        ChatFile.objects.delete_files(ChatFile.objects.filter(id__in=ids))
         if re_fetch_cover:
             cover = get_album_cover(album)
         return Response({'album_timestamp': album_timestamp,
@@ -282,34 +295,28 @@ class DeleteChatAlbum(APIView):
             album.delete()
         return Response(status=status.HTTP_200_OK)
 
-def get_storage_usage(queryset, user):
-    total_storage = 0
-    chat_files = ChatFile.objects.filter(user=user, **queryset)
-    for chat_file in chat_files:
-        total_storage += chat_file.file_size
-        if chat_file.preview_file_size:
-            total_storage += chat_file.preview_file_size
-    chat_audios = ChatAudio.objects.filter(user=user, **queryset)
-    for chat_audio in chat_audios:
-        total_storage += chat_audio.file_size
-    return total_storage
-
 class FetchStorages(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        groups = user.groups.all()
-        parties = user.chat_parties()
-        group_storages = [{'id': group.id, 'storage': get_storage_usage({'group': group}, user)} for group in groups]
-        party_storages = [{'id': party.id, 'storage': get_storage_usage({'party': party}, user)} for party in parties]
+        groups, parties = {}, {}
+        for group_id, party_id, storage in user.room_storages.values_list('group_id', 'party_id', 'storage'):
+            if group_id:
+                groups[group_id] = storage
+            else:
+                parties[party_id] = storage
+        group_storages = [{'id': id, 'storage': groups.get(id, 0)}
+                          for id in user.groups.values_list('id', flat=True)]
+        party_storages = [{'id': id, 'storage': parties.get(id, 0)}
+                          for id in user.chat_parties().values_list('id', flat=True)]
         return Response({'group_storages': group_storages, 'party_storages': party_storages})
 
 
 class FetchRoomFiles(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ChatFileSerializer
-    pagination_class = DynamicPagination
+    pagination_class = TimelinePagination
 
     def get_queryset(self):
         room_id = self.request.GET.get("room_id")
@@ -0,0 +1,5 @@
+from .models import UserCounters, GroupCounters
+from sticknet.admin_site import admin_site
+
+admin_site.register(UserCounters)
+admin_site.register(GroupCounters)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CountersConfig(AppConfig):
+    name = 'counters'
+
+    def ready(self):
+        from . import signals
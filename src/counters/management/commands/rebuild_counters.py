@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from counters.models import UserCounters, GroupCounters
+
+
+class Command(BaseCommand):
+    help = 'Checks the user and group counters against the rows they count, and with --fix creates the missing ' \
+           'counters and recounts the drifted ones. Run it with --fix once after deploying the counters tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        for model in [UserCounters, GroupCounters]:
+            name = model._meta.pk.name
+            with transaction.atomic():
+                missing = model.objects.missing().count()
+                drifted = list(model.objects.drifted())
+                for counters in drifted:
+                    fields = []
+                    for field in model.sources():
+                        counted = getattr(counters, 'counted_' + field)
+                        if getattr(counters, field) != counted:
+                            fields.append('%s %d, counted %d' % (field, getattr(counters, field), counted))
+                    self.stdout.write('%s %s: %s' % (name, counters.pk, ', '.join(fields)))
+                if options['fix']:
+                    model.objects.rebuild()
+            self.stdout.write('Found %d missing and %d drifted %s counters%s' % (
+                missing, len(drifted), name, ', fixed' if options['fix'] else ''))
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('groups', '0020_group_storage'),
+        ('users', '0068_auto_20240617_0421'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupCounters',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='groups.group')),
+                ('members_count', models.IntegerField(default=0)),
+                ('shared_photos_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='users.user')),
+                ('groups_count', models.IntegerField(default=0)),
+                ('connections_count', models.IntegerField(default=0)),
+                ('images_count', models.IntegerField(default=0)),
+                ('profile_photos_count', models.IntegerField(default=0)),
+                ('photos_count', models.IntegerField(default=0)),
+                ('albums_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import OuterRef
+from sticknet.subqueries import count_subquery
+
+
+def backfill(apps, schema_editor):
+    """
+    Creates the counters of the users and groups that existed before the table and counts them from their sources, as
+    `CountersManager.rebuild` does with the current models.
+    """
+    User = apps.get_model('users', 'User')
+    Group = apps.get_model('groups', 'Group')
+    Image = apps.get_model('photos', 'Image')
+    Blob = apps.get_model('photos', 'Blob')
+    Album = apps.get_model('photos', 'Album')
+    tables = [
+        (apps.get_model('counters', 'UserCounters'), User, {
+            'groups_count': (User.groups.through.objects.all(), 'user'),
+            'connections_count': (User.connections.through.objects.all(), 'from_user'),
+            'images_count': (Image.objects.filter(group__isnull=False), 'user'),
+            'profile_photos_count': (Image.objects.filter(is_profile=True), 'user'),
+            'photos_count': (Blob.objects.all(), 'image__user'),
+            'albums_count': (Album.objects.all(), 'user'),
+        }),
+        (apps.get_model('counters', 'GroupCounters'), Group, {
+            'members_count': (User.groups.through.objects.all(), 'group'),
+            'shared_photos_count': (Image.groups.through.objects.filter(image__album__isnull=True), 'group'),
+        }),
+    ]
+    for model, owner, sources in tables:
+        ids = list(owner.objects.filter(counters__isnull=True).values_list('pk', flat=True))
+        for i in range(0, len(ids), 1000):
+            model.objects.bulk_create([model(pk=id) for id in ids[i:i + 1000]], ignore_conflicts=True)
+        model.objects.update(**{name: count_subquery(queryset.filter(**{field: OuterRef('pk')}), field)
+                                for name, (queryset, field) in sources.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counters', '0001_initial'),
+        ('photos', '0023_auto_20231130_1743'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
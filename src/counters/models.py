@@ -0,0 +1,110 @@
+from collections import Counter, defaultdict
+from django.db import models
+from django.db.models import F, OuterRef, Q
+from users.models import User
+from groups.models import Group
+from photos.models import Image, Blob, Album
+from sticknet.subqueries import count_subquery
+
+
+class CountersManager(models.Manager):
+    """
+    Manager of a counters table, whose primary key is its owner's. `sources()` on the model maps each counter to the
+    queryset it counts and the field of that queryset pointing at the owner.
+    """
+
+    def add(self, ids, **deltas):
+        """
+        F() increments the counters in `deltas` on the rows of `ids`, once for every time an id appears in it. Missing
+        rows (which `rebuild_counters` reports) are left alone.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        by_times = defaultdict(list)
+        for id, times in Counter(ids).items():
+            by_times[times].append(id)
+        for times, ids in by_times.items():
+            self.filter(pk__in=ids).update(**{name: F(name) + delta * times for name, delta in deltas.items()})
+
+    def counted(self):
+        """
+        Returns the expressions recounting every counter of a row from its sources.
+        """
+        return {name: count_subquery(queryset.filter(**{field: OuterRef('pk')}), field)
+                for name, (queryset, field) in self.model.sources().items()}
+
+    def drifted(self):
+        """
+        Returns the rows whose counters differ from their sources, annotated with the recounted values as
+        `counted_<name>`.
+        """
+        counted = {'counted_' + name: expression for name, expression in self.counted().items()}
+        drifted = Q()
+        for name in self.model.sources():
+            drifted |= ~Q(**{name: F('counted_' + name)})
+        return self.annotate(**counted).filter(drifted)
+
+    def missing(self):
+        owner = self.model._meta.pk.related_model
+        return owner.objects.filter(counters__isnull=True)
+
+    def rebuild(self):
+        """
+        Creates the missing rows and recounts the drifted ones, returns the number of rows created and rewritten.
+        """
+        created = 0
+        ids = list(self.missing().values_list('pk', flat=True))
+        for i in range(0, len(ids), 1000):
+            created += len(self.bulk_create([self.model(pk=id) for id in ids[i:i + 1000]], ignore_conflicts=True))
+        rewritten = self.filter(pk__in=self.drifted().values('pk')).update(**self.counted())
+        return created, rewritten
+
+
+class UserCounters(models.Model):
+    """
+    Denormalized counts shown on a user's profile. Kept current by the handlers in `counters.signals`, and checked
+    against their sources by the `rebuild_counters` command.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    groups_count = models.IntegerField(default=0)
+    connections_count = models.IntegerField(default=0)
+    images_count = models.IntegerField(default=0)
+    profile_photos_count = models.IntegerField(default=0)
+    photos_count = models.IntegerField(default=0)
+    albums_count = models.IntegerField(default=0)
+    objects = CountersManager()
+
+    @staticmethod
+    def sources():
+        return {
+            'groups_count': (User.groups.through.objects.all(), 'user'),
+            'connections_count': (User.connections.through.objects.all(), 'from_user'),
+            'images_count': (Image.objects.filter(group__isnull=False), 'user'),
+            'profile_photos_count': (Image.objects.filter(is_profile=True), 'user'),
+            'photos_count': (Blob.objects.all(), 'image__user'),
+            'albums_count': (Album.objects.all(), 'user'),
+        }
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class GroupCounters(models.Model):
+    """
+    Denormalized counts shown on a group, see UserCounters.
+    """
+    group = models.OneToOneField(Group, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    members_count = models.IntegerField(default=0)
+    shared_photos_count = models.IntegerField(default=0)
+    objects = CountersManager()
+
+    @staticmethod
+    def sources():
+        return {
+            'members_count': (User.groups.through.objects.all(), 'group'),
+            'shared_photos_count': (Image.groups.through.objects.filter(image__album__isnull=True), 'group'),
+        }
+
+    def __str__(self):
+        return str(self.group_id)
@@ -0,0 +1,153 @@
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from users.models import User
+from groups.models import Group
+from photos.models import Image, Blob, Album
+from .models import UserCounters, GroupCounters
+
+# Keeps UserCounters and GroupCounters current with F() increments. Rows removed by a cascade (or by deleting one side
+# of an m2m relation) send no signal of their own, so the owners' pre_delete handlers account for them.
+
+
+def changed_rows(sender, instance, action, reverse, pk_set, source, target, **kwargs):
+    """
+    Returns the sign and the (source_id, target_id) through rows an m2m_changed action adds (1) or removes (-1). Removed
+    rows are read in pre_remove/pre_clear while they still exist, since the remove pk_set may hold unrelated ids.
+    """
+    if reverse:
+        source, target = target, source
+    if action == 'post_add':
+        rows = [(instance.pk, pk) for pk in pk_set]
+        sign = 1
+    elif action in ('pre_remove', 'pre_clear'):
+        through = sender.objects.filter(**{source: instance.pk})
+        if pk_set is not None:
+            through = through.filter(**{target + '__in': pk_set})
+        rows = list(through.values_list(source, target))
+        sign = -1
+    else:
+        return 0, []
+    if reverse:
+        rows = [(source_id, target_id) for target_id, source_id in rows]
+    return sign, rows
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Group)
+def create_group_counters(sender, instance, created, **kwargs):
+    if created:
+        GroupCounters.objects.create(group=instance)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    GroupCounters.objects.filter(group__user=instance.pk).update(members_count=F('members_count') - 1)
+    UserCounters.objects.filter(user__connections=instance.pk).update(connections_count=F('connections_count') - 1)
+
+
+@receiver(pre_delete, sender=Group)
+def uncount_group(sender, instance, **kwargs):
+    UserCounters.objects.filter(user__groups=instance.pk).update(groups_count=F('groups_count') - 1)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def count_members(sender, **kwargs):
+    sign, rows = changed_rows(sender, source='user', target='group', **kwargs)
+    if rows:
+        UserCounters.objects.add([user_id for user_id, group_id in rows], groups_count=sign)
+        GroupCounters.objects.add([group_id for user_id, group_id in rows], members_count=sign)
+
+
+@receiver(m2m_changed, sender=User.connections.through)
+def count_connections(sender, **kwargs):
+    sign, rows = changed_rows(sender, source='from_user', target='to_user', **kwargs)
+    if rows:
+        UserCounters.objects.add([from_user_id for from_user_id, to_user_id in rows], connections_count=sign)
+
+
+@receiver(m2m_changed, sender=Image.groups.through)
+def count_shared_photos(sender, **kwargs):
+    sign, rows = changed_rows(sender, source='image', target='group', **kwargs)
+    if not rows:
+        return
+    if kwargs['reverse']:
+        shared = set(Image.objects.filter(id__in={image_id for image_id, group_id in rows}, album__isnull=True)
+                     .values_list('id', flat=True))
+    else:
+        shared = {kwargs['instance'].pk} if kwargs['instance'].album_id is None else set()
+    GroupCounters.objects.add([group_id for image_id, group_id in rows if image_id in shared],
+                              shared_photos_count=sign)
+
+
+def image_counts(fields):
+    """
+    Returns what an image with these field values adds to its owner's counters.
+    """
+    return {'images_count': int(fields.get('group_id') is not None),
+            'profile_photos_count': int(bool(fields.get('is_profile')))}
+
+
+@receiver(post_init, sender=Image)
+def remember_counted_fields(sender, instance, **kwargs):
+    # Read through __dict__ so deferred fields are not loaded one query per image.
+    fields = instance.__dict__
+    instance._counted_fields = {name: fields.get(name) for name in ('user_id', 'group_id', 'is_profile', 'album_id')}
+
+
+@receiver(post_save, sender=Image)
+def count_image(sender, instance, created, **kwargs):
+    old = instance._counted_fields
+    remember_counted_fields(sender, instance)
+    new = instance._counted_fields
+    if created:
+        UserCounters.objects.add([new['user_id']], **image_counts(new))
+        return
+    if (old['user_id'], image_counts(old)) != (new['user_id'], image_counts(new)):
+        UserCounters.objects.add([old['user_id']], **{name: -count for name, count in image_counts(old).items()})
+        UserCounters.objects.add([new['user_id']], **image_counts(new))
+    if (old['album_id'] is None) != (new['album_id'] is None):
+        GroupCounters.objects.add(instance.groups.values_list('id', flat=True),
+                                  shared_photos_count=1 if new['album_id'] is None else -1)
+
+
+@receiver(pre_delete, sender=Image)
+def uncount_shared_image(sender, instance, **kwargs):
+    if instance.album_id is None:
+        GroupCounters.objects.filter(group__shared_images=instance.pk).update(
+            shared_photos_count=F('shared_photos_count') - 1)
+
+
+@receiver(post_delete, sender=Image)
+def uncount_image(sender, instance, **kwargs):
+    UserCounters.objects.add([instance.user_id], **{name: -count for name, count in image_counts(
+        instance._counted_fields).items()})
+
+
+# Blobs are counted through their image's owner with a joined UPDATE. On a cascade the blobs are deleted before their
+# image, so the image row is still there when they are uncounted.
+@receiver(post_save, sender=Blob)
+def count_blob(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.filter(user__images=instance.image_id).update(photos_count=F('photos_count') + 1)
+
+
+@receiver(post_delete, sender=Blob)
+def uncount_blob(sender, instance, **kwargs):
+    UserCounters.objects.filter(user__images=instance.image_id).update(photos_count=F('photos_count') - 1)
+
+
+@receiver(post_save, sender=Album)
+def count_album(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.add([instance.user_id], albums_count=1)
+
+
+@receiver(post_delete, sender=Album)
+def uncount_album(sender, instance, **kwargs):
+    UserCounters.objects.add([instance.user_id], albums_count=-1)
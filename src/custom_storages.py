@@ -26,30 +26,84 @@ class MediaStorage(S3Boto3Storage):
 
 
 
-from django.conf import settings
+import threading
 import boto3
+import presigned_urls
 from botocore.config import Config
 
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide Storj S3 client. boto3 clients are thread-safe once created, so a single client is
+    lazily built per worker process and shared by every S3 instance instead of building one per call.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client('s3',
+                                       'eu1',
+                                       aws_access_key_id=os.environ['STORJ_ACCESS_KEY_ID'],
+                                       aws_secret_access_key=os.environ['STORJ_SECRET_ACCESS_KEY'],
+                                       endpoint_url=os.environ['STORJ_URL'],
+                                       config=Config(signature_version='s3v4'))
+    return _client
+
+
 class S3:
+    # The most keys a single delete_objects request accepts.
+    DELETE_BATCH_SIZE = 1000
+
     def __init__(self):
-        self.client = boto3.client('s3',
-                                   'eu1',
-                                   aws_access_key_id=os.environ['STORJ_ACCESS_KEY_ID'],
-                                   aws_secret_access_key=os.environ['STORJ_SECRET_ACCESS_KEY'],
-                                   endpoint_url=os.environ['STORJ_URL'],
-                                   config=Config(signature_version='s3v4'))
+        self.client = get_client()
+
+    def sign(self, keys, client_method, time=3600):
+        """
+        Presigns a batch of keys for the given client method in one call and returns a {key: url} dict.
+        Empty keys are skipped.
+        """
+        urls = {}
+        for key in keys:
+            if key and key not in urls:
+                urls[key] = self.client.generate_presigned_url(ClientMethod=client_method, ExpiresIn=time,
+                                                               Params={'Bucket': settings.STORJ_BUCKET_NAME,
+                                                                       'Key': key})
+        return urls
 
     def get_presigned_url(self, key, time=3600):
         return self.client.generate_presigned_url(ClientMethod='put_object', ExpiresIn=time,
                                                   Params={'Bucket': settings.STORJ_BUCKET_NAME, 'Key':  key})
 
+    def get_presigned_urls(self, keys, time=3600):
+        return self.sign(keys, 'put_object', time)
+
     def get_file(self, key, time=3600):
-        return self.client.generate_presigned_url(ClientMethod='get_object', ExpiresIn=time,
-                                                  Params={'Bucket': settings.STORJ_BUCKET_NAME, 'Key':  key})
+        return self.get_files([key], time).get(key)
+
+    def get_files(self, keys, time=3600):
+        return presigned_urls.get_urls(self, keys, 'get_object', time)
 
     def delete_file(self, key):
         return self.client.delete_object(Bucket=settings.STORJ_BUCKET_NAME, Key=key)
 
+    def delete_files(self, keys):
+        """
+        Deletes a batch of keys with one delete_objects request per DELETE_BATCH_SIZE keys and returns the keys that
+        failed to delete. Empty keys are skipped.
+        """
+        keys = list(dict.fromkeys(key for key in keys if key))
+        failed = []
+        for i in range(0, len(keys), self.DELETE_BATCH_SIZE):
+            response = self.client.delete_objects(Bucket=settings.STORJ_BUCKET_NAME,
+                                                  Delete={'Objects': [{'Key': key} for key in
+                                                                      keys[i:i + self.DELETE_BATCH_SIZE]],
+                                                          'Quiet': True})
+            failed += [error['Key'] for error in response.get('Errors', [])]
+        return failed
+
 ########################################################################################################################
 
 # # Usage example:
@@ -3,13 +3,9 @@ import uuid
 from django.db import models
 from django.contrib.auth import settings
 from django.db.models import Q
-from sticknet.settings import TESTING
-if not TESTING:
-    from custom_storages import S3
-else:
-    from mock_custom_storages import S3
-from sticknet.settings import DEBUG, DEFAULT_APP, FIREBASE_REF, FIREBASE_REF_DEV, TESTING
-from firebase_admin import db
+from sticknet.settings import DEBUG
+from jobs.queue import enqueue
+from jobs.tasks import enqueue_storage_deletes, delete_firebase_ref
 
 
 User = settings.AUTH_USER_MODEL
@@ -42,10 +38,7 @@ class GroupCover(models.Model):
     type = models.CharField(max_length=100, blank=True, null=True)
 
     def delete(self, using=None, keep_parents=False):
-        if self.uri_key:
-            S3().delete_file(self.uri_key)
-        if self.preview_uri_key:
-            S3().delete_file(self.preview_uri_key)
+        enqueue_storage_deletes([self.uri_key, self.preview_uri_key])
         super(GroupCover, self).delete(using, keep_parents)
 
 class GroupManager(models.Manager):
@@ -73,9 +66,7 @@ class Group(models.Model):
     objects = GroupManager()
 
     def delete(self, using=None, keep_parents=False):
-        if not TESTING:
-            firebase_ref = FIREBASE_REF_DEV if DEBUG else FIREBASE_REF
-            db.reference('rooms/' + str(self.id), DEFAULT_APP, firebase_ref).delete()
+        enqueue(delete_firebase_ref, 'rooms/' + str(self.id))
         if self.cover:
             self.cover.delete()
         super(Group, self).delete(using, keep_parents)
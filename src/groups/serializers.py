@@ -1,11 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Prefetch
 from rest_framework import serializers
 
 from .models import Group, GroupCover, TempDisplayName, Cipher, GroupRequest
 from sticknet.dynamic_fields import DynamicFieldsModelSerializer
+from sticknet.presigned_fields import PresignedUrlsMixin, PresignedListSerializer
 from stick_protocol.models import EncryptionSenderKey
 from photos.models import Image
-from custom_storages import S3
+from sticknet.subqueries import count_subquery
 
 User = get_user_model()
 
@@ -25,7 +27,7 @@ class CipherSerializer(serializers.ModelSerializer):
         return obj.user.name
 
 
-class GroupCoverSerializer(serializers.ModelSerializer):
+class GroupCoverSerializer(PresignedUrlsMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     presigned_url = serializers.SerializerMethodField()
     preview_presigned_url = serializers.SerializerMethodField()
@@ -45,17 +47,13 @@ class GroupCoverSerializer(serializers.ModelSerializer):
         return {"id": obj.user.id, "name": obj.user.name}
 
     def get_presigned_url(self, object):
-        if not object.uri_key:
-            return None
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
     def get_preview_presigned_url(self, object):
-        if not object.preview_uri_key:
-            return None
-        return S3().get_file(object.preview_uri_key)
+        return self.presigned_url(object.preview_uri_key)
 
 
-class GroupSerializer(DynamicFieldsModelSerializer):
+class GroupSerializer(PresignedUrlsMixin, DynamicFieldsModelSerializer):
     cover = GroupCoverSerializer(read_only=True)
     cover_id = serializers.PrimaryKeyRelatedField(queryset=GroupCover.objects.all(), write_only=True, required=False)
     admin_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), write_only=True, required=False)
@@ -98,11 +96,30 @@ class GroupSerializer(DynamicFieldsModelSerializer):
             'last_activity'
         ]
         extra_kwargs = {'chat_id': {'read_only': True}}
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
-    def setup_eager_loading(queryset):
-        queryset = queryset.select_related('cover', 'display_name', 'status', 'link')
-        return queryset
+    def setup_eager_loading(queryset, user=None):
+        """
+        Pass the requesting `user` to also batch the fields that depend on them. The members, invited members and
+        admins of all the groups are then prefetched with one query each, and the requesting user's temporary display
+        names, admin rights and the requests counts are annotated, so a page of groups costs a constant number of
+        queries.
+        """
+        queryset = queryset.select_related('cover__user', 'display_name__user', 'status__user', 'link__user',
+                                           'counters')
+        if user is None:
+            return queryset
+        members = User.objects.only('id', 'one_time_id')
+        return queryset.prefetch_related(
+            Prefetch('user_set', queryset=members.filter(is_active=True, finished_registration=True),
+                     to_attr='active_members'),
+            Prefetch('invited_members', queryset=members.filter(is_active=True), to_attr='active_invited_members'),
+            Prefetch('admins', queryset=User.objects.only('id')),
+            Prefetch('tempdisplayname_set', queryset=TempDisplayName.objects.filter(to_user=user).order_by('id'),
+                     to_attr='user_temp_display_names')) \
+            .annotate(is_admin=Exists(Group.admins.through.objects.filter(group=OuterRef('pk'), user=user)),
+                      requests_total=count_subquery(GroupRequest.objects.filter(group=OuterRef('pk')), 'group'))
 
     def create(self, data):
         stick_id = data['id'] + '0'
@@ -197,32 +214,50 @@ class GroupSerializer(DynamicFieldsModelSerializer):
         return instance
 
     def get_members_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.members_count
         return obj.user_set.count()
 
     def get_members_ids(self, obj):
+        if hasattr(obj, 'active_members'):
+            return [member.id for member in obj.active_members]
         return obj.get_members_ids()
 
     def get_members_otids(self, obj):
+        if hasattr(obj, 'active_members'):
+            return [member.one_time_id for member in obj.active_members]
         return obj.get_members_otids()
 
     def get_members_all_ids(self, obj):
+        if hasattr(obj, 'active_members'):
+            return [{'id': member.id, 'one_time_id': member.one_time_id}
+                    for member in obj.active_members + obj.active_invited_members]
         return obj.get_all_users_ids_and_otids()
 
     def get_temp_display_name(self, obj):
         if not 'request' in self.context:
             return None
-        temp_display_name = TempDisplayName.objects.filter(group=obj, to_user=self.context['request'].user).first()
+        if hasattr(obj, 'user_temp_display_names'):
+            temp_display_name = obj.user_temp_display_names[0] if obj.user_temp_display_names else None
+        else:
+            temp_display_name = TempDisplayName.objects.filter(group=obj, to_user=self.context['request'].user).first()
         if temp_display_name:
             return {'text': temp_display_name.cipher, 'stick_id': temp_display_name.stick_id,
-                    'member_id': temp_display_name.from_user.id}
+                    'member_id': temp_display_name.from_user_id}
         return None
 
     def get_has_shared_photos(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.shared_photos_count > 0
         return Image.objects.filter(groups__in=[obj], album__isnull=True).count() > 0
 
     def get_requests_count(self, obj):
         if not 'request' in self.context:
             return 0
+        if hasattr(obj, 'requests_total'):
+            return obj.requests_total if obj.is_admin else 0
         if not self.context['request'].user in obj.admins.all():
             return 0
         group_requests = GroupRequest.objects.filter(group=obj)
@@ -21,7 +21,7 @@ class GroupViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = self.request.user.get_groups()
-        groups = GroupSerializer.setup_eager_loading(qs)
+        groups = GroupSerializer.setup_eager_loading(qs, self.request.user)
         return groups
 
 
@@ -0,0 +1,67 @@
+import time
+from django.db.models import BigIntegerField, Case, F, Q, Sum, Value, When, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from users.models import User
+from vault.models import File
+from .models import Transaction, GRACE_PERIOD, FREE_STORAGE
+
+# Picks, from each user's files numbered by a running sum of their sizes newest first, the files that start before
+# the user's excess is covered, i.e. the newest files that need to be deleted to free it.
+TRIM_SQL = '''
+    SELECT running.id FROM ({running}) AS running
+    JOIN unnest(%s, %s) AS excess(user_id, size) ON running.user_id = excess.user_id
+    WHERE running.stored - running.size < excess.size
+'''
+
+
+def stored_size(key, size):
+    return Case(When(Q(**{key + '__isnull': False}) & ~Q(**{key: ''}), then=Coalesce(size, 0)),
+                default=Value(0), output_field=BigIntegerField())
+
+
+def latest_expiries(users):
+    """
+    Returns the latest dated transaction of each of `users`, picked with one DISTINCT ON query.
+    """
+    latest = Transaction.objects.filter(user__in=users, expires_ms__isnull=False) \
+        .order_by('user_id', '-timestamp').distinct('user_id').values('id')
+    return Transaction.objects.filter(id__in=latest)
+
+
+def trim_storage(user_ids):
+    """
+    Deletes the newest vault files of `user_ids` until each of them is back under FREE_STORAGE.
+    """
+    excess = dict(User.objects.filter(id__in=user_ids).annotate(storage=F('vault_storage') + F('chat_storage'))
+                  .filter(storage__gt=FREE_STORAGE).values_list('id', 'storage'))
+    if not excess:
+        return 0
+    size = stored_size('uri_key', 'file_size') + stored_size('preview_uri_key', 'preview_file_size')
+    running = File.objects.filter(user_id__in=list(excess), is_folder=False).annotate(size=size) \
+        .annotate(stored=Window(Sum(size), partition_by=[F('user_id')], order_by=[F('timestamp').desc(),
+                                                                                F('id').desc()])) \
+        .values('id', 'user_id', 'size', 'stored')
+    sql, params = running.query.sql_with_params()
+    params += (list(excess), [storage - FREE_STORAGE for storage in excess.values()])
+    ids = list(File.objects.filter(id__in=RawSQL(TRIM_SQL.format(running=sql), params)).values_list('id', flat=True))
+    File.objects.delete_tree(ids)
+    return len(ids)
+
+
+def sweep(now=None):
+    """
+    Moves premium users whose latest transaction expired into the grace period (`subscription_expiring`), and those
+    whose grace period ended, or who never had a dated transaction, back to basic after trimming their vault. Only
+    premium users are read, so the sweep scales with them rather than with every user.
+    """
+    now_ms = int((now or time.time()) * 1000)
+    premium = User.objects.filter(subscription='premium').exclude(whitelist_premium=True)
+    expired = latest_expiries(premium).filter(expires_ms__lt=now_ms)
+    ended = set(expired.filter(expires_ms__lte=now_ms - GRACE_PERIOD * 1000).values_list('user_id', flat=True))
+    ended.update(premium.exclude(transactions__expires_ms__isnull=False).values_list('id', flat=True))
+    trimmed = trim_storage(ended)
+    downgraded = User.objects.filter(id__in=ended).update(subscription='basic')
+    expiring = premium.filter(id__in=expired.filter(expires_ms__gt=now_ms - GRACE_PERIOD * 1000).values('user_id'),
+                              subscription_expiring=False).update(subscription_expiring=True)
+    return {'expiring': expiring, 'downgraded': downgraded, 'trimmed': trimmed}
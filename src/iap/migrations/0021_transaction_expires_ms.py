@@ -0,0 +1,30 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:38
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def fill_expires_ms(apps, schema_editor):
+    Transaction = apps.get_model('iap', 'Transaction')
+    Transaction.objects.filter(expires_date_ms__regex=r'^[0-9]+$') \
+        .update(expires_ms=Cast('expires_date_ms', models.BigIntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iap', '0020_auto_20231213_1258'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='expires_ms',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-timestamp'], name='iap_transac_user_id_86d8b4_idx'),
+        ),
+        migrations.RunPython(fill_expires_ms, migrations.RunPython.noop),
+    ]
@@ -7,6 +7,12 @@ PRODUCTS = (('com.stiiick.premium.1', 'Sticknet Premium (monthly)'),)
 
 PLATFORMS = (('ios', 'iOS'), ('android', 'Android'), ('web', 'Web'))
 
+ONE_DAY = 60 * 60 * 24
+GRACE_PERIOD = ONE_DAY * 15
+NOTIFY_GRACE_PERIOD = ONE_DAY
+# Storage of the basic subscription, in bytes.
+FREE_STORAGE = 1073741824
+
 
 class Transaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='transactions')
@@ -17,6 +23,15 @@ class Transaction(models.Model):
     original_transaction_id = models.CharField(max_length=100, blank=True, null=True)
     purchase_date_ms = models.CharField(max_length=100, null=True)
     expires_date_ms = models.CharField(max_length=100, null=True)
+    # `expires_date_ms` as a number, kept in sync on save, so expiries can be compared and indexed in the database.
+    expires_ms = models.BigIntegerField(blank=True, null=True, db_index=True)
     success = models.BooleanField()
     error = models.CharField(max_length=1000, null=True)
     timestamp = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-timestamp'])]
+
+    def save(self, *args, **kwargs):
+        self.expires_ms = int(self.expires_date_ms) if str(self.expires_date_ms).isdigit() else None
+        super(Transaction, self).save(*args, **kwargs)
@@ -1,7 +1,6 @@
 import datetime
-import json, os, requests, time, stripe
+import json, os, requests, stripe
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.core.mail import EmailMultiAlternatives
 from django.http import HttpResponse
 from django.template.loader import render_to_string
@@ -19,15 +18,15 @@ from rest_framework import permissions
 from django.utils import timezone
 
 from .models import Transaction
+from . import expiry
+from mailer.mailing import run_mailing
+from mailer.models import Mailing
+from jobs.queue import enqueue
+from jobs.tasks import send_email
 from users.models import User
-from vault.models import File
 from sticknet.settings import DEBUG
 from django.db.models import Q
 
-ONE_DAY = 60 * 60 * 24
-GRACE_PERIOD = ONE_DAY * 15
-NOTIFY_GRACE_PERIOD = ONE_DAY
-
 
 def ios_verify_receipt(request, attempts):
     success = False
@@ -134,42 +133,12 @@ class VerifyReceipt(APIView):
 
 class CheckUserGracePeriod(APIView):
     def get(self, request):
-        current_time = int(time.time())
-        users = User.objects.exclude(whitelist_premium=True)
-        one_gb = 1073741824
-        for user in users:
-            try:
-                latest_transaction = user.transactions.latest('timestamp')
-                expiry_time = int(latest_transaction.expires_date_ms[:-3])
-            except ObjectDoesNotExist:
-                expiry_time = 0
-            is_expired = current_time > expiry_time
-            if is_expired:
-                timesince_expiry = current_time - expiry_time
-                if timesince_expiry >= GRACE_PERIOD:
-                    if user.storage_used() > one_gb:
-                        files = File.objects.filter(user=user, is_folder=False).order_by('-timestamp')
-                        for file in files:
-                            file.delete()
-                            if user.storage_used() <= one_gb:
-                                break
-                    user.subscription = 'basic'
-                    user.save()
-                else:
-                    user.subscription_expiring = True
-                    user.save()
-                    if user.storage_used() > one_gb:
-                        dt_object = datetime.datetime.utcfromtimestamp(
-                            int(latest_transaction.expires_date_ms[:-3]) + GRACE_PERIOD - ONE_DAY)
-                        formatted_date = dt_object.strftime('%d %B %Y')
-                        html_content = render_to_string('grace_period.html',
-                                                        {'name_of_user': user.name, 'end_date': formatted_date})
-                        text_content = strip_tags(html_content)
-                        mail = EmailMultiAlternatives('Sticknet: Premium subscription expired', text_content,
-                                                      'support@sticknet.org',
-                                                      [user.email])
-                        mail.attach_alternative(html_content, "text/html")
-                        mail.send()
+        expiry.sweep()
+        # One notice a day to the users still over the free storage, sent by the mailer in batches.
+        mailing = Mailing.objects.get_or_create(key='grace_period:%s' % datetime.date.today(), defaults={
+            'audience': 'grace_period', 'template': 'grace_period.html',
+            'subject': 'Sticknet: Premium subscription expired', 'from_email': 'support@sticknet.org'})[0]
+        enqueue(run_mailing, mailing.id, key='mailing:%d' % mailing.id)
         return Response({'success': True})
 
 
@@ -253,12 +222,8 @@ def stripe_webhook(request):
             formatted_date = dt_object.strftime('%d %B %Y')
             html_content = render_to_string('subscription_cancelled.html',
                                             {'name_of_user': user.name, 'end_date': formatted_date})
-            text_content = strip_tags(html_content)
-            mail = EmailMultiAlternatives('Sticknet: Premium subscription cancelled', text_content,
-                                          'support@sticknet.org',
-                                          [user.email])
-            mail.attach_alternative(html_content, "text/html")
-            mail.send()
+            enqueue(send_email, 'Sticknet: Premium subscription cancelled', html_content, 'support@sticknet.org',
+                    [user.email])
     if event.type == 'invoice.payment_succeeded':
         object = json.loads(payload)['data']['object']
         item = object['lines']['data'][0]
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from jobs.queue import DatabaseBroker
+
+
+class Command(BaseCommand):
+    help = 'Runs the jobs enqueued in the Job table, polling for new ones until stopped (or once with --once).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due jobs and exit.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=1, help='Seconds to wait when no job is due.')
+        parser.add_argument('--purge-after', type=int, default=7, help='Days after which done jobs are deleted.')
+
+    def handle(self, *args, **options):
+        broker = DatabaseBroker()
+        total = 0
+        while True:
+            count = broker.run_pending(options['batch_size'])
+            total += count
+            if options['once']:
+                if count < options['batch_size']:
+                    break
+                continue
+            if not count:
+                broker.purge(options['purge_after'])
+                connection.close_if_unusable_or_obsolete()
+                time.sleep(options['sleep'])
+        self.stdout.write('Ran %d jobs' % total)
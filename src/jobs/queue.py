@@ -0,0 +1,173 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first retry, doubled on every further attempt and capped at MAX_BACKOFF.
+BASE_BACKOFF = 30
+MAX_BACKOFF = 60 * 60
+# A job left `running` for longer than this (e.g. its worker was killed) is picked up again by another worker. The
+# lease of a job is taken when it starts and renewed every LEASE / 3 seconds while it runs.
+LEASE = 10 * 60
+
+
+def task_path(func):
+    return '%s.%s' % (func.__module__, func.__qualname__)
+
+
+def backoff(attempts):
+    return min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Renews the lease of a running job until stopped, so a job running for longer than LEASE (e.g. a broadcast) is not
+    claimed again by another worker.
+    """
+
+    def __init__(self, job):
+        super().__init__(daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(LEASE / 3):
+                Job.objects.filter(id=self.job.id, status=Job.RUNNING, attempts=self.job.attempts) \
+                    .update(run_at=timezone.now() + timedelta(seconds=LEASE))
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """
+    Runs a claimed job, then marks it done, schedules its retry, or marks it failed once `max_attempts` is reached.
+    The result is only saved if the job was not claimed again by another worker in the meantime.
+    """
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        import_string(job.task)(*job.args)
+        job.status, job.last_error = Job.DONE, None
+    except Exception:
+        job.last_error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed, attempt %d of %d', job.id, job.task, job.attempts, job.max_attempts)
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    finally:
+        heartbeat.stop()
+    if not Job.objects.filter(id=job.id, status=Job.RUNNING, attempts=job.attempts) \
+            .update(status=job.status, last_error=job.last_error, run_at=job.run_at):
+        logger.warning('Job %s (%s) lost its lease, attempt %d not saved', job.id, job.task, job.attempts)
+
+
+class DatabaseBroker:
+    """
+    Stores jobs in the Job table, where `run_jobs` workers pick them up. The row is written in the caller's
+    transaction, so a job enqueued by a request that rolls back is never run.
+    """
+
+    def enqueue(self, task, args, key=None, delay=0, max_attempts=5):
+        fields = {'task': task, 'args': list(args), 'max_attempts': max_attempts,
+                  'run_at': timezone.now() + timedelta(seconds=delay)}
+        if key is None:
+            return Job.objects.create(**fields)
+        try:
+            with transaction.atomic():
+                return Job.objects.get_or_create(key=key, defaults=fields)[0]
+        except IntegrityError:
+            return Job.objects.get(key=key)
+
+    def claim(self):
+        """
+        Leases the next due job, pending or running with an expired lease, returns None if there is none.
+        """
+        with transaction.atomic():
+            job = Job.objects.select_for_update(skip_locked=True) \
+                .filter(Q(status=Job.PENDING) | Q(status=Job.RUNNING), run_at__lte=timezone.now()) \
+                .order_by('run_at').first()
+            if job is not None:
+                job.status, job.attempts = Job.RUNNING, job.attempts + 1
+                job.run_at = timezone.now() + timedelta(seconds=LEASE)
+                job.save(update_fields=['status', 'attempts', 'run_at'])
+        return job
+
+    def run_pending(self, limit=100):
+        """
+        Runs up to `limit` due jobs one after another, each claimed when it starts, returns the number of jobs run.
+        """
+        count = 0
+        while count < limit:
+            job = self.claim()
+            if job is None:
+                break
+            run_job(job)
+            count += 1
+        return count
+
+    def purge(self, days):
+        return Job.objects.filter(status=Job.DONE, timestamp__lt=timezone.now() - timedelta(days=days)).delete()[0]
+
+
+class ImmediateBroker:
+    """
+    Runs jobs inline as they are enqueued, used by the test suite and local development. A keyed job is recorded in
+    the Job table in the caller's transaction, like with DatabaseBroker, so its key is deduplicated for as long as that
+    transaction lives (i.e. within a test case). Failures are not retried, they are raised when JOBS_RAISE_EXCEPTIONS
+    is set (the test suite) and logged otherwise.
+    """
+
+    def enqueue(self, task, args, key=None, delay=0, max_attempts=5):
+        if key is not None:
+            try:
+                with transaction.atomic():
+                    Job.objects.create(task=task, args=list(args), key=key, status=Job.DONE, attempts=1,
+                                       max_attempts=max_attempts, run_at=timezone.now())
+            except IntegrityError:
+                return
+        try:
+            import_string(task)(*args)
+        except Exception:
+            if settings.JOBS_RAISE_EXCEPTIONS:
+                raise
+            logger.exception('Job %s failed', task)
+
+    def run_pending(self, limit=100):
+        return 0
+
+    def purge(self, days):
+        return 0
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.JOBS_BROKER)()
+    return _broker
+
+
+def enqueue(func, *args, key=None, delay=0, max_attempts=5):
+    """
+    Defers `func(*args)` out of the request. `args` must be JSON serializable. Pass an idempotency `key` to make
+    enqueuing the same side effect more than once a no-op, and `delay` to run it no sooner than `delay` seconds from
+    now.
+    """
+    return get_broker().enqueue(task_path(func), args, key=key, delay=delay, max_attempts=max_attempts)
@@ -0,0 +1,50 @@
+import logging
+from django.core.mail import EmailMultiAlternatives
+from django.utils.html import strip_tags
+from firebase_admin import db, auth
+from sticknet.settings import DEBUG, DEFAULT_APP, FIREBASE_REF, FIREBASE_REF_DEV, TESTING
+from .queue import enqueue
+
+if not TESTING:
+    from custom_storages import S3
+else:
+    from mock_custom_storages import S3
+
+logger = logging.getLogger(__name__)
+
+
+def delete_storage_objects(keys):
+    failed = S3().delete_files(keys)
+    if failed:
+        raise Exception('Failed to delete %d storage objects: %s' % (len(failed), ', '.join(failed[:10])))
+
+
+def enqueue_storage_deletes(keys):
+    """
+    Enqueues the deletion of a batch of storage keys, one job per delete_objects request. Empty keys are skipped.
+    """
+    keys = list(dict.fromkeys(key for key in keys if key))
+    for i in range(0, len(keys), S3.DELETE_BATCH_SIZE):
+        enqueue(delete_storage_objects, keys[i:i + S3.DELETE_BATCH_SIZE])
+
+
+def delete_firebase_ref(path):
+    if not TESTING:
+        db.reference(path, DEFAULT_APP, FIREBASE_REF_DEV if DEBUG else FIREBASE_REF).delete()
+
+
+def delete_firebase_user(email):
+    if TESTING or not email:
+        return
+    try:
+        user = auth.get_user_by_email(email)
+    except auth.UserNotFoundError:
+        logger.info('No Firebase user to delete')
+        return
+    auth.delete_user(user.uid)
+
+
+def send_email(subject, html_content, from_email, to):
+    mail = EmailMultiAlternatives(subject, strip_tags(html_content), from_email, to)
+    mail.attach_alternative(html_content, "text/html")
+    mail.send()
@@ -203,6 +203,37 @@ class UpdateActiveIK(APIView):
         return Response(status=status.HTTP_200_OK)
 
 
+def get_groups_dsks(user):
+    """
+    Returns the DSKs `user` needs to decrypt the display names and covers of their groups, in group order. The groups
+    with their ciphers, and then all the DSKs with their keys, are each fetched in one query whatever the number of
+    groups.
+    """
+    ciphers = []
+    for group in user.groups.select_related('display_name', 'cover'):
+        if group.display_name and group.display_name.user_id != user.id:
+            ciphers.append(group.display_name)
+        if group.cover and group.cover.user_id != user.id:
+            ciphers.append(group.cover)
+    if not ciphers:
+        return []
+    # Filtering on both id sets may match a few extra pairs, which are ignored. The lowest id of a pair wins, as with
+    # `.first()`.
+    dsks = {}
+    for dsk in DecryptionSenderKey.objects.filter(for_user=user,
+                                                  stick_id__in={cipher.stick_id for cipher in ciphers},
+                                                  of_user_id__in={cipher.user_id for cipher in ciphers}) \
+            .select_related('identity_key', 'pre_key').order_by('-id'):
+        dsks[(dsk.stick_id, dsk.of_user_id)] = dsk
+    DSKs = []
+    for cipher in ciphers:
+        dsk = dsks.get((cipher.stick_id, cipher.user_id))
+        if dsk:
+            DSKs.append({'key': dsk.key, 'identity_key_id': dsk.identity_key.key_id, 'pre_key_id': dsk.pre_key.key_id,
+                         'sender_id': cipher.user_id, 'stick_id': cipher.stick_id})
+    return DSKs
+
+
 class Login(generics.GenericAPIView):
     """
     This Login method should be called after the user have verified their phone number and got their LimitedAccessToken.
@@ -238,26 +269,7 @@ class Login(generics.GenericAPIView):
             user.password_block_time = None
             user.is_active = True
             user.save()
-            DSKs = []
-            DSKs_ids = []
-            for group in user.groups.all():
-                if group.display_name.user.id != user.id:
-                    dsk = DecryptionSenderKey.objects.filter(stick_id=group.display_name.stick_id,
-                                                             of_user=group.display_name.user, for_user=user).first()
-                    if dsk:
-                        DSKs.append(
-                            {'key': dsk.key, 'identity_key_id': dsk.identity_key.key_id, 'pre_key_id': dsk.pre_key.key_id,
-                             'sender_id': group.display_name.user.id, 'stick_id': group.display_name.stick_id})
-                        DSKs_ids.append(dsk.id)
-                if group.cover and group.cover.user.id != user.id:
-                    dsk = DecryptionSenderKey.objects.filter(stick_id=group.cover.stick_id,
-                                                             of_user=group.cover.user, for_user=user).first()
-                    if dsk:
-                        DSKs.append(
-                            {'key': dsk.key, 'identity_key_id': dsk.identity_key.key_id, 'pre_key_id': dsk.pre_key.key_id,
-                             'sender_id': group.cover.user.id, 'stick_id': group.cover.stick_id})
-                        DSKs_ids.append(dsk.id)
-            response['bundle']['DSKs'] = DSKs
+            response['bundle']['DSKs'] = get_groups_dsks(user)
             LimitedAccessToken.objects.get(auth_id=auth_id).delete()
             devices_count = user.devices.all().count()
             auth_token = AuthToken.objects.create(user)
@@ -268,7 +280,8 @@ class Login(generics.GenericAPIView):
             device.save()
             firebase_token = auth.create_custom_token(user.id, {'email': user.email}) if not TESTING else 'firebase_token'
             return Response({
-                "user": UserSerializer(user, context=self.get_serializer_context()).data,
+                "user": UserSerializer(UserSerializer.setup_aggregates(User.objects.filter(id=user.id)).get(),
+                                       context=self.get_serializer_context()).data,
                 "token": auth_token[1],
                 "firebase_token": firebase_token,
                 "bundle": response['bundle'],
@@ -314,7 +327,8 @@ class WebLogin(generics.GenericAPIView):
             # device.auth_token = auth_token[0]
             # device.save()
             return Response({
-                "user": UserSerializer(user, context=self.get_serializer_context()).data,
+                "user": UserSerializer(UserSerializer.setup_aggregates(User.objects.filter(id=user.id)).get(),
+                                       context=self.get_serializer_context()).data,
                 "token": auth_token[1],
                 "correct": True,
             })
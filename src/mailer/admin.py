@@ -0,0 +1,4 @@
+from .models import Mailing
+from sticknet.admin_site import admin_site
+
+admin_site.register(Mailing)
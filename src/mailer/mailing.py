@@ -0,0 +1,101 @@
+import datetime, re, uuid
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, OuterRef, Subquery
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import conditional_escape, strip_tags
+from users.models import User
+from iap.models import Transaction, ONE_DAY, GRACE_PERIOD, FREE_STORAGE
+from .models import Mailing
+
+# Messages sent over one SMTP connection, after which the mailing's progress is saved.
+BATCH_SIZE = 100
+
+
+class CompiledTemplate:
+    """
+    A template rendered once, with a marker in place of each per-recipient variable, and then filled in for every
+    recipient by joining strings instead of rendering it again.
+    """
+
+    def __init__(self, template_name, variables):
+        marker = 'mailer%s' % uuid.uuid4().hex
+        html = render_to_string(template_name, {name: marker + name + marker for name in variables})
+        pattern = re.compile('%s(%s)%s' % (marker, '|'.join(re.escape(name) for name in variables), marker))
+        self.html = pattern.split(html) if variables else [html]
+        self.text = pattern.split(strip_tags(html)) if variables else [strip_tags(html)]
+
+    def render(self, context):
+        """
+        Returns the html and text bodies for `context`.
+        """
+        return fill(self.html, context, conditional_escape), fill(self.text, context, str)
+
+
+def fill(parts, context, convert):
+    # re.split with a group alternates the literal parts with the names of the variables between them.
+    return ''.join(part if i % 2 == 0 else convert(context[part]) for i, part in enumerate(parts))
+
+
+def everyone():
+    return User.objects.exclude(email__isnull=True).exclude(email='')
+
+
+def in_grace_period():
+    """
+    Premium users whose subscription expired less than GRACE_PERIOD ago (flagged by CheckUserGracePeriod) and whose
+    files would not fit in the basic subscription, annotated with the expiry of their latest transaction.
+    """
+    expires = Transaction.objects.filter(user=OuterRef('pk'), expires_ms__isnull=False).order_by('-timestamp') \
+        .values('expires_ms')[:1]
+    return everyone().filter(subscription='premium', subscription_expiring=True).exclude(whitelist_premium=True) \
+        .annotate(storage=F('vault_storage') + F('chat_storage'), expires_ms=Subquery(expires)) \
+        .filter(storage__gt=FREE_STORAGE, expires_ms__isnull=False)
+
+
+def grace_period_context(user):
+    end_date = datetime.datetime.utcfromtimestamp(user.expires_ms // 1000 + GRACE_PERIOD - ONE_DAY)
+    return {'name_of_user': user.name, 'end_date': end_date.strftime('%d %B %Y')}
+
+
+# audience: (recipients queryset, per-recipient template variables, function returning a recipient's variables)
+AUDIENCES = {
+    'everyone': (everyone, [], lambda user: {}),
+    'grace_period': (in_grace_period, ['name_of_user', 'end_date'], grace_period_context),
+}
+
+
+def run_mailing(mailing_id):
+    """
+    Sends a mailing to the recipients of its audience after its cursor, streamed in id order, BATCH_SIZE messages
+    per SMTP connection. The cursor is saved after every batch, so an interrupted mailing (retried by the job queue or
+    the `send_mailing` command) resumes after the last batch sent.
+    """
+    mailing = Mailing.objects.get(id=mailing_id)
+    if mailing.status == Mailing.DONE:
+        return
+    Mailing.objects.filter(id=mailing.id).update(status=Mailing.RUNNING)
+    queryset, variables, get_context = AUDIENCES[mailing.audience]
+    template = CompiledTemplate(mailing.template, variables)
+    recipients = queryset().filter(id__gt=mailing.cursor).order_by('id').only('id', 'email', 'name') \
+        .iterator(chunk_size=BATCH_SIZE)
+    connection = get_connection()
+    batch, last_id = [], None
+    for user in recipients:
+        html, text = template.render(get_context(user))
+        message = EmailMultiAlternatives(mailing.subject, text, mailing.from_email, [user.email],
+                                         connection=connection)
+        message.attach_alternative(html, 'text/html')
+        batch.append(message)
+        last_id = user.id
+        if len(batch) == BATCH_SIZE:
+            send_batch(mailing, connection, batch, last_id)
+            batch = []
+    if batch:
+        send_batch(mailing, connection, batch, last_id)
+    Mailing.objects.filter(id=mailing.id).update(status=Mailing.DONE, finished=timezone.now())
+
+
+def send_batch(mailing, connection, batch, last_id):
+    sent = connection.send_messages(batch)
+    Mailing.objects.filter(id=mailing.id).update(cursor=last_id, sent=F('sent') + (sent or 0))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from mailer.mailing import AUDIENCES, run_mailing
+from mailer.models import Mailing
+
+
+class Command(BaseCommand):
+    help = 'Sends a template to every user of an audience, e.g. `send_mailing update-2024-06 --template update.html ' \
+           '--subject "Sticknet: Reworked chatting experience!"`. Running it again with the same key resumes an ' \
+           'interrupted mailing, and does nothing for a finished one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('key')
+        parser.add_argument('--template')
+        parser.add_argument('--subject')
+        parser.add_argument('--audience', default='everyone', choices=sorted(AUDIENCES))
+        parser.add_argument('--from-email', default='no-reply@sticknet.org')
+
+    def handle(self, *args, **options):
+        mailing = Mailing.objects.filter(key=options['key']).first()
+        if not mailing:
+            if not options['template'] or not options['subject']:
+                raise CommandError('--template and --subject are required to start a new mailing')
+            mailing = Mailing.objects.create(key=options['key'], audience=options['audience'],
+                                             template=options['template'], subject=options['subject'],
+                                             from_email=options['from_email'])
+        run_mailing(mailing.id)
+        mailing.refresh_from_db()
+        self.stdout.write('Mailing %s %s, sent %d emails' % (mailing.key, mailing.status, mailing.sent))
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Mailing',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('audience', models.CharField(max_length=50)),
+                ('template', models.CharField(max_length=200)),
+                ('subject', models.CharField(max_length=200)),
+                ('from_email', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done')], default='pending', max_length=10)),
+                ('cursor', models.CharField(blank=True, default='', max_length=1000)),
+                ('sent', models.IntegerField(default=0)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class Mailing(models.Model):
+    """
+    An email sent from `template` to every user of an audience (see `mailer.mailing.AUDIENCES`). Recipients are sent
+    in user id order and `cursor` is the id of the last one sent, so an interrupted mailing resumes after it. Mailings
+    with the same `key` are only sent once.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done')]
+
+    key = models.CharField(max_length=200, unique=True)
+    audience = models.CharField(max_length=50)
+    template = models.CharField(max_length=200)
+    subject = models.CharField(max_length=200)
+    from_email = models.CharField(max_length=200)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    cursor = models.CharField(max_length=1000, default='', blank=True)
+    sent = models.IntegerField(default=0)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return '%s %s' % (self.key, self.status)
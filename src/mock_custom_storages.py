@@ -1,11 +1,36 @@
 
 from unittest.mock import Mock
+import presigned_urls
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = Mock()
+        _client.generate_presigned_url.return_value = 'http://example.com/presigned_url'
+        _client.delete_object.return_value = {'ResponseMetadata': {'HTTPStatusCode': 204}}
+        _client.delete_objects.return_value = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+    return _client
+
 
 class S3:
+    DELETE_BATCH_SIZE = 1000
+
     def __init__(self):
-        self.client = Mock()
-        self.client.generate_presigned_url.return_value = 'http://example.com/presigned_url'
-        self.client.delete_object.return_value = {'ResponseMetadata': {'HTTPStatusCode': 204}}
+        self.client = get_client()
+
+    def sign(self, keys, client_method, time=3600):
+        urls = {}
+        for key in keys:
+            if key and key not in urls:
+                urls[key] = self.client.generate_presigned_url(
+                    ClientMethod=client_method,
+                    ExpiresIn=time,
+                    Params={'Bucket': 'mock_bucket', 'Key': key}
+                )
+        return urls
 
     def get_presigned_url(self, key, time=3600):
         return self.client.generate_presigned_url(
@@ -14,12 +39,14 @@ class S3:
             Params={'Bucket': 'mock_bucket', 'Key': key}
         )
 
+    def get_presigned_urls(self, keys, time=3600):
+        return self.sign(keys, 'put_object', time)
+
     def get_file(self, key, time=3600):
-        return self.client.generate_presigned_url(
-            ClientMethod='get_object',
-            ExpiresIn=time,
-            Params={'Bucket': 'mock_bucket', 'Key': key}
-        )
+        return self.get_files([key], time).get(key)
+
+    def get_files(self, keys, time=3600):
+        return presigned_urls.get_urls(self, keys, 'get_object', time)
 
     def delete_file(self, key):
         return self.client.delete_object(
@@ -27,3 +54,13 @@ class S3:
             Key=key
         )
 
+    def delete_files(self, keys):
+        keys = list(dict.fromkeys(key for key in keys if key))
+        failed = []
+        for i in range(0, len(keys), self.DELETE_BATCH_SIZE):
+            response = self.client.delete_objects(
+                Bucket='mock_bucket',
+                Delete={'Objects': [{'Key': key} for key in keys[i:i + self.DELETE_BATCH_SIZE]], 'Quiet': True}
+            )
+            failed += [error['Key'] for error in response.get('Errors', [])]
+        return failed
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_auto_20231130_1743'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['to_user', '-timestamp', '-id'], name='notificatio_to_user_67db8d_idx'),
+        ),
+    ]
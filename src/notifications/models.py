@@ -31,6 +31,9 @@ class Notification(models.Model):
     channel = models.CharField(max_length=100)
     is_like = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['to_user', '-timestamp', '-id'])]
+
 
     def __str__(self):
         return str(self.id)
@@ -51,3 +54,28 @@ class ConnectionRequest(models.Model):
     from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='requests_sent')
     to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='connection_requests')
     timestamp = models.DateTimeField(auto_now_add=True)
+
+
+class Broadcast(models.Model):
+    """
+    A push notification sent to every registered device by CustomPushNotification. `cursor` is the id of the last
+    PNToken whose messages were sent, so a broadcast interrupted by a crash resumes after it instead of starting over.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done')]
+
+    data = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    cursor = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    sent = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    pruned = models.IntegerField(default=0)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return '%s %s' % (self.id, self.status)
@@ -1,5 +1,9 @@
-import traceback
+import time, traceback
+from concurrent.futures import ThreadPoolExecutor
 
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework import permissions
@@ -8,13 +12,21 @@ from rest_framework.response import Response
 from groups.models import Group
 from sticknet.permissions import ServerAdminPermission
 from users.models import User
-from .models import PNToken
+from .models import PNToken, Broadcast
+from jobs.queue import enqueue
 from stick_protocol.models import EncryptionSenderKey
 
 from firebase_admin import messaging
 
 # multicastChannels = ['message_channel', 'post_channel', 'album_channel'], and sometimes group_channel
 
+MAX_BATCH_SIZE = 500  # FCM limit of messages per send_all call, and of tokens per send_multicast call
+MAX_WORKERS = 8
+# Tokens read and sent at a time by a broadcast, and the most send_multicast calls it starts per second.
+BROADCAST_WINDOW = MAX_WORKERS * MAX_BATCH_SIZE
+MAX_CHUNKS_PER_SECOND = 20
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='push')
+
 class PushNotification(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -44,19 +56,7 @@ class PushNotification(APIView):
                 group = Group.objects.get(id=data['group_id'])
                 users = group.admins.all()
 
-        users = list(set(users))
-        for user_id in users:
-            if user_id != request.user.id:
-                if isinstance(user_id, str):
-                    try:
-                        user = User.objects.get(id=user_id)
-                    except:
-                        continue
-                else:
-                    user = user_id
-                    if user.id == request.user.id:
-                        continue
-                sendPN(user, data, notification, android_config, apns_config)
+        deliver(users, request.user, data, notification, android_config, apns_config)
         return Response(status=status.HTTP_200_OK)
 
 
@@ -85,25 +85,7 @@ class PushNotificationMulticast(APIView):
         if 'to_user' in request.data:
             users = request.data['to_user']
 
-        tokens, apns_tokens = [], []
-        users = list(set(users))
-        for user_id in users:
-            if user_id != request.user.id:
-                if isinstance(user_id, str):
-                    try:
-                        user = User.objects.get(id=user_id)
-                    except:
-                        continue
-                else:
-                    user = user_id
-                    if user.id == request.user.id:
-                        continue
-                sendPN(user, data, notification, android_config, apns_config)
-                # for token in user.pn_tokens.all():
-                #     tokens.append(token.fcm_token)
-                #     if token.platform == 'ios':
-                #         apns_tokens.append(token.fcm_token)
-        # sendMulticastPN(tokens, apns_tokens, data, notification, android_config, apns_config)
+        deliver(users, request.user, data, notification, android_config, apns_config)
         return Response(status=status.HTTP_200_OK)
 
 
@@ -116,69 +98,148 @@ class CustomPushNotification(APIView):
     permission_classes = [ServerAdminPermission]
 
     def post(self, request):
-        data = request.data['data']
-        android_config = messaging.AndroidConfig(priority='high')
-        aps = messaging.Aps(content_available=True, sound='default', mutable_content=True)
-        apns_payload = messaging.APNSPayload(aps=aps)
-        apns_config = messaging.APNSConfig(payload=apns_payload)
-        notification = messaging.Notification(title=data['title'], body=data['body'])
-        tokens, apns_tokens = [], []
-        for user in User.objects.all():
-            for token in user.pn_tokens.all():
-                tokens.append(token.fcm_token)
-                if token.platform == 'ios':
-                    apns_tokens.append(token.fcm_token)
-        sendMulticastPN(tokens, apns_tokens, data, notification, android_config, apns_config)
-        return Response(status=status.HTTP_200_OK)
+        broadcast = Broadcast.objects.create(data=request.data['data'],
+                                             total=PNToken.objects.filter(fcm_token__isnull=False).count())
+        enqueue(run_broadcast, broadcast.id, key='broadcast:%d' % broadcast.id)
+        return Response({'id': broadcast.id})
 
+    def get(self, request):
+        progress = Broadcast.objects.filter(id=request.GET.get('id')).values(
+            'id', 'status', 'total', 'processed', 'sent', 'failed', 'pruned', 'timestamp', 'finished').first()
+        if not progress:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(progress)
 
-def sendMulticastPN(tokens, apns_tokens, data, notification, android_config, apns_config):
-    message = messaging.MulticastMessage(
-        tokens=tokens,
-        data=data,
-        android=android_config
-    )
-    messaging.send_multicast(message)
-    apnsMessage = messaging.MulticastMessage(
-        tokens=apns_tokens,
-        data=data,
-        notification=notification,
-        apns=apns_config
-    )
-    messaging.send_multicast(apnsMessage)
-    return
-
-
-def sendPN(user, data, notification, android_config, apns_config):
-    # send the notification to all user's devices
-    for token in user.pn_tokens.all():
-        message = messaging.Message(
-            data=data,
-            android=android_config,
-            token=token.fcm_token
-        )
-        try:
-            messaging.send(message)
-        except Exception:
-            if 'Requested entity was not found' in traceback.format_exc():
-                token.delete()
-            continue
 
+def run_broadcast(broadcast_id):
+    """
+    Sends a broadcast to every PNToken after its cursor, streamed in id order. Each window of tokens is split into
+    per-platform chunks of MAX_BATCH_SIZE tokens sent concurrently with send_multicast, at most MAX_CHUNKS_PER_SECOND
+    of them. Once a window is sent, its unregistered tokens are deleted in one query and the progress and cursor are
+    saved, so a broadcast interrupted by a crash (and retried by the job queue) only resends its last window.
+    """
+    broadcast = Broadcast.objects.get(id=broadcast_id)
+    if broadcast.status == Broadcast.DONE:
+        return
+    Broadcast.objects.filter(id=broadcast.id).update(status=Broadcast.RUNNING)
+    data = broadcast.data
+    android_config = messaging.AndroidConfig(priority='high')
+    aps = messaging.Aps(content_available=True, sound='default', mutable_content=True)
+    apns_payload = messaging.APNSPayload(aps=aps)
+    apns_config = messaging.APNSConfig(payload=apns_payload)
+    notification = messaging.Notification(title=data['title'], body=data['body'])
+    # The MulticastMessage arguments of the messages sent to each platform's tokens.
+    messages = {
+        'android': [{'data': data, 'android': android_config}],
         # ios BACKGROUND/KILLED notification
-        if token.platform == 'ios':
-            apnsMessage = messaging.Message(
-                data=data,
-                notification=notification,
-                apns=apns_config,
-                token=token.fcm_token
-            )
-            try:
-                messaging.send(apnsMessage)
-            except Exception:
-                if 'Requested entity was not found' in traceback.format_exc():
-                    token.delete()
-                continue
-    return
+        'ios': [{'data': data, 'android': android_config},
+                {'data': data, 'notification': notification, 'apns': apns_config}],
+    }
+    tokens = PNToken.objects.filter(id__gt=broadcast.cursor, fcm_token__isnull=False).order_by('id') \
+        .values_list('id', 'fcm_token', 'platform').iterator(chunk_size=BROADCAST_WINDOW)
+    limiter = RateLimiter(MAX_CHUNKS_PER_SECOND)
+    window = []
+    for token in tokens:
+        window.append(token)
+        if len(window) == BROADCAST_WINDOW:
+            send_window(broadcast, window, messages, limiter)
+            window = []
+    if window:
+        send_window(broadcast, window, messages, limiter)
+    Broadcast.objects.filter(id=broadcast.id).update(status=Broadcast.DONE, finished=timezone.now())
+
+
+def send_window(broadcast, window, messages, limiter):
+    by_platform = {'android': [], 'ios': []}
+    for token_id, fcm_token, platform in window:
+        by_platform['ios' if platform == 'ios' else 'android'].append((token_id, fcm_token))
+    futures = []
+    for platform, tokens in by_platform.items():
+        for i in range(0, len(tokens), MAX_BATCH_SIZE):
+            chunk = tokens[i:i + MAX_BATCH_SIZE]
+            for message in messages[platform]:
+                limiter.wait()
+                futures.append(executor.submit(send_chunk, chunk, message))
+    sent, failed, unregistered = 0, 0, set()
+    for future in futures:
+        chunk_sent, chunk_failed, chunk_unregistered = future.result()
+        sent += chunk_sent
+        failed += chunk_failed
+        unregistered |= chunk_unregistered
+    pruned = PNToken.objects.filter(id__in=unregistered).delete()[0] if unregistered else 0
+    Broadcast.objects.filter(id=broadcast.id).update(cursor=window[-1][0], processed=F('processed') + len(window),
+                                                     sent=F('sent') + sent, failed=F('failed') + failed,
+                                                     pruned=F('pruned') + pruned)
+
+
+def send_chunk(chunk, message):
+    """
+    Sends the MulticastMessage built from `message` to a chunk of (token_id, fcm_token) pairs with one send_multicast
+    call. Returns the number of messages sent and failed, and the ids of the tokens FCM reports as no longer registered.
+    """
+    response = messaging.send_multicast(messaging.MulticastMessage(
+        tokens=[fcm_token for token_id, fcm_token in chunk], **message))
+    unregistered = {token_id for (token_id, fcm_token), result in zip(chunk, response.responses)
+                    if not result.success and is_unregistered(result.exception)}
+    failed = sum(1 for result in response.responses if not result.success)
+    return len(chunk) - failed, failed, unregistered
+
+
+class RateLimiter:
+    """
+    Spaces calls to `wait` at least 1 / `rate` seconds apart.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def deliver(users, sender, data, notification, android_config, apns_config):
+    """
+    Sends the notification to every device of `users` (ids or User objects), except the sender's. The recipients' tokens
+    are resolved in one query and the messages are sent in send_all batches from the push worker pool, so the caller
+    does not wait on FCM. Returns the batches' futures.
+    """
+    ids = {user if isinstance(user, str) else user.id for user in users}
+    ids.discard(sender.id)
+    tokens = PNToken.objects.filter(user_id__in=ids).values_list('id', 'fcm_token', 'platform')
+    messages = []
+    for token_id, fcm_token, platform in tokens:
+        messages.append((token_id, messaging.Message(data=data, android=android_config, token=fcm_token)))
+        # ios BACKGROUND/KILLED notification
+        if platform == 'ios':
+            messages.append((token_id, messaging.Message(data=data, notification=notification, apns=apns_config,
+                                                         token=fcm_token)))
+    return [executor.submit(send_batch, messages[i:i + MAX_BATCH_SIZE])
+            for i in range(0, len(messages), MAX_BATCH_SIZE)]
+
+
+def send_batch(batch):
+    """
+    Sends a batch of (token_id, message) pairs with one send_all call and deletes, in one query, the tokens FCM reports
+    as no longer registered.
+    """
+    try:
+        response = messaging.send_all([message for token_id, message in batch])
+        invalid = {token_id for (token_id, message), result in zip(batch, response.responses)
+                   if not result.success and is_unregistered(result.exception)}
+        if invalid:
+            PNToken.objects.filter(id__in=invalid).delete()
+    except Exception:
+        traceback.print_exc()
+    finally:
+        connection.close()
+
+
+def is_unregistered(exception):
+    return isinstance(exception, messaging.UnregisteredError) or 'Requested entity was not found' in str(exception)
 
 
 class SetPushToken(APIView):
@@ -1,8 +1,13 @@
+from django.db.models import OuterRef, Prefetch, Subquery
 from rest_framework import serializers
 
 from sticknet.settings import TESTING
+from sticknet.subqueries import count_subquery
 from .models import Notification, Invitation, ConnectionRequest
 from users.models import User
+from groups.models import Group
+from photos.models import Album, Blob, Image
+from stick_protocol.models import Party
 from users.serializers import UserConnectionSerializer
 from photos.serializers import ImageSerializer, AlbumSerializer
 from groups.serializers import GroupSerializer, CipherSerializer
@@ -70,8 +75,22 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def setup_eager_loading(queryset):
-        queryset = queryset.select_related('from_user', 'to_user', 'image', 'album', 'group')
-        return queryset
+        """
+        Joins every single-valued relation the nested serializers walk and prefetches the image's user, album, groups
+        and blobs and the shared photos once per page, so a page is serialized in a constant number of queries.
+        """
+        image_users = User.objects.select_related('profile_picture').annotate(
+            party_id=Subquery(Party.objects.filter(user=OuterRef('pk'), individual=False).values('id')[:1]))
+        image_albums = Album.objects.select_related('title__user', 'location__user').annotate(
+            images_total=count_subquery(Image.objects.filter(album=OuterRef('pk')), 'album'))
+        queryset = queryset.select_related('from_user__profile_picture', 'to_user', 'image', 'album__title__user',
+                                           'group__cover__user', 'group__display_name__user', 'note__reply_to')
+        return queryset.prefetch_related(
+            Prefetch('image__user', queryset=image_users),
+            Prefetch('image__album', queryset=image_albums),
+            Prefetch('image__groups', queryset=Group.objects.only('id')),
+            Prefetch('image__blobs', queryset=Blob.objects.order_by('id')),
+            Prefetch('shared_photos', queryset=Image.objects.only('id')))
 
     def get_reaction(self, obj):
         note = obj.note
@@ -105,14 +124,20 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     def get_images_ids(self, obj):
         list = []
-        if obj.shared_photos.count() > 0:
-            for image in obj.shared_photos.all():
-                list.insert(0, image.id)
+        for image in obj.shared_photos.all():
+            list.insert(0, image.id)
         return list
 
+    def image_blobs(self, obj):
+        # Read through all() so the prefetched blobs are used, sorted like blobs.first() would pick.
+        if obj.image is None:
+            return []
+        return sorted(obj.image.blobs.all(), key=lambda blob: blob.id)
+
     def get_blob(self, obj):
-        if obj.image != None and obj.image.blobs and obj.image.blobs.count() > 0:
-            blob = obj.image.blobs.first()
+        blobs = self.image_blobs(obj)
+        if blobs:
+            blob = blobs[0]
             youtube_thumbnail = None
             if blob.uri_key:
                 uri = S3().get_file(blob.uri_key)
@@ -131,9 +156,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         return None
 
     def get_blobs_length(self, obj):
-        if obj.image and obj.image.blobs:
-            return obj.image.blobs.count()
-        return 0
+        return len(self.image_blobs(obj))
 
 class InvitationSerializer(serializers.ModelSerializer):
     from_user = UserConnectionSerializer(fields=('id', 'name', 'profile_picture', 'color'), read_only=True)
@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 
 
 from .serializers import NotificationSerializer, InvitationSerializer, InvitedMembersSerializer, ConnectionRequestSerializer
-from photos.pagination import DynamicPagination
+from photos.pagination import TimelinePagination
 from .models import Invitation, ConnectionRequest
 from .push_notifications import PushNotification
 from groups.models import GroupRequest
@@ -15,17 +15,14 @@ class NotificationRead(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        notifications = request.user.notifications.all()
-        for notification in notifications:
-            notification.read = True
-            notification.save()
+        request.user.notifications.filter(read=False).update(read=True)
         return Response(status=status.HTTP_200_OK)
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
-    pagination_class = DynamicPagination
+    pagination_class = TimelinePagination
 
     def get_queryset(self):
         qs = self.request.user.notifications.exclude(from_user__in=self.request.user.blocked.all()).order_by("-timestamp")
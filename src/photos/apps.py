@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PhotosConfig(AppConfig):
     name = 'photos'
+
+    def ready(self):
+        from . import signals
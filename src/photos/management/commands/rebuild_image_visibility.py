@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from users.models import User
+from photos import visibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ImageVisibility index of every user (or of the given user ids).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        count = 0
+        for user in users.iterator():
+            visibility.rebuild_user(user)
+            count += 1
+        self.stdout.write('Rebuilt image visibility of %d users' % count)
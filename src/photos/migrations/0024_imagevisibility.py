@@ -0,0 +1,33 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('photos', '0023_auto_20231130_1743'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVisibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hidden', models.BooleanField(default=False)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='photos.image')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visible_images', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='imagevisibility',
+            index=models.Index(fields=['user', 'hidden', 'image'], name='photos_imag_user_id_89b955_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagevisibility',
+            unique_together={('user', 'image')},
+        ),
+    ]
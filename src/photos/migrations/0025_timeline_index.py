@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0024_imagevisibility'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['-timestamp', '-id'], name='photos_imag_timesta_69c6da_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+from users.models import test_numbers
+
+
+def backfill(apps, schema_editor):
+    """
+    Fills the ImageVisibility index of every existing user, the same rows `photos.visibility.rebuild_user` computes.
+    """
+    User = apps.get_model('users', 'User')
+    Image = apps.get_model('photos', 'Image')
+    ImageVisibility = apps.get_model('photos', 'ImageVisibility')
+    Party = apps.get_model('stick_protocol', 'Party')
+    for user in User.objects.all().iterator():
+        connections = User.objects.filter(Q(groups__in=user.groups.all()) | Q(connections=user)).exclude(
+            Q(id=user.id) | Q(is_active=False) | Q(finished_registration=False))
+        if not settings.DEBUG:
+            connections = connections.exclude(phone__in=test_numbers)
+        parties = Party.objects.filter(user__in=connections, individual=False).values_list('id', flat=True)
+        ids = Image.objects.filter(
+            Q(groups__in=user.groups.all()) |
+            Q(connections__in=[user]) |
+            Q(party_id__in=parties) |
+            Q(user=user)) \
+            .exclude(
+            Q(user__is_active=False) |
+            Q(user__in=user.blocked.all()) |
+            Q(user__blocked__in=[user])) \
+            .values_list('id', flat=True).distinct()
+        hidden_ids = set(map(str, user.hidden_images or []))
+        ImageVisibility.objects.bulk_create(
+            [ImageVisibility(user_id=user.id, image_id=id, hidden=str(id) in hidden_ids) for id in ids.iterator()],
+            batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0025_timeline_index'),
+        ('users', '0069_premium_users'),
+        ('stick_protocol', '0013_auto_20220917_1815'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
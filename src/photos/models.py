@@ -84,6 +84,9 @@ class Image(models.Model):
     seen_by = models.ManyToManyField(User, blank=True, related_name='image_seen_by')
     objects = ImageManager()
 
+    class Meta:
+        indexes = [models.Index(fields=['-timestamp', '-id'])]
+
     def __str__(self):
         return str(self.id)
 
@@ -94,6 +97,21 @@ class Image(models.Model):
         super(Image, self).delete(using, keep_parents)
 
 
+class ImageVisibility(models.Model):
+    """
+    Per-user fan-out of the images a user can see: shared to one of their groups, to them directly, to the party of
+    one of their connections, or owned by them; minus images of inactive, blocked and blocked-by users. Hidden images
+    stay in the index with `hidden` set. Maintained by `photos.visibility`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='visible_images')
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='visibility')
+    hidden = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('user', 'image')
+        indexes = [models.Index(fields=['user', 'hidden', 'image'])]
+
+
 class Blob(models.Model):
     image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='blobs', blank=True, null=True)
     uri = models.FileField(upload_to='photos/', blank=True, null=True)
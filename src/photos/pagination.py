@@ -1,5 +1,85 @@
+import base64
+from collections import OrderedDict
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class DynamicPagination(pagination.PageNumberPagination):
 	page_size_query_param = 'limit'
-	max_page_size = 1000
\ No newline at end of file
+	max_page_size = 1000
+
+
+class TimelinePagination(DynamicPagination):
+	"""
+	Page number pagination, unless the client sends a `cursor` query param (empty for the first page), in which case
+	the results are keyset paginated on (timestamp, id), newest first. Keyset pages skip the COUNT(*) and the OFFSET
+	scan so every page costs the same at any scroll depth, and rows inserted while scrolling do not shift the pages
+	that follow. Only forward (`next`) links are returned.
+
+	Rows with a NULL timestamp come first, as Postgres sorts them for `-timestamp` (and as the timeline indexes store
+	them), and a cursor in that leading run carries no timestamp.
+	"""
+	cursor_query_param = 'cursor'
+	ordering = (F('timestamp').desc(nulls_first=True), '-id')
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.keyset = self.cursor_query_param in request.query_params
+		if not self.keyset:
+			return super(TimelinePagination, self).paginate_queryset(queryset, request, view)
+		self.request = request
+		page_size = self.get_page_size(request)
+		queryset = queryset.order_by(*self.ordering)
+		position = self.decode_cursor(request.query_params[self.cursor_query_param])
+		if position:
+			timestamp, id = position
+			if timestamp is None:
+				queryset = queryset.filter(Q(timestamp__isnull=True, id__lt=id) | Q(timestamp__isnull=False))
+			else:
+				queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=id))
+		results = list(queryset[:page_size + 1])
+		self.next_position = None
+		if len(results) > page_size:
+			results = results[:page_size]
+			self.next_position = (results[-1].timestamp, results[-1].id)
+		return results
+
+	def get_paginated_response(self, data):
+		if not self.keyset:
+			return super(TimelinePagination, self).get_paginated_response(data)
+		return Response(OrderedDict([
+			('next', self.get_next_link()),
+			('previous', None),
+			('results', data)
+		]))
+
+	def get_next_link(self):
+		if not self.keyset:
+			return super(TimelinePagination, self).get_next_link()
+		if not self.next_position:
+			return None
+		url = self.request.build_absolute_uri()
+		return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
+
+	@staticmethod
+	def encode_cursor(timestamp, id):
+		timestamp = timestamp.isoformat() if timestamp else ''
+		return base64.urlsafe_b64encode(('%s|%s' % (timestamp, id)).encode()).decode()
+
+	@staticmethod
+	def decode_cursor(cursor):
+		if not cursor:
+			return None
+		try:
+			timestamp, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+			id = int(id)
+			if not timestamp:
+				return None, id
+			timestamp = parse_datetime(timestamp)
+		except (TypeError, ValueError, UnicodeDecodeError):
+			timestamp = None
+		if not timestamp:
+			raise NotFound('Invalid cursor')
+		return timestamp, id
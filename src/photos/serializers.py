@@ -7,9 +7,10 @@ from users.serializers import UserSerializer
 from groups.serializers import GroupSerializer, CipherSerializer
 from notifications.push_notifications import PushNotification
 from sticknet.dynamic_fields import DynamicFieldsModelSerializer
-from django.db.models import Q
+from sticknet.presigned_fields import PresignedUrlsMixin, PresignedListSerializer
+from sticknet.subqueries import count_subquery
+from django.db.models import Q, Exists, OuterRef, Prefetch
 from stick_protocol.models import EncryptionSenderKey
-from custom_storages import S3
 
 
 def get_album_cover(album, request):
@@ -166,6 +167,8 @@ class AlbumSerializer(DynamicFieldsModelSerializer):
         return get_album_cover(obj, self.context['request'])
 
     def get_images_count(self, obj):
+        if hasattr(obj, 'images_total'):
+            return obj.images_total
         return obj.images.all().count()
 
     def get_likes_count(self, obj):
@@ -197,7 +200,7 @@ class BlobUriSerializer(serializers.ModelSerializer):
         fields = ['uri', 'thumbnail', 'video_uri']
 
 
-class BlobSerializer(DynamicFieldsModelSerializer):
+class BlobSerializer(PresignedUrlsMixin, DynamicFieldsModelSerializer):
     id = serializers.SerializerMethodField()
     presigned_url = serializers.SerializerMethodField()
     preview_presigned_url = serializers.SerializerMethodField()
@@ -205,22 +208,19 @@ class BlobSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Blob
         fields = '__all__'
+        list_serializer_class = PresignedListSerializer
 
     def get_id(self, obj):
         return str(obj.id)
 
     def get_presigned_url(self, object):
-        if not object.uri_key:
-            return None
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
 
     def get_preview_presigned_url(self, object):
-        if not object.preview_uri_key:
-            return None
-        return S3().get_file(object.preview_uri_key)
+        return self.presigned_url(object.preview_uri_key)
 
-class ImageSerializer(DynamicFieldsModelSerializer):
+class ImageSerializer(PresignedUrlsMixin, DynamicFieldsModelSerializer):
     user = UserSerializer(fields=('id', 'name', 'username', 'profile_picture', 'party_id', 'subscription'), read_only=True)
     album = AlbumSerializer(fields=('id', 'title', 'location', 'images_count'), read_only=True)
     notes_count = serializers.SerializerMethodField()
@@ -280,10 +280,23 @@ class ImageSerializer(DynamicFieldsModelSerializer):
             'text_photo',
             'blobs'
         ]
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
-    def setup_eager_loading(queryset):
-        queryset = queryset.select_related('user', 'album')
+    def setup_eager_loading(queryset, user=None):
+        queryset = queryset.select_related('user__profile_picture', 'album__title', 'album__location') \
+            .prefetch_related('blobs',
+                              Prefetch('groups', queryset=Group.objects.only('id')),
+                              Prefetch('connections', queryset=User.objects.only('id'))) \
+            .annotate(notes_total=count_subquery(
+                Note.objects.filter(image=OuterRef('pk')).exclude(user__is_active=False), 'image'),
+                      likes_total=count_subquery(
+                          Image.likes.through.objects.filter(image=OuterRef('pk'), user__is_active=True), 'image'))
+        if user:
+            queryset = queryset.annotate(
+                liked_by_user=Exists(Image.likes.through.objects.filter(image=OuterRef('pk'), user=user))) \
+                .prefetch_related(Prefetch('notes', to_attr='user_reactions', queryset=Note.objects.filter(
+                    user=user, is_reply=False, reaction__isnull=False)))
         return queryset
 
 
@@ -320,12 +333,17 @@ class ImageSerializer(DynamicFieldsModelSerializer):
         return str(obj.id)
 
     def get_notes_count(self, obj):
+        if hasattr(obj, 'notes_total'):
+            return obj.notes_total
         return obj.notes.all().exclude(user__is_active=False).count()
 
 
     def get_reaction(self, obj):
-        note = Note.objects.filter(Q(user=self.context['request'].user, image=obj, is_reply=False) &
-                                      (Q(reaction__isnull=False))).first()
+        if hasattr(obj, 'user_reactions'):
+            note = obj.user_reactions[0] if obj.user_reactions else None
+        else:
+            note = Note.objects.filter(Q(user=self.context['request'].user, image=obj, is_reply=False) &
+                                          (Q(reaction__isnull=False))).first()
         if note:
             return {'type': note.reaction, 'stick_id': note.stick_id}
         return None
@@ -343,11 +361,15 @@ class ImageSerializer(DynamicFieldsModelSerializer):
         return ids
 
     def get_likes_count(self, obj):
+        if hasattr(obj, 'likes_total'):
+            return obj.likes_total
         return obj.likes.all().exclude(is_active=False).count()
 
 
     def get_liked(self, obj):
-        return self.context['request'].user in obj.likes.all()
+        if hasattr(obj, 'liked_by_user'):
+            return obj.liked_by_user
+        return obj.likes.filter(id=self.context['request'].user.id).exists()
 
     # def get_shared_to(self, obj):
     #     if obj.album == None and obj.groups.all().count() == 1:
@@ -375,8 +397,9 @@ class BlobImageSerializer(DynamicFieldsModelSerializer):
         fields = '__all__'
 
     @staticmethod
-    def setup_eager_loading(queryset):
-        queryset = queryset.select_related('image')
+    def setup_eager_loading(queryset, user=None):
+        queryset = queryset.prefetch_related(
+            Prefetch('image', queryset=ImageSerializer.setup_eager_loading(Image.objects.all(), user)))
         return queryset
 
     def get_id(self, obj):
@@ -0,0 +1,66 @@
+from django.db.models.signals import post_init, post_save, m2m_changed
+from django.dispatch import receiver
+from users.models import User
+from .models import Image
+from . import visibility
+
+# Keeps the ImageVisibility index in sync with the relations it is derived from. `clear()` is not used on any of these
+# relations, so only add/remove are handled.
+CHANGED = ('post_add', 'post_remove')
+
+
+@receiver(post_save, sender=Image)
+def index_image(sender, instance, created, **kwargs):
+    if created:
+        visibility.rebuild_image(instance)
+
+
+@receiver(post_init, sender=User)
+def remember_visibility_fields(sender, instance, **kwargs):
+    # Read through __dict__ so deferred fields (e.g. `.only('id')` querysets) are not loaded one query per user.
+    fields = instance.__dict__
+    instance._visibility_fields = (fields.get('is_active'), list(fields.get('hidden_images') or []))
+
+
+@receiver(post_save, sender=User)
+def reindex_user(sender, instance, created, **kwargs):
+    # Users are saved often, so the index is only touched when `is_active` or `hidden_images` actually changed.
+    is_active, hidden_images = instance._visibility_fields
+    remember_visibility_fields(sender, instance)
+    if created:
+        return
+    if is_active != instance.__dict__.get('is_active'):
+        visibility.rebuild_owner_images(instance)
+    if hidden_images != instance._visibility_fields[1]:
+        visibility.sync_hidden(instance)
+
+
+@receiver(m2m_changed, sender=Image.groups.through)
+@receiver(m2m_changed, sender=Image.connections.through)
+def reindex_shared_image(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in CHANGED:
+        return
+    images = Image.objects.filter(id__in=pk_set) if reverse else [instance]
+    for image in images:
+        visibility.rebuild_image(image)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reindex_group_members(sender, instance, action, reverse, pk_set, **kwargs):
+    # Joining or leaving a group changes what the member sees, and what the other members see through the member's
+    # party.
+    if action not in CHANGED:
+        return
+    if reverse:
+        groups, users = [instance.id], pk_set
+    else:
+        groups, users = pk_set, [instance.id]
+    visibility.reindex_membership(users, groups, joined=action == 'post_add')
+
+
+@receiver(m2m_changed, sender=User.connections.through)
+@receiver(m2m_changed, sender=User.blocked.through)
+def reindex_connected_users(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in CHANGED:
+        return
+    visibility.rebuild_users({instance.id} | set(pk_set))
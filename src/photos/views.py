@@ -9,34 +9,26 @@ from groups.models import Group
 from .serializers import ImageSerializer, BlobImageSerializer, ImageAudioUriSerializer, BlobUriSerializer, \
     AlbumSerializer, NoteSerializer, \
     get_album_cover
-from .pagination import DynamicPagination
+from .pagination import DynamicPagination, TimelinePagination
+from .visibility import visible_images
 from notifications.models import Notification
 from sticknet.dynamic_fields import DynamicFieldsViewMixin
 from django.db.models import Q
 from stick_protocol.models import EncryptionSenderKey
 from users.models import User
+from counters.models import UserCounters
 from django.utils import timezone
+from django.db import transaction
 
 
 class ImageViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimelinePagination
     serializer_class = ImageSerializer
 
     def get_queryset(self):
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        my_groups = self.request.user.groups.all()
-        qs = Image.objects.filter(
-            Q(groups__in=my_groups) |
-            Q(connections__in=[self.request.user]) |
-            Q(party_id__in=connections_parties_ids) |
-            Q(user=self.request.user)) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images)) \
-            .distinct().order_by("-timestamp")
-        images = ImageSerializer.setup_eager_loading(qs)
+        qs = visible_images(self.request.user).order_by("-timestamp")
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
     def destroy(self, request, *args, **kwargs):
@@ -84,17 +76,7 @@ class FetchImageAudioUri(generics.ListAPIView):
 
     def get_queryset(self):
         id = self.request.GET.get("id")
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        image = Image.objects.filter(Q(id=id) & (Q(groups__in=my_groups) |
-                                                 Q(connections__in=[self.request.user]) |
-                                                 Q(party_id__in=connections_parties_ids) |
-                                                 Q(user=self.request.user))) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images))
+        image = visible_images(self.request.user).filter(id=id)
         if not image:
             return Image.objects.none()
         return image
@@ -112,17 +94,7 @@ class FetchBlobUri(generics.ListAPIView):
             id = blob.first().image.id
         except:
             return Image.objects.none()
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        image = Image.objects.filter(Q(id=id) & (Q(groups__in=my_groups) |
-                                                 Q(connections__in=[self.request.user]) |
-                                                 Q(party_id__in=connections_parties_ids) |
-                                                 Q(user=self.request.user))) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images))
+        image = visible_images(self.request.user).filter(id=id)
         if not image:
             return Image.objects.none()
         return blob
@@ -181,20 +153,7 @@ class ToggleFavorite(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        image = Image.objects.filter(
-            Q(id=request.data['image_id']) &
-            (Q(groups__in=my_groups) |
-             Q(connections__in=[self.request.user]) |
-             Q(party_id__in=connections_parties_ids) |
-             Q(user=self.request.user))) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images)) \
-            .order_by("-timestamp").first()
+        image = visible_images(self.request.user).filter(id=request.data['image_id']).first()
         if not image:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
         if 'blob_id' in request.data and request.data['blob_id'] != None:
@@ -228,19 +187,8 @@ class SelectedBlobsView(generics.ListAPIView):
         ids = self.request.GET.get("ids")
         ids_list = ids.split(',')
         ids_list = list(map(int, ids_list))
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        qs = Image.objects.filter(Q(blobs__id__in=ids_list) & (Q(groups__in=my_groups) |
-                                                               Q(connections__in=[self.request.user]) |
-                                                               Q(party_id__in=connections_parties_ids) |
-                                                               Q(user=self.request.user))) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images)) \
-            .distinct().order_by("-timestamp")
-        images = ImageSerializer.setup_eager_loading(qs)
+        qs = visible_images(self.request.user).filter(blobs__id__in=ids_list).distinct().order_by("-timestamp")
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -253,19 +201,9 @@ class SelectedBlobsImageView(generics.ListAPIView):
         ids = self.request.GET.get("ids")
         ids_list = ids.split(',')
         ids_list = list(map(int, ids_list))
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        qs = Blob.objects.filter(Q(id__in=ids_list) & (Q(image__groups__in=my_groups) |
-                                                       Q(image__connections__in=[self.request.user]) |
-                                                       Q(image__party_id__in=connections_parties_ids) |
-                                                       Q(image__user=self.request.user))) \
-            .exclude(
-            Q(image__user__is_active=False) |
-            Q(image__user__in=self.request.user.blocked.all()) |
-            Q(image__user__blocked__in=[self.request.user]) |
-            Q(image__id__in=self.request.user.hidden_images)) \
-            .distinct()
-        blobs = BlobImageSerializer.setup_eager_loading(qs)
+        qs = Blob.objects.filter(id__in=ids_list, image__visibility__user=self.request.user,
+                                 image__visibility__hidden=False)
+        blobs = BlobImageSerializer.setup_eager_loading(qs, self.request.user)
         return blobs
 
 
@@ -275,22 +213,12 @@ class FavoriteImages(generics.ListAPIView):
     serializer_class = ImageSerializer
 
     def get_queryset(self):
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
         blobs_ids = self.request.user.preferences.favorites_ids
         ids = []
         for id in blobs_ids:
             ids.append(id.split('-')[0])
-        qs = Image.objects.filter(Q(id__in=ids) & (Q(groups__in=my_groups) | Q(connections__in=[self.request.user]) |
-                                                   Q(party_id__in=connections_parties_ids) |
-                                                   Q(user=self.request.user))) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images)) \
-            .distinct().order_by("-timestamp")
-        images = ImageSerializer.setup_eager_loading(qs)
+        qs = visible_images(self.request.user).filter(id__in=ids).order_by("-timestamp")
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -300,18 +228,8 @@ class HiddenImages(DynamicFieldsViewMixin, generics.ListAPIView):
     pagination_class = None
 
     def get_queryset(self):
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        qs = Image.objects.filter(Q(id__in=self.request.user.hidden_images) & (Q(groups__in=my_groups) |
-                                                                               Q(connections__in=[self.request.user]) |
-                                                                               Q(party_id__in=connections_parties_ids) |
-                                                                               Q(user=self.request.user))) \
-            .exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user])) \
-            .distinct().order_by("-timestamp")
-        images = ImageSerializer.setup_eager_loading(qs)
+        qs = visible_images(self.request.user, hidden=True).order_by("-timestamp")
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -353,17 +271,8 @@ class LatestShared(generics.ListAPIView):
     serializer_class = ImageSerializer
 
     def get_queryset(self):
-        my_groups = self.request.user.groups.all()
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        qs = Image.objects.filter(Q(album__isnull=True) & (Q(groups__in=my_groups) |
-                                                           Q(connections__in=[self.request.user]) |
-                                                           Q(party_id__in=connections_parties_ids) |
-                                                           Q(user=self.request.user))).exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) | Q(id__in=self.request.user.hidden_images)).distinct().order_by(
-            "-timestamp")[:4]
-        images = ImageSerializer.setup_eager_loading(qs)
+        qs = visible_images(self.request.user).filter(album__isnull=True).order_by("-timestamp")[:4]
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -377,7 +286,7 @@ class HighlightedImages(generics.ListAPIView):  # TODO: use BlobImageSerializer
         for id in blobs_ids:
             ids.append(id.split('-')[0])
         qs = Image.objects.filter(id__in=ids).distinct().order_by('-timestamp')
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -391,17 +300,27 @@ class IsProfileImages(generics.ListAPIView):
             id = self.request.user.id
             qs = Image.objects.filter(user__id=id, is_profile=True).distinct().order_by('-timestamp')
         else:
-            my_groups = self.request.user.groups.all()
-            connections_parties_ids = self.request.user.get_connections_parties_ids()
-            qs = Image.objects.filter(Q(user__id=id) & Q(is_profile=True) & (Q(groups__in=my_groups) |
-                                                                             Q(connections__in=[self.request.user]) |
-                                                                             Q(party_id__in=connections_parties_ids) |
-                                                                             Q(user=self.request.user))).distinct().order_by(
+            qs = visible_images(self.request.user, hidden=None).filter(user__id=id, is_profile=True).order_by(
                 '-timestamp')
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
-class ConnectionImages(generics.ListAPIView):
+class MarkSeenMixin(object):
+    """
+    Adds the requesting user to the `seen_by` of the images served on the current page, with one INSERT for the whole
+    page that skips the images they have already seen.
+    """
+
+    def paginate_queryset(self, queryset):
+        page = super(MarkSeenMixin, self).paginate_queryset(queryset)
+        ids = [image.id for image in page] if page is not None else queryset.order_by().values_list('id', flat=True)
+        through = Image.seen_by.through
+        through.objects.bulk_create([through(image_id=id, user_id=self.request.user.id) for id in ids],
+                                    ignore_conflicts=True)
+        return page
+
+
+class ConnectionImages(MarkSeenMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ImageSerializer
 
@@ -409,13 +328,11 @@ class ConnectionImages(generics.ListAPIView):
         id = self.request.GET.get('id')
         connection = User.objects.get(id=id)
         qs = Image.objects.filter(Q(user=connection, connections__in=[self.request.user]) | Q(user=self.request.user, connections__in=[connection])).distinct().order_by('-timestamp')
-        for image in qs:
-            image.seen_by.add(self.request.user)
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
-class GroupSharedImages(generics.ListAPIView):
+class GroupSharedImages(MarkSeenMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ImageSerializer
 
@@ -431,9 +348,7 @@ class GroupSharedImages(generics.ListAPIView):
             Q(user__blocked__in=[self.request.user]) |
             Q(id__in=self.request.user.hidden_images)
         ).distinct().order_by('-timestamp')
-        for image in qs:
-            image.seen_by.add(self.request.user)
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -445,32 +360,20 @@ class SharedImages(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user.id
         qs = Image.objects.filter(user=user, album__isnull=True).distinct().order_by("-timestamp")
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
 class SharedByOthers(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = DynamicPagination
+    pagination_class = TimelinePagination
     serializer_class = ImageSerializer
 
     def get_queryset(self):
         user = self.request.user
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        qs = Image.objects.filter(
-            ~Q(user=user) &
-            Q(album__isnull=True) &
-            (Q(groups__in=user.get_groups()) |
-             Q(connections__in=[user]) |
-             Q(party_id__in=connections_parties_ids))
-        ).exclude(
-            Q(user__is_active=False) |
-            Q(user__in=self.request.user.blocked.all()) |
-            Q(user__blocked__in=[self.request.user]) |
-            Q(id__in=self.request.user.hidden_images)).distinct().order_by(
-            "-timestamp")
+        qs = visible_images(user).filter(album__isnull=True).exclude(user=user).order_by("-timestamp")
 
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -525,7 +428,7 @@ class AlbumImagesUris(DynamicFieldsViewMixin, generics.ListAPIView):
         if not album.group in self.request.user.groups.all():
             return Image.objects.none()
         qs = Image.objects.filter(album=album_id)
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
 
@@ -544,10 +447,65 @@ class AlbumDetailAPIView(generics.ListAPIView):
             Q(user__in=self.request.user.blocked.all()) |
             Q(user__blocked__in=[self.request.user]) |
             Q(id__in=self.request.user.hidden_images)).distinct().order_by(timestamp)
-        images = ImageSerializer.setup_eager_loading(qs)
+        images = ImageSerializer.setup_eager_loading(qs, self.request.user)
         return images
 
+def build_blobs(data, total, share_ext, type):
+    """
+    Builds the unsaved Blob objects of an UploadImages payload and returns them with the uploaded size. Raises
+    ValueError, IndexError or KeyError on a malformed payload, before anything is written.
+    """
+    uri_key_list = data.getlist('uri_key')
+    cipher_list = data.getlist('cipher')
+    size_list = data.getlist('size')
+    width_list = data.getlist('width')
+    height_list = data.getlist('height')
+    duration_list = data.getlist('duration')
+    asset_size_list = data.getlist('asset_size')
+    media_type_list = data.getlist('media_type')
+    preview_uri_key_list = data.getlist('preview_uri_key')
+    thumb_cipher_list = data.getlist('thumb_cipher')
+    thumb_size_list = data.getlist('thumb_size')
+    text_photo_list = data.getlist('text_photo')
+    album_cover_list = data.getlist('album_cover')
+    is_video_list = data.getlist('is_video')
+    blobs, uploaded_size = [], 0
+    for i in range(total):
+        blob = Blob(cipher=cipher_list[i],
+                    size=size_list[i],
+                    width=json.loads(width_list[i]),
+                    height=json.loads(height_list[i]),
+                    duration=json.loads(duration_list[i]),
+                    file_size=[json.loads(asset_size_list[i])])
+        uploaded_size += blob.file_size[0]
+        if not share_ext:
+            media_type = media_type_list[i]
+        else:
+            media_type = "video" if json.loads(is_video_list[i]) else "image"
+        if media_type.startswith('image'):
+            blob.uri_key = uri_key_list[i]
+        elif media_type.startswith('video'):
+            blob.uri_key = uri_key_list[i]
+            if 'preview_uri_key' in data:
+                blob.preview_uri_key = preview_uri_key_list.pop(0)
+                blob.thumb_cipher = thumb_cipher_list.pop(0)
+                blob.file_size.append(json.loads(thumb_size_list.pop(0)))
+                uploaded_size += blob.file_size[1]
+        else:
+            blob.text_photo = text_photo_list.pop(0)
+        if type == 'create':
+            album_cover = json.loads(album_cover_list[i])
+            if album_cover:
+                blob.album_cover_id = album_cover
+        blobs.append(blob)
+    return blobs, uploaded_size
+
+
 class UploadImages(generics.CreateAPIView):
+    """
+    Validates the whole multipart payload first, then writes the image, its blobs, its M2M rows and the storage
+    increment in one transaction, with a number of queries that does not depend on the number of blobs.
+    """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ImageSerializer
 
@@ -556,73 +514,50 @@ class UploadImages(generics.CreateAPIView):
         max_space = one_gb if request.user.subscription == 'basic' else one_gb * 2000
         if request.user.vault_storage >= max_space:
             return Response({'limit_reached': True})
-        uri_key_list = request.data.getlist('uri_key')
-        total = len(uri_key_list) if 'uri_key' in request.data else 1
+        total = len(request.data.getlist('uri_key')) if 'uri_key' in request.data else 1
 
         # if current_count + total > BASIC_LIMIT and request.user.subscription == 'basic':
         #     return Response({'limit_reached': True})
         type = request.data['type']
         is_profile = json.loads(request.data['is_profile'])
         group, album = None, None
+        groups_ids = request.data.getlist('groups_id')
+        connections_ids = request.data.getlist('connections_id')
 
         # Validate authorization
         if type == 'create' or type == 'more':
             group = Group.objects.get(id=request.data['group_id'])
             album = Album.objects.get(id=request.data['album_id'])
-            if not group in request.user.groups.all():
+            if not request.user.groups.filter(id=group.id).exists():
                 return Response(status=status.HTTP_401_UNAUTHORIZED)
-            if type == 'more' and album.group.id != group.id:
+            if type == 'more' and album.group_id != group.id:
                 return Response(status=status.HTTP_401_UNAUTHORIZED)
         elif type == 'share' and not is_profile:
-            if 'groups_id' in request.data:
-                groups_ids = request.user.get_groups_ids()
-                for id in request.data.getlist('groups_id'):
-                    if not id in groups_ids:
-                        return Response(status=status.HTTP_401_UNAUTHORIZED)
-                    else:
-                        group = Group.objects.get(id=id)
-                        group.last_activity = timezone.now()
-                        group.save()
-            if 'connections_id' in request.data:
-                connections_ids = request.user.get_connections_ids()
-                for id in request.data.getlist('connections_id'):
-                    if not id in connections_ids:
-                        return Response(status=status.HTTP_401_UNAUTHORIZED)
-
-        stick_id = request.data['stick_id']
-        party_id = request.data['party_id']
-        caption = request.data['caption']
+            if groups_ids and not set(groups_ids).issubset(request.user.get_groups_ids()):
+                return Response(status=status.HTTP_401_UNAUTHORIZED)
+            if connections_ids and not set(connections_ids).issubset(request.user.get_connections_ids()):
+                return Response(status=status.HTTP_401_UNAUTHORIZED)
+
         share_ext = json.loads(request.data['share_ext'])
-        cipher_list = request.data.getlist('cipher')
-        size_list = request.data.getlist('size')
-        width_list = request.data.getlist('width')
-        height_list = request.data.getlist('height')
-        duration_list = request.data.getlist('duration')
-        asset_size_list = request.data.getlist('asset_size')
-        media_type_list = request.data.getlist('media_type')
-        preview_uri_key_list = request.data.getlist('preview_uri_key')
-        thumb_cipher_list = request.data.getlist('thumb_cipher')
-        thumb_size_list = request.data.getlist('thumb_size')
-        text_photo_list = request.data.getlist('text_photo')
-        location_list = request.data.getlist('location')
-        album_cover_list = request.data.getlist('album_cover')
-        is_video_list = request.data.getlist('is_video')
-
-        image = Image.objects.create(stick_id=stick_id,
-                                     party_id=party_id,
-                                     is_profile=is_profile,
-                                     caption=caption,
-                                     user=request.user,
-                                     share_ext=share_ext)
-        image.seen_by.set([request.user])
+        try:
+            blobs, uploaded_size = build_blobs(request.data, total, share_ext, type)
+        except (ValueError, IndexError, KeyError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        image = Image(stick_id=request.data['stick_id'],
+                      party_id=request.data['party_id'],
+                      is_profile=is_profile,
+                      caption=request.data['caption'],
+                      user=request.user,
+                      share_ext=share_ext)
         if 'audio_uri' in request.data:
             image.audio_uri = request.data['audio_uri']
             image.audio_cipher = request.data['audio_cipher']
             image.audio_duration = request.data['audio_duration']
             image.file_size = [request.data['audio_size']]
+        location_list = request.data.getlist('location')
         if 'location' in request.data and location_list[0] != '':
             image.location = location_list[0]
-
         if type == 'share':
             image.index = 0
             image.of_total = total
@@ -630,49 +565,24 @@ class UploadImages(generics.CreateAPIView):
             image.album = album
             image.group = group
             if type == 'create':
-                image.groups.set([request.data['group_id']])
                 image.album_cover = album
-        image.save()
-        if 'groups_id' in request.data:
-            image.groups.set(request.data.getlist('groups_id'))
-        if 'connections_id' in request.data:
-            image.connections.set(request.data.getlist('connections_id'))
-
-        for i in range(total):
-            blob = Blob.objects.create(
-                image=image,
-                cipher=cipher_list[i],
-                size=size_list[i],
-                width=json.loads(width_list[i]),
-                height=json.loads(height_list[i]),
-                duration=json.loads(duration_list[i]),
-                file_size=[json.loads(asset_size_list[i])],
-            )
-
-            request.user.vault_storage += json.loads(asset_size_list[i])
-
-            if not share_ext:
-                media_type = media_type_list[i]
-            else:
-                media_type = "video" if json.loads(is_video_list[i]) else "image"
-            if media_type.startswith('image'):
-                blob.uri_key = uri_key_list[i]
-            elif media_type.startswith('video'):
-                blob.uri_key = uri_key_list[i]
-                if 'preview_uri_key' in request.data:
-                    blob.preview_uri_key = preview_uri_key_list.pop(0)
-                    blob.thumb_cipher = thumb_cipher_list.pop(0)
-                    blob.file_size.append(json.loads(thumb_size_list.pop(0)))
-                    request.user.vault_storage += blob.file_size[1]
-            else:
-                blob.text_photo = text_photo_list.pop(0)
-
-            if type == 'create':
-                if json.loads(album_cover_list[i]):
-                    blob.album_cover = Album.objects.get(id=album_cover_list[i])
-            blob.save()
-
-        request.user.save()
+                groups_ids = groups_ids or [group.id]
+
+        with transaction.atomic():
+            image.save()
+            image.seen_by.add(request.user)
+            if groups_ids:
+                image.groups.add(*groups_ids)
+                if type == 'share' and not is_profile:
+                    Group.objects.filter(id__in=groups_ids).update(last_activity=timezone.now())
+            if connections_ids:
+                image.connections.add(*connections_ids)
+            for blob in blobs:
+                blob.image = image
+            Blob.objects.bulk_create(blobs)
+            # bulk_create sends no post_save, so the blobs are counted here.
+            UserCounters.objects.add([request.user.id], photos_count=len(blobs))
+            request.user.add_vault_storage(uploaded_size)
         serializer = self.get_serializer(data=[image], many=True)
         serializer.is_valid()
         return Response(serializer.data)
@@ -736,12 +646,7 @@ class FetchNotes(generics.ListAPIView):
 
     def get_queryset(self):
         image_id = self.request.GET.get("q")
-        connections_parties_ids = self.request.user.get_connections_parties_ids()
-        my_groups = self.request.user.groups.all()
-        image = Image.objects.filter(Q(id=image_id) & (Q(groups__in=my_groups) |
-                                                       Q(connections__in=[self.request.user]) |
-                                                       Q(party_id__in=connections_parties_ids) |
-                                                       Q(user=self.request.user))).first()
+        image = visible_images(self.request.user, hidden=None).filter(id=image_id).first()
         if not image:
             return Note.objects.none()
         qs = image.get_notes().order_by("-timestamp")
@@ -770,12 +675,7 @@ class ReactionsCount(APIView):
         id = request.GET.get("q")
         type = request.GET.get('type')
         if type == 'image':
-            connections_parties_ids = self.request.user.get_connections_parties_ids()
-            my_groups = self.request.user.groups.all()
-            image = Image.objects.filter(Q(id=id) & (Q(groups__in=my_groups) |
-                                                     Q(connections__in=[self.request.user]) |
-                                                     Q(party_id__in=connections_parties_ids) |
-                                                     Q(user=self.request.user))).first()
+            image = visible_images(self.request.user, hidden=None).filter(id=id).first()
             if not image:
                 return Response(status=status.HTTP_401_UNAUTHORIZED)
             notifications = Notification.objects.filter(image=image, to_user=request.user)
@@ -802,14 +702,8 @@ class ReactionsCount(APIView):
             for user in note.likes.all():
                 users.append({'id': user.id, 'name': user.name, 'username': user.username})
             notes_count = 0
-        count = 0
-        ids = []
-        for notification in notifications:
-            if notification.read == False:
-                count += 1
-                notification.read = True
-                ids.append(notification.id)
-                notification.save()
+        ids = list(notifications.filter(read=False).values_list('id', flat=True))
+        count = Notification.objects.filter(id__in=ids, read=False).update(read=True) if ids else 0
         return Response(
             {"count": count, "ids": ids, 'likes_count': likes_count, 'notes_count': notes_count, 'liked_by': users})
 
@@ -820,12 +714,7 @@ class ToggleLike(APIView):
     def post(self, request):
         type = request.data['type']
         if type == 'image':
-            connections_parties_ids = self.request.user.get_connections_parties_ids()
-            my_groups = request.user.groups.all()
-            content = Image.objects.filter(Q(id=request.data['id']) & (Q(groups__in=my_groups) |
-                                                                       Q(connections__in=[self.request.user]) |
-                                                                       Q(party_id__in=connections_parties_ids) |
-                                                                       Q(user=self.request.user))).first()
+            content = visible_images(self.request.user, hidden=None).filter(id=request.data['id']).first()
             if not content:
                 return Response(status=status.HTTP_401_UNAUTHORIZED)
             content = Image.objects.get(id=request.data['id'])
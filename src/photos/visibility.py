@@ -0,0 +1,165 @@
+from django.db.models import Exists, F, OuterRef, Q
+from stick_protocol.models import Party
+from sticknet.settings import DEBUG
+from users.models import User, test_numbers
+from .models import Image, ImageVisibility
+
+
+def visible_images(user, hidden=False):
+    """
+    Returns the images `user` can see, answered from the ImageVisibility index. Pass `hidden=True` for the user's
+    hidden images only, or `hidden=None` for all of them regardless of hiding.
+    """
+    lookup = {'visibility__user': user}
+    if hidden is not None:
+        lookup['visibility__hidden'] = hidden
+    return Image.objects.filter(**lookup)
+
+
+def sync_hidden(user):
+    hidden_ids = [int(id) for id in user.hidden_images or [] if str(id).isdigit()]
+    rows = ImageVisibility.objects.filter(user=user)
+    rows.filter(image_id__in=hidden_ids, hidden=False).update(hidden=True)
+    rows.filter(hidden=True).exclude(image_id__in=hidden_ids).update(hidden=False)
+
+
+def rebuild_user(user, images=None):
+    """
+    Recomputes every index row of `user`, or only its rows of `images` (an Image queryset) when given. Called when the
+    user's groups, connections or blocked users change.
+    """
+    ids = Image.objects.filter(
+        Q(groups__in=user.groups.all()) |
+        Q(connections__in=[user]) |
+        Q(party_id__in=user.get_connections_parties_ids()) |
+        Q(user=user)) \
+        .exclude(
+        Q(user__is_active=False) |
+        Q(user__in=user.blocked.all()) |
+        Q(user__blocked__in=[user])) \
+        .values_list('id', flat=True).distinct()
+    scope = {'user': user}
+    if images is not None:
+        ids = ids.filter(id__in=images.values('id'))
+        scope['image__in'] = images.values('id')
+    hidden_ids = set(map(str, user.hidden_images or []))
+    _sync(scope, {(user.id, id): str(id) in hidden_ids for id in ids})
+
+
+def rebuild_users(users):
+    for user in User.objects.filter(id__in=users).distinct():
+        rebuild_user(user)
+
+
+def reindex_membership(users, groups, joined):
+    """
+    Updates the index after `users` joined (or left) `groups`. Only the rows that membership can change are touched:
+    each user's rows of the images shared to the groups or to the parties of their members, and the other members'
+    rows of the images shared to the users' own parties.
+    """
+    members = User.objects.filter(groups__in=groups).distinct()
+    group_images = Image.objects.filter(
+        Q(groups__in=groups) |
+        Q(party_id__in=Party.objects.filter(user__in=members, individual=False).values('id')))
+    for user in User.objects.filter(id__in=users):
+        rebuild_user(user, group_images)
+        _reindex_party_images(user, members.exclude(id=user.id), joined)
+
+
+def _reindex_party_images(user, others, joined):
+    """
+    The images shared to `user`'s parties are visible to the users `user` is a connection of. After a membership
+    change, adds them for the users of `others` that are now connected to `user`, or removes them from the ones that no
+    longer are and do not see them some other way.
+    """
+    images = Image.objects.filter(party_id__in=Party.objects.filter(user=user, individual=False).values('id'))
+    if user.is_active and user.finished_registration and (DEBUG or user.phone not in test_numbers):
+        connected = others.filter(Q(groups__in=user.groups.all()) | Q(id__in=user.connections.all()))
+    else:
+        connected = User.objects.none()
+    if joined:
+        images = list(images.filter(user__is_active=True).values_list('id', 'user_id'))
+        if not images:
+            return
+        viewers = connected.values_list('id', 'hidden_images')
+        owners = {owner_id for id, owner_id in images}
+        blocked = set(User.blocked.through.objects.filter(
+            Q(from_user__in=connected, to_user__in=owners) | Q(from_user__in=owners, to_user__in=connected))
+                      .values_list('from_user_id', 'to_user_id'))
+        ImageVisibility.objects.bulk_create(
+            [ImageVisibility(user_id=user_id, image_id=id, hidden=str(id) in (hidden_images or []))
+             for user_id, hidden_images in viewers for id, owner_id in images
+             if (user_id, owner_id) not in blocked and (owner_id, user_id) not in blocked],
+            batch_size=1000, ignore_conflicts=True)
+        return
+    rows = ImageVisibility.objects.filter(user__in=others.exclude(id__in=connected.values('id')), image__in=images) \
+        .annotate(in_group=Exists(User.groups.through.objects.filter(user=OuterRef('user'),
+                                                                      group__shared_images=OuterRef('image'))),
+                  shared=Exists(Image.connections.through.objects.filter(user=OuterRef('user'),
+                                                                         image=OuterRef('image')))) \
+        .filter(in_group=False, shared=False).exclude(image__user=F('user'))
+    ImageVisibility.objects.filter(id__in=list(rows.values_list('id', flat=True))).delete()
+
+
+def rebuild_image(image):
+    """
+    Recomputes every index row of `image`. Called when the image is created or its groups or connections change.
+    """
+    viewers = Q(groups__in=image.groups.all()) | Q(connected_images=image)
+    if image.user_id:
+        viewers |= Q(id=image.user_id)
+    party_owner = User.objects.filter(parties__id=image.party_id, parties__individual=False, is_active=True,
+                                      finished_registration=True)
+    if not DEBUG:
+        party_owner = party_owner.exclude(phone__in=test_numbers)
+    party_owner = party_owner.first()
+    if party_owner:
+        viewers |= (Q(groups__in=party_owner.groups.all()) | Q(id__in=party_owner.connections.all())) & \
+                   ~Q(id=party_owner.id)
+    users = User.objects.filter(viewers)
+    if image.user_id:
+        if not image.user.is_active:
+            users = User.objects.none()
+        users = users.exclude(Q(blocked=image.user_id) | Q(blocked_by=image.user_id))
+    wanted = {}
+    for user_id, hidden_images in users.values_list('id', 'hidden_images').distinct():
+        wanted[(user_id, image.id)] = str(image.id) in (hidden_images or [])
+    _sync({'image': image}, wanted)
+
+
+def rebuild_owner_images(user):
+    """
+    Recomputes the index rows of every image owned by `user`. Called when the user is deactivated or reactivated.
+    """
+    if not user.is_active:
+        ImageVisibility.objects.filter(image__user=user).delete()
+        return
+    for image in Image.objects.filter(user=user).select_related('user'):
+        rebuild_image(image)
+
+
+def _sync(scope, wanted):
+    """
+    Brings the index rows matching `scope` in line with `wanted`, a {(user_id, image_id): hidden} dict, touching only
+    the rows that changed.
+    """
+    rows = ImageVisibility.objects.filter(**scope)
+    stale, hide, unhide = [], [], []
+    for id, user_id, image_id, hidden in rows.values_list('id', 'user_id', 'image_id', 'hidden'):
+        key = (user_id, image_id)
+        if key not in wanted:
+            stale.append(id)
+            continue
+        if wanted.pop(key) != hidden:
+            (unhide if hidden else hide).append(id)
+    if stale:
+        ImageVisibility.objects.filter(id__in=stale).delete()
+    if hide:
+        ImageVisibility.objects.filter(id__in=hide).update(hidden=True)
+    if unhide:
+        ImageVisibility.objects.filter(id__in=unhide).update(hidden=False)
+    if wanted:
+        ImageVisibility.objects.bulk_create(
+            [ImageVisibility(user_id=user_id, image_id=image_id, hidden=hidden)
+             for (user_id, image_id), hidden in wanted.items()],
+            ignore_conflicts=True)
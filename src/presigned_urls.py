@@ -0,0 +1,57 @@
+import threading
+from time import time as now
+from django.conf import settings
+from django.core.cache import caches
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_stats():
+    """
+    Returns the hit/miss counters of the presigned url cache for this process.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+
+def cache_key(key, client_method, expires_in):
+    return 'presigned:%s:%d:%s' % (client_method, expires_in, key)
+
+
+def get_urls(storage, keys, client_method, expires_in=3600):
+    """
+    Returns a {key: url} dict of presigned urls, signing through `storage` only the keys that are not cached for
+    `expires_in` or whose cached url is within PRESIGNED_URL_SAFETY_MARGIN seconds of expiring. Entries are stored
+    with a timeout that ends at the safety margin, so the cache backend evicts them before they become unsafe to
+    hand out, and the least recently used entries are culled once the backend is full.
+    """
+    cache = caches[settings.PRESIGNED_URL_CACHE]
+    margin = settings.PRESIGNED_URL_SAFETY_MARGIN
+    cache_keys = {cache_key(key, client_method, expires_in): key for key in keys if key}
+    cached = cache.get_many(cache_keys.keys())
+    timestamp = now()
+    urls, missing = {}, []
+    for k, key in cache_keys.items():
+        entry = cached.get(k)
+        if entry and entry[1] - timestamp >= margin:
+            urls[key] = entry[0]
+        else:
+            missing.append(key)
+    if missing:
+        signed = storage.sign(missing, client_method, expires_in)
+        timeout = expires_in - margin
+        if timeout > 0:
+            cache.set_many({cache_key(key, client_method, expires_in): (url, timestamp + expires_in)
+                            for key, url in signed.items()}, timeout)
+        urls.update(signed)
+    with _stats_lock:
+        _stats['hits'] += len(urls) - len(missing)
+        _stats['misses'] += len(missing)
+    return urls
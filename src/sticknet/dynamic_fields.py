@@ -1,14 +1,38 @@
+import copy
+from collections import OrderedDict
 from rest_framework import serializers
 
+# {(serializer class, field names or None for all of them): unbound fields}, filled once per process. The names are
+# the serializer's own fields the client asked for, and past MAX_FIELD_SETS new sets are built but not kept, so
+# arbitrary `?fields=` values cannot grow it.
+FIELD_SETS = {}
+MAX_FIELD_SETS = 1000
+
+
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer limited to the `fields` it is given. The field set of each (class, fields) pair is built from the
+    model once and copied for every later instance, instead of introspecting the model on every instantiation.
+    """
+
     def __init__(self, *args, **kwargs):
         fields = kwargs.pop('fields', None)
+        self.allowed_fields = frozenset(fields) if fields is not None else None
         super(DynamicFieldsModelSerializer, self).__init__(*args, **kwargs)
-        if fields is not None:
-            allowed = set(fields)
-            existing = set(self.fields)
-            for field_name in existing - allowed:
-                self.fields.pop(field_name)
+
+    def get_fields(self):
+        all_fields = FIELD_SETS.get((type(self), None))
+        if all_fields is None:
+            all_fields = FIELD_SETS[(type(self), None)] = super(DynamicFieldsModelSerializer, self).get_fields()
+        if self.allowed_fields is None:
+            return copy.deepcopy(all_fields)
+        key = (type(self), self.allowed_fields.intersection(all_fields))
+        fields = FIELD_SETS.get(key)
+        if fields is None:
+            fields = OrderedDict((name, field) for name, field in all_fields.items() if name in key[1])
+            if len(FIELD_SETS) < MAX_FIELD_SETS:
+                FIELD_SETS[key] = fields
+        return copy.deepcopy(fields)
 
 
 class DynamicFieldsViewMixin(object):
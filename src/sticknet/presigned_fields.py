@@ -0,0 +1,57 @@
+from rest_framework import serializers
+from sticknet.settings import TESTING
+
+if not TESTING:
+    from custom_storages import S3
+else:
+    from mock_custom_storages import S3
+
+
+class PendingUrl:
+    """
+    Stands for the presigned url of `key` in a representation until the batch it belongs to is signed.
+    """
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+
+class PresignedUrlsMixin(object):
+    """
+    Presigns the urls of a whole representation with one `S3().get_files` call. While the outermost serializer using
+    the mixin renders, `presigned_url(key)` returns a placeholder that is replaced once every nested serializer is done.
+    A list is signed as one batch when its Meta sets `list_serializer_class = PresignedListSerializer`.
+    """
+
+    def presigned_url(self, key):
+        if not key:
+            return None
+        if getattr(self.root, '_pending_urls', None) is None:
+            return S3().get_file(key)
+        return PendingUrl(key)
+
+    def to_representation(self, instance):
+        root = self.root
+        opened = getattr(root, '_pending_urls', None) is None
+        if opened:
+            root._pending_urls = []
+        try:
+            ret = super(PresignedUrlsMixin, self).to_representation(instance)
+            if isinstance(ret, dict):
+                root._pending_urls += [(ret, name) for name, value in ret.items() if isinstance(value, PendingUrl)]
+        except Exception:
+            if opened:
+                root._pending_urls = None
+            raise
+        if opened:
+            pending, root._pending_urls = root._pending_urls, None
+            if pending:
+                urls = S3().get_files([data[name].key for data, name in pending])
+                for data, name in pending:
+                    data[name] = urls.get(data[name].key)
+        return ret
+
+
+class PresignedListSerializer(PresignedUrlsMixin, serializers.ListSerializer):
+    pass
@@ -0,0 +1,113 @@
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models.query import ValuesIterable
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Fields whose to_representation returns a database value of the right type unchanged.
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ChoiceField)
+
+
+class Row(dict):
+    """
+    A `.values()` row that also reads as attributes, so the serializers' get_* methods and the pagination classes can
+    use it in place of a model instance.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class RowIterable(ValuesIterable):
+
+    def __iter__(self):
+        for row in super(RowIterable, self).__iter__():
+            yield Row(row)
+
+
+class Projection:
+    """
+    The output of a read-only ModelSerializer compiled into a flat projection over `.values()` rows: a column and a
+    converter per model field, and the serializer's own get_* methods for its SerializerMethodFields. Rows are
+    serialized without instantiating models or running the field binding and dispatch of DRF for every row.
+
+    Only serializers made of concrete model fields, forward foreign keys (as primary keys) and method fields that read
+    the model's columns can be projected, anything else raises ImproperlyConfigured when the projection is compiled.
+    """
+    _compiled = {}
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        model = serializer_class.Meta.model
+        # Every column is selected, the method fields can read any of them.
+        self.columns, self.fields = [field.attname for field in model._meta.concrete_fields], []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                self.fields.append((name, None, field.method_name))
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is None or not model_field.concrete or model_field.many_to_many or \
+                    isinstance(field, (serializers.BaseSerializer, serializers.FileField)):
+                raise ImproperlyConfigured('%s.%s cannot be projected' % (serializer_class.__name__, name))
+            if isinstance(field, serializers.PrimaryKeyRelatedField) or isinstance(field, PLAIN_FIELDS):
+                convert = None
+            elif isinstance(field, serializers.FloatField):
+                convert = float
+            else:
+                convert = field.to_representation
+            self.fields.append((name, model_field.attname, convert))
+
+    @classmethod
+    def of(cls, serializer_class):
+        projection = cls._compiled.get(serializer_class)
+        if projection is None:
+            projection = cls._compiled[serializer_class] = cls(serializer_class)
+        return projection
+
+    def rows(self, queryset):
+        """
+        Returns `queryset` as a queryset of the Rows the projection reads.
+        """
+        queryset = queryset.values(*self.columns)
+        queryset._iterable_class = RowIterable
+        return queryset
+
+    def represent(self, rows, context=None):
+        # The method fields are bound once per call to a serializer carrying the request context. `self.fields` holds
+        # (name, column, converter) for columns and (name, None, method name) for method fields.
+        serializer = self.serializer_class(context=context or {})
+        fields = [(name, column, convert if column else getattr(serializer, convert))
+                  for name, column, convert in self.fields]
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                if column is None:
+                    item[name] = convert(row)
+                    continue
+                value = row[column]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+class ProjectedListMixin(object):
+    """
+    Serves `list` from the Projection of the view's serializer. Opt in on read-only list endpoints whose serializer
+    can be projected, the output is the same as the serializer's.
+    """
+
+    def list(self, request, *args, **kwargs):
+        projection = Projection.of(self.get_serializer_class())
+        queryset = projection.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.represent(page, self.get_serializer_context()))
+        return Response(projection.represent(queryset, self.get_serializer_context()))
@@ -91,13 +91,16 @@ PROJECT_APPS = [
     'chat',
     'groups',
     'notifications',
-    'photos',
+    'photos.apps.PhotosConfig',
     'support',
     'users',
     'stick_protocol',
     'keys',
     'iap',
-    'vault'
+    'vault',
+    'jobs',
+    'counters.apps.CountersConfig',
+    'mailer'
 ]
 
 THIRD_PARTY_APPS = [
@@ -157,6 +160,31 @@ AWS_SECRET_ACCESS_KEY = os.environ['AWS_SECRET_ACCESS_KEY']
 
 STORJ_BUCKET_NAME = os.environ['STORJ_DEV_BUCKET_NAME'] if DEBUG else os.environ['STORJ_BUCKET_NAME']
 
+# Presigned Storj urls are cached until they get within PRESIGNED_URL_SAFETY_MARGIN seconds of expiring. The cache is
+# per process by default, set PRESIGNED_URL_CACHE_BACKEND/LOCATION to share it between workers (e.g. memcached).
+PRESIGNED_URL_CACHE = 'presigned_urls'
+PRESIGNED_URL_SAFETY_MARGIN = int(os.environ.get('PRESIGNED_URL_SAFETY_MARGIN', 300))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    PRESIGNED_URL_CACHE: {
+        'BACKEND': os.environ.get('PRESIGNED_URL_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PRESIGNED_URL_CACHE_LOCATION', 'presigned-urls'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('PRESIGNED_URL_CACHE_MAX_ENTRIES', 50000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# Side effects (S3/Firebase deletes, emails) are enqueued with jobs.queue.enqueue. The database broker stores them for
+# the `run_jobs` worker, the immediate broker runs them inline and is used by the tests and local development.
+JOBS_BROKER = os.environ.get('JOBS_BROKER', 'jobs.queue.ImmediateBroker' if TESTING else 'jobs.queue.DatabaseBroker')
+# The immediate broker raises task failures in the test suite and only logs them in local development.
+JOBS_RAISE_EXCEPTIONS = sys.argv[1:2] == ['test']
+
 # AWS_CLOUDFRONT_KEY = os.environ['AWS_CLOUDFRONT_KEY']
 # AWS_CLOUDFRONT_KEY_ID = os.environ['AWS_CLOUDFRONT_KEY_ID']
 # AWS_S3_CUSTOM_DOMAIN = os.environ['CDN']
@@ -189,7 +217,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'sticknet.renderers.FastJSONRenderer',
     ),
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     'DATETIME_FORMAT': '%Y-%m-%dT%H:%M:%S.%fZ',
@@ -213,6 +241,7 @@ else:
     MIDDLEWARE = []
 MIDDLEWARE += [
     'django.middleware.security.SecurityMiddleware',
+    'sticknet.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -221,6 +250,9 @@ MIDDLEWARE += [
     'django_otp.middleware.OTPMiddleware',
 ]
 
+# Responses smaller than this are not compressed by CompressionMiddleware.
+COMPRESSION_MIN_SIZE = 1024
+
 ROOT_URLCONF = 'sticknet.urls'
 
 TEMPLATES = [
@@ -0,0 +1,21 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Count, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    """
+    Correlated COUNT(*) of `queryset` grouped by `field`, for annotating counters without joining (and multiplying)
+    the outer rows.
+    """
+    return Coalesce(Subquery(queryset.order_by().values(field).annotate(count=Count('pk')).values('count')), 0)
+
+
+class ArraySubquery(Subquery):
+    """
+    Correlated ARRAY(SELECT ...) of the single column selected by `queryset`, an empty list when nothing matches.
+    """
+    template = 'ARRAY(%(subquery)s)'
+
+    def __init__(self, queryset, base_field, **extra):
+        super(ArraySubquery, self).__init__(queryset, output_field=ArrayField(base_field), **extra)
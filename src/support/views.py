@@ -1,11 +1,11 @@
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.core.mail import EmailMultiAlternatives
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
 
+from jobs.queue import enqueue
+from jobs.tasks import send_email
 from .models import Report, Feedback, Question, Error, UserReport, PostReport, PublicFile
 from users.models import User
 from photos.models import Image
@@ -37,10 +37,7 @@ class AskQuestion(APIView):
             identifier = request.user.email
         question.save()
         html_content = render_to_string('question.html', {'identifier': identifier, 'question': request.data['text']})
-        text_content = strip_tags(html_content)
-        mail = EmailMultiAlternatives('Question', text_content, 'founder@sticknet.org', ['founder@sticknet.org'])
-        mail.attach_alternative(html_content, "text/html")
-        mail.send()
+        enqueue(send_email, 'Question', html_content, 'founder@sticknet.org', ['founder@sticknet.org'])
         return Response({'sent': True})
 
 
@@ -66,10 +63,7 @@ class ErrorReport(APIView):
                                                        'system_version': data['system_version'],
                                                        'app_version': data['app_version'], 'username': username,
                                                        'screen': screen})
-        text_content = strip_tags(html_content)
-        mail = EmailMultiAlternatives('Application Error', text_content, 'founder@sticknet.org', ['stiiick.app.errors@gmail.com'])
-        mail.attach_alternative(html_content, "text/html")
-        mail.send()
+        enqueue(send_email, 'Application Error', html_content, 'founder@sticknet.org', ['stiiick.app.errors@gmail.com'])
         return Response(status=status.HTTP_200_OK)
 
 class ReportUser(APIView):
@@ -7,6 +7,8 @@ from django.db import transaction
 
 class UserAdmin(admin.ModelAdmin):
     search_fields = ['username', 'email']
+    # Not written by User.save(), see the storage counters of User.
+    readonly_fields = ['vault_storage', 'chat_storage']
 
     def delete_queryset(self, request, queryset):
         with transaction.atomic():
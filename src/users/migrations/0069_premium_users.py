@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0068_auto_20240617_0421'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(subscription='premium'), fields=['subscription'], name='premium_users'),
+        ),
+    ]
@@ -4,14 +4,14 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.postgres.fields import ArrayField
-from django.db.models import Q
+from django.db.models import Q, F
 from knox.models import AuthToken
 
-from custom_storages import S3
-from sticknet.settings import DEFAULT_APP, FIREBASE_REF, FIREBASE_REF_DEV, TESTING
-from firebase_admin import db, auth
+from jobs.queue import enqueue
+from jobs.tasks import enqueue_storage_deletes, delete_firebase_ref, delete_firebase_user
 
 from groups.models import Group, Cipher
+from stick_protocol.models import Party
 from sticknet.settings import DEBUG
 
 class ProfilePicture(models.Model):
@@ -37,12 +37,7 @@ class ProfilePicture(models.Model):
         return str(self.id)
 
     def delete(self, using=None, keep_parents=False):
-        if self.uri_key:
-            S3().delete_file(self.uri_key)
-        if self.preview_uri_key:
-            S3().delete_file(self.preview_uri_key)
-        if self.self_uri_key:
-            S3().delete_file(self.self_uri_key)
+        enqueue_storage_deletes([self.uri_key, self.preview_uri_key, self.self_uri_key])
         super(ProfilePicture, self).delete(using, keep_parents)
 
 
@@ -63,8 +58,7 @@ class ProfileCover(models.Model):
 
 
     def delete(self, using=None, keep_parents=False):
-        if self.uri_key:
-            S3().delete_file(self.uri_key)
+        enqueue_storage_deletes([self.uri_key])
         super(ProfileCover, self).delete(using, keep_parents)
 
 class LimitedAccessToken(models.Model):
@@ -106,6 +100,10 @@ class EmailVerification(models.Model):
     block_time = models.DateTimeField(blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+
+STORAGE_COUNTERS = ('vault_storage', 'chat_storage')
+
+
 class User(AbstractUser):
     id = models.CharField(primary_key=True, unique=True, max_length=1000)
     one_time_id = models.CharField(max_length=1000, blank=True, null=True)
@@ -145,38 +143,45 @@ class User(AbstractUser):
     subscription = models.CharField(max_length=100, choices=SUBSCRIPTION_CHOICES, default='basic')
     platform = models.CharField(max_length=10, choices=PLATFORM_CHOICES, blank=True, null=True)
     subscription_expiring = models.BooleanField(default=False)
+    # The storage counters are changed with F() increments (add_vault_storage, RoomStorage.objects.add). save() leaves
+    # them out of the UPDATE of an existing user, so a user loaded earlier in a request does not write back stale
+    # values. Pass them in update_fields to write them.
     vault_storage = models.BigIntegerField(default=0)
     chat_storage = models.BigIntegerField(default=0)
     whitelist_premium = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        # Premium users are the few rows the daily subscription sweep (iap.expiry) starts from.
+        indexes = [models.Index(fields=['subscription'], condition=Q(subscription='premium'), name='premium_users')]
+
     def __str__(self):
         return str(self.username) + ' - ' + str(self.email or self.phone)
 
     def save(self, *args, **kwargs):
         if not self.id:
             self.id = uuid.uuid4()
+        if not self._state.adding and not args and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in STORAGE_COUNTERS and
+                                       field.attname not in deferred]
         super(User, self).save(*args, **kwargs)
 
+    def add_vault_storage(self, size):
+        User.objects.filter(id=self.id).update(vault_storage=F('vault_storage') + size)
+        self.vault_storage += size
+
     def delete(self, using=None, keep_parents=False):
-        # TODO: delete firebase user
-        if not TESTING:
-            firebase_ref = FIREBASE_REF_DEV if DEBUG else FIREBASE_REF
-            db.reference('users/' + str(self.id), DEFAULT_APP, firebase_ref).delete()
-            try:
-                user = auth.get_user_by_email(self.email)
-                auth.delete_user(user.uid)
-            except:
-                print('no firebase user')
+        enqueue(delete_firebase_ref, 'users/' + str(self.id))
+        enqueue(delete_firebase_user, self.email)
         if self.profile_picture:
             self.profile_picture.delete()
         if self.cover:
             self.cover.delete()
-        for file in self.files.all():
-            file.delete()
-        for file in self.chat_files.all():
-            file.delete()
-        for file in self.chat_audios.all():
-            file.delete()
+        self.files.model.objects.delete_tree(self.files.values_list('id', flat=True))
+        self.chat_files.model.objects.delete_files(self.chat_files.all())
+        enqueue_storage_deletes(self.chat_audios.values_list('uri_key', flat=True))
         super(User, self).delete(using, keep_parents)
 
     def get_groups(self):
@@ -191,19 +196,19 @@ class User(AbstractUser):
     def storage_used(self):
         return self.vault_storage + self.chat_storage
 
-    def get_connections_parties_ids(self):  # todo exclude maybe redundant
+    def get_connections(self):
+        connections = User.objects.filter(Q(groups__in=self.groups.all()) | Q(connections=self)).exclude(
+            Q(id=self.id) | Q(is_active=False) | Q(finished_registration=False))
         if not DEBUG:
-            connections = User.objects.filter(
-                Q(groups__in=self.groups.all()) | Q(connections__in=[self])).distinct().exclude(
-                Q(id=self.id) | Q(is_active=False) | Q(finished_registration=False) | Q(phone__in=test_numbers))
-        else:
-            connections = User.objects.filter(
-                Q(groups__in=self.groups.all()) | Q(connections__in=[self])).distinct().exclude(
-                Q(id=self.id) | Q(is_active=False) | Q(finished_registration=False))
-        ids = []
-        for connection in connections:
-            ids.append(connection.parties.get(individual=False).id)
-        return ids
+            connections = connections.exclude(phone__in=test_numbers)
+        return connections
+
+    def get_connections_parties_ids(self):
+        """
+        Returns the ids of the connections' non-individual parties as a lazy subquery, so it can be inlined into
+        `party_id__in` lookups.
+        """
+        return Party.objects.filter(user__in=self.get_connections(), individual=False).values_list('id', flat=True)
 
     def chat_parties(self):
         return self.party_connections.all() | self.parties.filter(individual=True)
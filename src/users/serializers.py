@@ -1,22 +1,20 @@
+from django.db.models import CharField, OuterRef, Prefetch, Subquery
 from rest_framework import serializers
 
-from sticknet.settings import TESTING
-if not TESTING:
-    from custom_storages import S3
-else:
-    from mock_custom_storages import S3
 from .models import ProfilePicture, User, ProfileCover
-from notifications.models import ConnectionRequest
+from notifications.models import ConnectionRequest, Invitation, PNToken
 from stick_protocol.models import EncryptionSenderKey
 from groups.serializers import GroupSerializer, CipherSerializer
 from sticknet.dynamic_fields import DynamicFieldsModelSerializer
-from groups.models import Cipher, GroupRequest
-from photos.models import Blob
+from sticknet.presigned_fields import PresignedUrlsMixin, PresignedListSerializer
+from sticknet.subqueries import count_subquery, ArraySubquery
+from groups.models import Cipher, Group, GroupRequest
+from photos.models import Blob, Image, Note
 from stick_protocol.models import Party
 import hashlib
 
 
-class ProfilePictureSerializer(serializers.ModelSerializer):
+class ProfilePictureSerializer(PresignedUrlsMixin, serializers.ModelSerializer):
     presigned_url = serializers.SerializerMethodField()
     preview_presigned_url = serializers.SerializerMethodField()
     self_presigned_url = serializers.SerializerMethodField()
@@ -25,36 +23,28 @@ class ProfilePictureSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_presigned_url(self, object):
-        if not object.uri_key:
-            return None
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
     def get_preview_presigned_url(self, object):
-        if not object.preview_uri_key:
-            return None
-        return S3().get_file(object.preview_uri_key)
+        return self.presigned_url(object.preview_uri_key)
 
     def get_self_presigned_url(self, object):
-        if not object.self_uri_key:
-            return None
-        return S3().get_file(object.self_uri_key)
+        return self.presigned_url(object.self_uri_key)
 
 
 
 
-class ProfileCoverSerializer(serializers.ModelSerializer):
+class ProfileCoverSerializer(PresignedUrlsMixin, serializers.ModelSerializer):
     presigned_url = serializers.SerializerMethodField()
     class Meta:
         model = ProfileCover
         fields = '__all__'
 
     def get_presigned_url(self, object):
-        if not object.uri_key:
-            return None
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
 
-class UserBaseSerializer(DynamicFieldsModelSerializer):
+class UserBaseSerializer(PresignedUrlsMixin, DynamicFieldsModelSerializer):
     is_connected = serializers.SerializerMethodField()
     requested = serializers.SerializerMethodField()
     profile_picture = ProfilePictureSerializer(read_only=True)
@@ -63,6 +53,7 @@ class UserBaseSerializer(DynamicFieldsModelSerializer):
         model = User
         fields = ['id', 'color', 'one_time_id', 'username', 'name', 'dial_code', 'phone', 'phone_hash', 'is_connected',
                   'requested', 'profile_picture', 'subscription']
+        list_serializer_class = PresignedListSerializer
 
     def get_is_connected(self, obj):
         try:
@@ -90,6 +81,7 @@ class GroupMemberSerializer(UserBaseSerializer):
         model = User
         fields = ['id', 'one_time_id', 'username', 'name', 'dial_code', 'phone', 'phone_hash', 'color',
                   'profile_picture', 'subscription']
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
     def setup_eager_loading(queryset):
@@ -130,6 +122,7 @@ class UserBaseConnectionSerializer(UserPublicSerializer):
         fields = ['id', 'one_time_id', 'username', 'name', 'color', 'dial_code', 'phone', 'phone_hash',
                   'profile_picture',
                   'is_connected', 'requested', 'subscription', 'new_posts_count', 'room_id']
+        list_serializer_class = PresignedListSerializer
 
     # VIP TODO: to be removed
     def get_new_posts_count(self, obj):
@@ -157,14 +150,24 @@ class UserConnectionSerializer(UserBaseConnectionSerializer):
                   'status',
                   'groups_count', 'profile_photos_count', 'birth_day', 'birth_day_hidden', 'connections_count',
                   'highlights_ids', 'cover', 'profile_picture', 'new_posts_count', 'subscription', 'room_id']
+        list_serializer_class = PresignedListSerializer
 
     def get_groups_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.groups_count
         return obj.get_groups().count()
 
     def get_profile_photos_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.profile_photos_count
         return obj.images.filter(is_profile=True).count()
 
     def get_connections_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.connections_count
         if not obj.connections:
             return 0
         return obj.connections.all().count()
@@ -176,7 +179,7 @@ class UserConnectionSerializer(UserBaseConnectionSerializer):
 
     @staticmethod
     def setup_eager_loading(queryset):
-        queryset = queryset.select_related('profile_picture', 'cover', 'status', 'birth_day')
+        queryset = queryset.select_related('profile_picture', 'cover', 'status', 'birth_day', 'counters')
         return queryset
 
 
@@ -256,13 +259,37 @@ class UserSerializer(UserConnectionSerializer):
             'platform'
         ]
         extra_kwargs = {'password': {'write_only': True}, 'id': {'read_only': True}}
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
     def setup_eager_loading(queryset):
-        queryset = queryset.select_related('profile_picture', 'cover', 'status', 'birth_day')
+        queryset = queryset.select_related('profile_picture', 'cover', 'status', 'birth_day', 'counters')
         queryset = queryset.prefetch_related('groups')
         return queryset
 
+    @staticmethod
+    def setup_aggregates(queryset):
+        """
+        Joins the user's counters row and annotates the remaining counters and id lists as correlated subqueries, so a
+        user is serialized from a single row plus the `groups` and `group_requests` prefetches instead of a query per
+        field. The get_* methods fall back to querying when the user was not loaded through here.
+        """
+        user = OuterRef('pk')
+        queryset = queryset.select_related('profile_picture', 'cover', 'status__user', 'birth_day__user', 'counters')
+        queryset = queryset.prefetch_related(
+            Prefetch('groups', queryset=GroupSerializer.setup_eager_loading(Group.objects.all())),
+            Prefetch('group_requests', queryset=GroupRequest.objects.select_related('display_name')))
+        return queryset.annotate(
+            shared_count=count_subquery(Image.objects.filter(user=user, group__isnull=True), 'user'),
+            notes_count=count_subquery(Note.objects.filter(user=user), 'user'),
+            invitations_count=count_subquery(Invitation.objects.filter(to_user=user), 'to_user'),
+            cr_count=count_subquery(ConnectionRequest.objects.filter(to_user=user), 'to_user'),
+            blocked_ids=ArraySubquery(User.blocked.through.objects.filter(from_user=user).values('to_user'),
+                                      CharField()),
+            pnt_devices=ArraySubquery(PNToken.objects.filter(user=user).values('device_id'), CharField()),
+            party_id=Subquery(Party.objects.filter(user=user, individual=False).values('id')[:1]),
+            room_id=Subquery(Party.objects.filter(user=user, individual=True).values('id')[:1]))
+
     def update(self, instance, data):
         instance.name = data.pop('name')
         instance.username = data.pop('username')
@@ -353,27 +380,46 @@ class UserSerializer(UserConnectionSerializer):
         return instance
 
     def get_images_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.images_count
         return obj.images.filter(group__isnull=False).count()
 
     def get_shared_count(self, obj):
+        if hasattr(obj, 'shared_count'):
+            return obj.shared_count
         return obj.images.filter(group__isnull=True).count()
 
     def get_photos_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.photos_count
         return Blob.objects.filter(image__user=obj).count()
 
     def get_notes_count(self, obj):
+        if hasattr(obj, 'notes_count'):
+            return obj.notes_count
         return obj.notes.count()
 
     def get_albums_count(self, obj):
+        counters = getattr(obj, 'counters', None)
+        if counters:
+            return counters.albums_count
         return obj.albums.count()
 
     def get_invitations_count(self, obj):
+        if hasattr(obj, 'invitations_count'):
+            return obj.invitations_count
         return obj.invitations.count()
 
     def get_cr_count(self, obj):
+        if hasattr(obj, 'cr_count'):
+            return obj.cr_count
         return obj.connection_requests.count()
 
     def get_blocked_ids(self, obj):
+        if hasattr(obj, 'blocked_ids'):
+            return obj.blocked_ids
         ids = []
         for user in obj.blocked.all():
             ids.append(user.id)
@@ -387,6 +433,8 @@ class UserSerializer(UserConnectionSerializer):
 
     # Push Notification Tokens device ids
     def get_pnt_devices(self, obj):
+        if hasattr(obj, 'pnt_devices'):
+            return obj.pnt_devices
         devices = []
         tokens = obj.pn_tokens.all()
         for token in tokens:
@@ -394,21 +442,24 @@ class UserSerializer(UserConnectionSerializer):
         return devices
 
     def get_party_id(self, obj):
+        if hasattr(obj, 'party_id'):
+            return obj.party_id
         if obj.has_party():
             party = obj.parties.get(individual=False)
             return party.id
         return None
 
     def get_room_id(self, obj):
+        if hasattr(obj, 'room_id'):
+            return obj.room_id
         if obj.has_party():
             party = obj.parties.get(individual=True)
             return party.id
         return None
 
     def get_group_requests(self, obj):
-        requests = GroupRequest.objects.filter(user=obj)
         group_requests = []
-        for request in requests:
-            group_requests.append({'id': request.group.id, 'display_name': request.display_name.text,
+        for request in obj.group_requests.all():
+            group_requests.append({'id': request.group_id, 'display_name': request.display_name.text,
                                    'stick_id': request.display_name.stick_id})
         return group_requests
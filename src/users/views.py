@@ -1,7 +1,7 @@
 import random, re, names, json
 from random import randrange
 
-from django.db.models import Q
+from django.db.models import Q, OuterRef
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.core.mail import EmailMultiAlternatives
@@ -14,6 +14,8 @@ from knox.crypto import create_token_string, hash_token, create_salt_string
 
 from firebase_admin import auth
 from django.utils import timezone
+from jobs.queue import enqueue
+from jobs.tasks import send_email
 
 from .serializers import UserSerializer, UserPublicSerializer, UserBaseSerializer, UserConnectionSerializer, \
     ProfilePictureSerializer, ProfileCoverSerializer
@@ -24,8 +26,9 @@ from vault.models import File
 from stick_protocol.models import PreKey, EncryptionSenderKey
 from photos.pagination import DynamicPagination
 from groups.models import Cipher, Group
-from notifications.models import ConnectionRequest
+from notifications.models import ConnectionRequest, Notification
 from sticknet.settings import DEBUG
+from sticknet.subqueries import count_subquery
 from sticknet.permissions import LimitedAccessPermission
 from django.core.cache import cache
 from groups.serializers import CipherSerializer
@@ -228,15 +231,11 @@ class RefreshUser(generics.GenericAPIView):
     serializer_class = UserSerializer
 
     def get(self, request):
-        user = request.user
-        user.last_login = timezone.now()
-        user.save()
-        pre_keys_count = PreKey.objects.filter(user=user, used=False).count()
-        notifications = user.notifications.all()
-        unread_count = 0
-        for notification in notifications:
-            if notification.read == False:
-                unread_count += 1
+        User.objects.filter(id=request.user.id).update(last_login=timezone.now())
+        user = UserSerializer.setup_aggregates(User.objects.filter(id=request.user.id)).annotate(
+            pre_keys_count=count_subquery(PreKey.objects.filter(user=OuterRef('pk'), used=False), 'user'),
+            unread_count=count_subquery(Notification.objects.filter(to_user=OuterRef('pk'), read=False), 'to_user')
+        ).get()
         firebase_token = None
         if "should_get_firebase_token" in request.GET:
             should_get_firebase_token = json.loads(request.GET.get("should_get_firebase_token"))
@@ -244,8 +243,8 @@ class RefreshUser(generics.GenericAPIView):
                 firebase_token = auth.create_custom_token(user.id, {'email': user.email})
         data = {
             'user': self.serializer_class(user, context=self.get_serializer_context()).data,
-            'pre_keys_count': pre_keys_count,
-            'unread_count': unread_count,
+            'pre_keys_count': user.pre_keys_count,
+            'unread_count': user.unread_count,
             'firebase_token': firebase_token
         }
         return Response(data)
@@ -688,11 +687,7 @@ class RequestEmailCode(APIView):
         EmailVerification.objects.filter(email=email).all().delete()
         EmailVerification.objects.create(email=email, code=code)
         html_content = render_to_string('email_code.html', {'code': code})
-        text_content = strip_tags(html_content)
-        mail = EmailMultiAlternatives('Sticknet: Email verification', text_content, 'no-reply@sticknet.org',
-                                      [email])
-        mail.attach_alternative(html_content, "text/html")
-        mail.send()
+        enqueue(send_email, 'Sticknet: Email verification', html_content, 'no-reply@sticknet.org', [email])
         return Response({'registered': registered})
 
 
@@ -708,27 +703,6 @@ class VerifyEmailCode(APIView):
 
 ############################################################################################################
 
-
-from sticknet.permissions import ServerAdminPermission
-
-
-## TODO: next time email title should be "Sticknet" not "no-reply"
-# Desktop UI can be improved
-class EmailReminder(APIView):
-    permission_classes = [ServerAdminPermission]
-
-    def get(self, request):
-        for user in User.objects.all():
-            if user.email:
-                html_content = render_to_string('update.html')
-                text_content = strip_tags(html_content)
-                mail = EmailMultiAlternatives('Sticknet: Reworked chatting experience!', text_content,
-                                              'no-reply@sticknet.org',
-                                              [user.email])
-                mail.attach_alternative(html_content, "text/html")
-                mail.send()
-        return Response({})
-
 import requests
 from socket import gethostname, gethostbyname
 class TestIP(APIView):
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0033_auto_20240617_0603'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'is_photo', '-timestamp', '-id'], name='vault_file_user_id_0979af_idx'),
+        ),
+    ]
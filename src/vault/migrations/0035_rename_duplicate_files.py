@@ -0,0 +1,35 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:23
+
+import os
+from django.db import migrations
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    # Names raced past the old exists() check can already be duplicated, rename them before adding the constraints.
+    File = apps.get_model('vault', 'File')
+    # NULL names never violate the constraints.
+    duplicates = File.objects.filter(name__isnull=False).values('user_id', 'folder_id', 'name') \
+        .annotate(count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        siblings = File.objects.filter(user_id=duplicate['user_id'], folder_id=duplicate['folder_id'])
+        taken = set(siblings.values_list('name', flat=True))
+        base_name, extension = os.path.splitext(duplicate['name'])
+        counter = 2
+        for file in siblings.filter(name=duplicate['name']).order_by('id')[1:]:
+            while '%s(%d)%s' % (base_name, counter, extension) in taken:
+                counter += 1
+            file.name = '%s(%d)%s' % (base_name, counter, extension)
+            taken.add(file.name)
+            file.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0034_timeline_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.5 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0035_rename_duplicate_files'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(fields=('user', 'folder', 'name'), name='unique_file_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(condition=models.Q(folder__isnull=True), fields=('user', 'name'), name='unique_root_file_name'),
+        ),
+    ]
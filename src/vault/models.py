@@ -1,11 +1,10 @@
 import os
-from django.db import models
+from collections import defaultdict
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
 from django.contrib.auth import get_user_model
-from sticknet.settings import TESTING
-if not TESTING:
-    from custom_storages import S3
-else:
-    from mock_custom_storages import S3
+from jobs.tasks import enqueue_storage_deletes
 
 
 User = get_user_model()
@@ -22,6 +21,88 @@ class VaultAlbum(models.Model):
     name = models.CharField(max_length=100, blank=True, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+# The given files and everything nested inside the folders among them, walked down File.folder in one query.
+TREE_SQL = '''
+    WITH RECURSIVE tree(id) AS (
+        SELECT id FROM vault_file WHERE id = ANY(%s)
+        UNION
+        SELECT vault_file.id FROM vault_file JOIN tree ON vault_file.folder_id = tree.id
+    )
+    SELECT id FROM tree
+'''
+
+
+class FileManager(models.Manager):
+
+    def allocate_names(self, user_id, folder_id, names, exclude_id=None):
+        """
+        Returns `names` made unique within the folder, e.g. a second `a.jpg` becomes `a(2).jpg`. The sibling names that
+        could collide are fetched in one query and the suffixes of the whole batch are assigned in memory.
+        """
+        bases = {os.path.splitext(name)[0] for name in names if name is not None}
+        if not bases:
+            return list(names)
+        siblings = Q()
+        for base in bases:
+            siblings |= Q(name__startswith=base)
+        taken = set(self.filter(siblings, user_id=user_id, folder_id=folder_id).exclude(id=exclude_id)
+                    .values_list('name', flat=True))
+        allocated, counters = [], {}
+        for name in names:
+            if name is None:
+                allocated.append(name)
+                continue
+            file_name, counter = name, counters.get(name, 2)
+            while file_name in taken:
+                file_name = insert_counter_in_filename(name, counter)
+                counter += 1
+            counters[name] = counter
+            taken.add(file_name)
+            allocated.append(file_name)
+        return allocated
+
+    def bulk_create_named(self, files, attempts=3):
+        """
+        Inserts a batch of unsaved files of one user and folder with unique names. If a concurrent upload takes one of
+        the allocated names first, the unique constraint rejects the batch and the names are allocated again.
+        """
+        names = [file.name for file in files]
+        for attempt in range(attempts):
+            if files:
+                for file, name in zip(files, self.allocate_names(files[0].user_id, files[0].folder_id, names)):
+                    file.name = name
+            try:
+                with transaction.atomic():
+                    return self.bulk_create(files)
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+
+    def tree(self, ids):
+        return self.filter(id__in=RawSQL(TREE_SQL, [[int(id) for id in ids]]))
+
+    def delete_tree(self, ids):
+        """
+        Deletes the files `ids` with the contents of the folders among them, frees their owners' vault storage and
+        enqueues the deletion of their storage objects in batches.
+        """
+        files = self.tree(ids)
+        keys, freed = [], defaultdict(int)
+        for user_id, uri_key, preview_uri_key, file_size, preview_file_size in files.values_list(
+                'user_id', 'uri_key', 'preview_uri_key', 'file_size', 'preview_file_size'):
+            if uri_key:
+                keys.append(uri_key)
+                freed[user_id] += file_size or 0
+            if preview_uri_key:
+                keys.append(preview_uri_key)
+                freed[user_id] += preview_file_size or 0
+        with transaction.atomic():
+            for user_id, size in freed.items():
+                User.objects.filter(id=user_id).update(vault_storage=F('vault_storage') - size)
+            files.delete()
+            enqueue_storage_deletes(keys)
+
+
 # A model that represents a file object and a folder object
 class File(models.Model):
     uri_key = models.CharField(unique=True, blank=True, null=True, max_length=36)
@@ -43,29 +124,21 @@ class File(models.Model):
     height = models.IntegerField(default=0)
     duration = models.FloatField(default=0)
     timestamp = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+    objects = FileManager()
 
-    def delete(self, using=None, keep_parents=False):
-        for file in self.files.all():
-            file.delete()
-        if self.uri_key:
-            S3().delete_file(self.uri_key)
-            self.user.vault_storage -= self.file_size
-        if self.preview_uri_key:
-            S3().delete_file(self.preview_uri_key)
-            self.user.vault_storage -= self.preview_file_size
-        self.user.save()
-        super(File, self).delete(using, keep_parents)
+    class Meta:
+        indexes = [models.Index(fields=['user', 'is_photo', '-timestamp', '-id'])]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'folder', 'name'], name='unique_file_name'),
+            models.UniqueConstraint(fields=['user', 'name'], condition=Q(folder__isnull=True),
+                                    name='unique_root_file_name'),
+        ]
 
+    def delete(self, using=None, keep_parents=False):
+        File.objects.delete_tree([self.id])
 
     def save(self, *args, **kwargs):
-        exists = File.objects.filter(user=self.user, folder=self.folder, name=self.name).exclude(id=self.id).exists()
-        increment = 2
-        file_name = self.name
-        while exists:
-            file_name = insert_counter_in_filename(self.name, increment)
-            exists = File.objects.filter(user=self.user, folder=self.folder, name=file_name).exists()
-            increment += 1
-        self.name = file_name
+        self.name = File.objects.allocate_names(self.user_id, self.folder_id, [self.name], exclude_id=self.id)[0]
         super(File, self).save(*args, **kwargs)
 
 
@@ -2,19 +2,21 @@ from rest_framework import serializers
 
 from sticknet.settings import TESTING
 from .models import File, VaultAlbum, VaultNote
+from sticknet.presigned_fields import PresignedUrlsMixin, PresignedListSerializer
 if not TESTING:
     from custom_storages import S3
 else:
     from mock_custom_storages import S3
 
 
-class FileSerializer(serializers.ModelSerializer):
+class FileSerializer(PresignedUrlsMixin, serializers.ModelSerializer):
     presigned_url = serializers.SerializerMethodField()
     preview_presigned_url = serializers.SerializerMethodField()
     uri_key = serializers.SerializerMethodField()
     class Meta:
         model = File
         fields = '__all__'
+        list_serializer_class = PresignedListSerializer
 
     @staticmethod
     def setup_eager_loading(queryset):
@@ -24,12 +26,12 @@ class FileSerializer(serializers.ModelSerializer):
     def get_presigned_url(self, object):
         if object.is_folder:
             return None
-        return S3().get_file(object.uri_key)
+        return self.presigned_url(object.uri_key)
 
     def get_preview_presigned_url(self, object):
-        if object.is_folder or not object.preview_uri_key:
+        if object.is_folder:
             return None
-        return S3().get_file(object.preview_uri_key)
+        return self.presigned_url(object.preview_uri_key)
 
     def get_uri_key(self, object):
         return object.uri_key if not object.is_folder else str(object.id)
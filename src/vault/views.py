@@ -9,7 +9,8 @@ if not TESTING:
 else:
     from mock_custom_storages import S3
 from django.db.models import F, Func
-from photos.pagination import DynamicPagination
+from photos.pagination import DynamicPagination, TimelinePagination
+from sticknet.projection import ProjectedListMixin
 
 
 class FileViewSet(viewsets.ModelViewSet):
@@ -57,27 +58,31 @@ class UploadFiles(APIView):
             folder = File.objects.get(user=request.user, id=folder_id)
         filesList = []
         album = None
-        for i in range(len(files)):
-            file = files[i]
-            name = trim_file_name(file['name'])
-            fileObject = File.objects.create(uri_key=file['uri_key'],
-                                             cipher=file['cipher'],
-                                             file_size=file['file_size'],
-                                             name=name,
-                                             type=file['type'],
-                                             duration=file['duration'],
-                                             folder=folder,
-                                             album=album,
-                                             is_photo=file['is_photo'],
-                                             created_at=file['created_at'],
-                                             user=request.user)
+        uploaded_size = 0
+        file_objects = []
+        for file in files:
+            fileObject = File(uri_key=file['uri_key'],
+                              cipher=file['cipher'],
+                              file_size=file['file_size'],
+                              name=trim_file_name(file['name']),
+                              type=file['type'],
+                              duration=file['duration'],
+                              folder=folder,
+                              album=album,
+                              is_photo=file['is_photo'],
+                              created_at=file['created_at'],
+                              user=request.user)
             if 'preview_uri_key' in file:
                 fileObject.preview_uri_key = file['preview_uri_key']
                 fileObject.preview_cipher = file['preview_cipher']
                 fileObject.preview_file_size = file['preview_file_size']
                 fileObject.width = file['width']
                 fileObject.height = file['height']
-                fileObject.save()
+                uploaded_size += file['preview_file_size']
+            uploaded_size += file['file_size']
+            file_objects.append(fileObject)
+        File.objects.bulk_create_named(file_objects)
+        for file, fileObject in zip(files, file_objects):
             item = {'id': fileObject.id,
                     'uri_key': file['uri_key'],
                     'cipher': file['cipher'],
@@ -98,10 +103,7 @@ class UploadFiles(APIView):
                 item['width'] = file['width']
                 item['height'] = file['height']
             filesList.append(item)
-            request.user.vault_storage += file['file_size']
-            if 'preview_uri_key' in file:
-                request.user.vault_storage += file['preview_file_size']
-        request.user.save()
+        request.user.add_vault_storage(uploaded_size)
         return Response(filesList)
 
 
@@ -117,23 +119,13 @@ class GetUploadUrls(APIView):
         if request.user.vault_storage + request.user.chat_storage + uploading_size >= max_space:
             return Response({'limit_reached': True})
         uri_keys_list = request.data['uri_keys']
-        total = len(uri_keys_list)
+        urls = S3().get_presigned_urls(
+            [key for item in uri_keys_list for key in (item['uri_key'], item['preview_uri_key'])])
         response = {}
-        for i in range(total):
-            preview_uri = None
-            uri = None
-            map_key = None
-            if uri_keys_list[i]['uri_key']:
-                uri_key = uri_keys_list[i]['uri_key']
-                uri = S3().get_presigned_url(uri_key)
-                map_key = uri_key
-            if uri_keys_list[i]['preview_uri_key']:
-                preview_uri_key = uri_keys_list[i]['preview_uri_key']
-                preview_uri = S3().get_presigned_url(preview_uri_key)
-                if map_key == None:
-                    map_key = preview_uri_key
-            response[map_key] = {'uri': uri,
-                                 'preview_uri': preview_uri}
+        for item in uri_keys_list:
+            map_key = item['uri_key'] or item['preview_uri_key']
+            response[map_key] = {'uri': urls.get(item['uri_key']),
+                                 'preview_uri': urls.get(item['preview_uri_key'])}
         return Response(response)
 
 
@@ -168,7 +160,7 @@ class CreateVaultAlbum(APIView):
         return Response({'id': album.id, 'timestamp': album.timestamp})
 
 
-class FetchFiles(generics.ListAPIView):
+class FetchFiles(ProjectedListMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = DynamicPagination
     serializer_class = FileSerializer
@@ -188,9 +180,9 @@ class FetchFiles(generics.ListAPIView):
         return files
 
 
-class FetchPhotos(generics.ListAPIView):
+class FetchPhotos(ProjectedListMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = DynamicPagination
+    pagination_class = TimelinePagination
     serializer_class = FileSerializer
 
     def get_queryset(self):
@@ -244,10 +236,8 @@ class DeleteFiles(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        files = File.objects.filter(id__in=request.data['ids'])
-        for file in files:
-            if file.user == request.user:
-                file.delete()
+        ids = File.objects.filter(id__in=request.data['ids'], user=request.user).values_list('id', flat=True)
+        File.objects.delete_tree(ids)
         return Response(status=status.HTTP_200_OK)
 
 
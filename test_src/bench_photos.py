@@ -0,0 +1,69 @@
+import os
+import time
+from unittest import mock
+from knox.models import AuthToken
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from users.models import User
+from photos.models import Image, Blob
+from django.conf import settings
+from django.core.cache import caches
+import custom_storages
+from sticknet import presigned_fields
+
+# Benchmarks are not part of the regular test run, run with:
+# cd test_src && python ../src/manage.py test --pattern="bench_*.py"
+
+STORJ_ENV = {'STORJ_ACCESS_KEY_ID': 'access', 'STORJ_SECRET_ACCESS_KEY': 'secret',
+             'STORJ_URL': 'https://gateway.example.com'}
+
+
+def set_up_user(self):
+    self.user = User.objects.create(username='alice123', phone='1', phone_hash='AX(*$', finished_registration=True)
+    self.auth_token = AuthToken.objects.create(self.user)
+    self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.auth_token[1])
+
+
+def client_per_instance(self):
+    self.client = custom_storages.boto3.client('s3',
+                                               'eu1',
+                                               aws_access_key_id=os.environ['STORJ_ACCESS_KEY_ID'],
+                                               aws_secret_access_key=os.environ['STORJ_SECRET_ACCESS_KEY'],
+                                               endpoint_url=os.environ['STORJ_URL'],
+                                               config=custom_storages.Config(signature_version='s3v4'))
+
+
+class ImageViewSetPresignBenchmark(APITestCase):
+    """
+    Serializes 1000 blobs (10 images x 100 blobs, 2000 presigned urls) through the ImageViewSet list endpoint, once
+    with a boto3 client built per S3() call, with the shared process-wide client, and with the presigned urls cached.
+    """
+
+    def setUp(self):
+        set_up_user(self)
+        for i in range(10):
+            image = Image.objects.create(user=self.user)
+            Blob.objects.bulk_create([Blob(image=image, uri_key='%d-%d' % (i, j), preview_uri_key='p-%d-%d' % (i, j))
+                                      for j in range(100)])
+        self.url = reverse('photos:images-list')
+
+    def run_list(self, cached=False):
+        if not cached:
+            caches[settings.PRESIGNED_URL_CACHE].clear()
+        start = time.perf_counter()
+        response = self.client.get(self.url)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(len(image['blobs']) for image in response.data['results']), 1000)
+        return elapsed
+
+    def test_benchmark(self):
+        with mock.patch.dict(os.environ, STORJ_ENV), mock.patch.object(custom_storages, '_client', None), \
+                mock.patch.object(presigned_fields, 'S3', custom_storages.S3):
+            with mock.patch.object(custom_storages.S3, '__init__', client_per_instance):
+                before = self.run_list()
+            self.run_list()  # warm up the shared client
+            after = self.run_list()
+            cached = self.run_list(cached=True)
+        print('\nImageViewSet, 1000 blobs: client per call %.3fs, shared client %.3fs (%.1fx), cached urls %.3fs (%.1fx)'
+              % (before, after, before / after, cached, before / cached))
@@ -0,0 +1,83 @@
+import base64
+import gzip
+import os
+import time
+import brotli
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from photos.models import Image
+from photos.serializers import ImageSerializer
+from sticknet.middleware import COMPRESSORS
+from sticknet.renderers import FastJSONRenderer
+from users.models import User
+
+# Benchmarks are not part of the regular test run, run with:
+# cd test_src && python ../src/manage.py test --pattern="bench_*.py"
+
+FIELDS = ('id', 'cipher', 'thumb_cipher', 'stick_id', 'uri', 'thumbnail', 'user', 'duration', 'file_size',
+          'youtube_thumbnail', 'text_photo', 'timestamp')
+
+
+def cipher(size=64):
+    return base64.b64encode(os.urandom(size)).decode()
+
+
+class RenderingBenchmark(SimpleTestCase):
+    """
+    Renders payloads shaped like the responses of FetchAllVaultCipher (2000 files and 200 notes), RefreshUser, an
+    ImageViewSet page with limit=1000 and Login (100 pre keys and 20 sender keys) with DRF's JSONRenderer and with
+    FastJSONRenderer, and reports the render time and the bytes on the wire uncompressed, with gzip and with brotli.
+    """
+
+    def setUp(self):
+        now = timezone.now()
+        user = User(id='user', username='alice123', name='Alice')
+        user.party_id = None
+        images = [Image(id=i, user=user, cipher=cipher(), thumb_cipher=cipher(), stick_id='%d0' % i, uri='uri%d' % i,
+                        timestamp=now) for i in range(1000)]
+        groups = [{'id': cipher(16), 'display_name': {'text': cipher(32), 'decrypted': False}, 'members_count': i,
+                   'is_admin': i % 2 == 0, 'group_cover': {'uri': 'uri%d' % i, 'cipher': cipher()},
+                   'timestamp': now} for i in range(20)]
+        self.payloads = {
+            'FetchAllVaultCipher': {
+                'files_cipher': [{'id': i, 'cipher': cipher(), 'preview_cipher': cipher()} for i in range(2000)],
+                'notes_cipher': [{'id': i, 'cipher': cipher()} for i in range(200)],
+                'profile': {'profile_picture_cipher': cipher()}},
+            'RefreshUser': {
+                'user': {'id': 'user', 'username': 'alice123', 'name': 'Alice', 'groups': groups, 'email': None,
+                         'phone': '+10000000000', 'date_joined': now, 'last_login': now, 'blocked_ids': [],
+                         'pnt_devices': [cipher(16) for i in range(3)], 'group_requests': [],
+                         'profile_picture': {'uri': 'uri', 'cipher': cipher()}, 'subscription': 'premium'},
+                'pre_keys_count': 100, 'unread_count': 3, 'firebase_token': cipher(600)},
+            'ImageViewSet limit=1000': {'next': None,
+                                        'results': ImageSerializer(images, many=True, fields=FIELDS).data},
+            'Login': {
+                'user': {'id': 'user', 'username': 'alice123', 'groups': groups, 'date_joined': now},
+                'token': cipher(32), 'firebase_token': cipher(600), 'correct': True, 'devices_count': 1,
+                'bundle': {'identity_key': {'public': cipher(33), 'cipher': cipher(), 'salt': cipher(16)},
+                           'signed_pre_key': {'public': cipher(33), 'cipher': cipher(), 'signature': cipher()},
+                           'pre_keys': [{'id': i, 'public': cipher(33), 'cipher': cipher(), 'salt': cipher(16)}
+                                        for i in range(100)],
+                           'DSKs': [{'stick_id': '%d0' % i, 'cipher': cipher(128)} for i in range(20)]}},
+        }
+
+    def run_timed(self, function, *args):
+        start = time.perf_counter()
+        for i in range(10):
+            result = function(*args)
+        return (time.perf_counter() - start) / 10 * 1000, result
+
+    def test_benchmark(self):
+        print()
+        for name, data in self.payloads.items():
+            before, expected = self.run_timed(JSONRenderer().render, data)
+            after, content = self.run_timed(FastJSONRenderer().render, data)
+            self.assertEqual(content, expected)
+            gzip_time, gzipped = self.run_timed(COMPRESSORS['gzip'], content)
+            br_time, brotlied = self.run_timed(COMPRESSORS['br'], content)
+            self.assertEqual(gzip.decompress(gzipped), content)
+            self.assertEqual(brotli.decompress(brotlied), content)
+            print('%s: render %.2fms -> %.2fms (%.1fx), %d bytes, gzip %d bytes (%.2fms), br %d bytes (%.2fms)'
+                  % (name, before, after, before / after, len(content), len(gzipped), gzip_time, len(brotlied),
+                     br_time))
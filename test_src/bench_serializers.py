@@ -0,0 +1,54 @@
+import time
+from unittest import mock
+from django.test import SimpleTestCase
+from photos.models import Image
+from photos.serializers import ImageSerializer
+from sticknet import dynamic_fields
+from users.models import User
+
+# Benchmarks are not part of the regular test run, run with:
+# cd test_src && python ../src/manage.py test --pattern="bench_*.py"
+
+FIELDS = ('id', 'cipher', 'thumb_cipher', 'stick_id', 'uri', 'thumbnail', 'user', 'duration', 'file_size',
+          'youtube_thumbnail', 'text_photo')
+
+
+class NoFieldSets(dict):
+    # Never keeps a compiled field set, i.e. every instance introspects the model like before the cache.
+    def __setitem__(self, key, value):
+        pass
+
+
+class DynamicFieldsBenchmark(SimpleTestCase):
+    """
+    Serializes 1000 unsaved images with a nested user, one serializer per object and once with many=True, with every
+    instance introspecting the model and with the compiled field sets.
+    """
+
+    def setUp(self):
+        self.images = []
+        for i in range(1000):
+            user = User(id=str(i), username='user%d' % i, name='User %d' % i)
+            user.party_id = None
+            self.images.append(Image(id=i, user=user, cipher='cipher', stick_id='stick_id'))
+
+    def run_serializers(self):
+        start = time.perf_counter()
+        for image in self.images:
+            ImageSerializer(image, fields=FIELDS).data
+        each = time.perf_counter() - start
+        start = time.perf_counter()
+        data = ImageSerializer(self.images, many=True, fields=FIELDS).data
+        many = time.perf_counter() - start
+        self.assertEqual(len(data), 1000)
+        self.assertEqual(data[0]['user']['username'], 'user0')
+        return each, many
+
+    def test_benchmark(self):
+        with mock.patch.object(dynamic_fields, 'FIELD_SETS', NoFieldSets()):
+            before_each, before_many = self.run_serializers()
+        self.run_serializers()  # compile the field sets
+        after_each, after_many = self.run_serializers()
+        print('\nImageSerializer, 1000 images: one serializer per image %.3fs -> %.3fs (%.1fx), many=True %.3fs -> '
+              '%.3fs (%.1fx)' % (before_each, after_each, before_each / after_each, before_many, after_many,
+                                 before_many / after_many))
@@ -1,3 +1,5 @@
+from io import StringIO
+from django.core.management import call_command
 from knox.models import AuthToken
 from users.models import User
 from chat.models import ChatFile, ChatAlbum, ChatAudio
@@ -37,6 +39,10 @@ class TestUploadChatFiles(APITestCase):
         response = self.client.post('/api/upload-chat-files/', {'files': files, 'stick_id': 'stick_id', 'message_id': 'message_id', 'is_media': True})
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data['files']), 2)
+        self.assertEqual(response.data['album']['photos_count'], 2)
+        self.assertEqual(response.data['album']['cover']['uri_key'], 'key2')
+        self.assertTrue(ChatFile.objects.get(uri_key='key2').is_album_cover)
+        self.assertEqual(User.objects.get(id=self.user.id).chat_storage, 330)
 
 class TestUploadChatAudio(APITestCase):
     def setUp(self):
@@ -115,6 +121,25 @@ class TestDeleteChatFiles(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(ChatFile.objects.filter(id__in=[self.chat_file_1.id, self.chat_file_2.id]).count(), 0)
 
+    def test_delete_whole_album(self):
+        album = ChatAlbum.objects.create(user=self.user, group=self.group, photos_count=3)
+        files = [ChatFile.objects.create(user=self.user, uri_key='album_key%d' % i, album=album, group=self.group)
+                 for i in range(3)]
+        response = self.client.post('/api/delete-chat-files/', {'ids': [file.id for file in files[:2]]})
+        self.assertFalse(response.data['is_album_deleted'])
+        self.assertEqual(response.data['cover']['uri_key'], 'album_key2')
+        self.assertEqual(ChatAlbum.objects.get(id=album.id).photos_count, 1)
+
+        album = ChatAlbum.objects.create(user=self.user, group=self.group, photos_count=3)
+        files = [ChatFile.objects.create(user=self.user, uri_key='key%d' % i, album=album, group=self.group)
+                 for i in range(3)]
+        response = self.client.post('/api/delete-chat-files/', {'ids': [file.id for file in files]})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_album_deleted'])
+        self.assertIsNone(response.data['cover'])
+        self.assertFalse(ChatAlbum.objects.filter(id=album.id).exists())
+        self.assertFalse(ChatFile.objects.filter(album=album.id).exists())
+
 class TestDeleteChatAudio(APITestCase):
     def setUp(self):
         set_up_user(self)
@@ -159,6 +184,45 @@ class TestFetchStorages(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('group_storages', response.data)
         self.assertIn('party_storages', response.data)
+
+    def test_storage_ledger(self):
+        out = StringIO()
+        call_command('reconcile_storage', '--fix', stdout=out)
+        self.assertIn('Found 1 drifted rooms and 1 drifted users, fixed', out.getvalue())
+        self.assertEqual(User.objects.get(id=self.user.id).chat_storage, 300)
+        response = self.client.get('/api/fetch-storages/')
+        self.assertEqual(response.data['group_storages'], [{'id': self.group.id, 'storage': 100}])
+        audio = {'uri_key': 'audio_key3', 'cipher': 'cipher3', 'file_size': 50, 'duration': 10}
+        self.client.post('/api/upload-chat-audio/', {'audio': audio, 'stick_id': 'stick_id', 'group_id': self.group.id})
+        self.client.post('/api/delete-chat-audio/', {'id': self.chat_audio_1.id})
+        response = self.client.get('/api/fetch-storages/')
+        self.assertEqual(response.data['group_storages'], [{'id': self.group.id, 'storage': 50}])
+        self.assertEqual(User.objects.get(id=self.user.id).chat_storage, 250)
+        out = StringIO()
+        call_command('reconcile_storage', stdout=out)
+        self.assertIn('Found 0 drifted rooms and 0 drifted users', out.getvalue())
+
+    def test_save_storage_counters(self):
+        # A stale user does not write back the counters
+        stale = User.objects.get(id=self.user.id)
+        User.objects.get(id=self.user.id).add_vault_storage(100)
+        stale.name = 'Alice'
+        stale.save()
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual((user.name, user.vault_storage), ('Alice', 100))
+
+        # Counters are only written when passed in update_fields
+        user.chat_storage = 10
+        user.save()
+        self.assertEqual(User.objects.get(id=self.user.id).chat_storage, 300)
+        stale.vault_storage = 5
+        stale.save(update_fields=['vault_storage'])
+        self.assertEqual(User.objects.get(id=self.user.id).vault_storage, 5)
+
+        # A new user is inserted with its counters
+        user = User(username='bob123', phone='2', chat_storage=7)
+        user.save()
+        self.assertEqual(User.objects.get(id=user.id).chat_storage, 7)
 #
 class TestFetchRoomFiles(APITestCase):
     def setUp(self):
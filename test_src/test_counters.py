@@ -0,0 +1,70 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from counters.models import UserCounters, GroupCounters
+from users.models import User
+from groups.models import Group
+from photos.models import Image, Blob, Album
+
+
+def counters(owner, *fields):
+    owner = type(owner).objects.select_related('counters').get(pk=owner.pk)
+    return tuple(getattr(owner.counters, field) for field in fields)
+
+
+class TestCounters(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create(username='alice', phone='1', phone_hash='1')
+        self.bob = User.objects.create(username='bob', phone='2', phone_hash='2')
+        self.group = Group.objects.create(id='group')
+
+    def test_memberships(self):
+        self.alice.groups.add(self.group)
+        self.alice.groups.add(self.group)
+        self.group.user_set.add(self.bob)
+        self.assertEqual(counters(self.group, 'members_count'), (2,))
+        self.assertEqual(counters(self.alice, 'groups_count'), (1,))
+        self.alice.groups.remove(self.group, Group.objects.create(id='other'))
+        self.assertEqual(counters(self.group, 'members_count'), (1,))
+        self.assertEqual(counters(self.alice, 'groups_count'), (0,))
+        self.bob.delete()
+        self.assertEqual(counters(self.group, 'members_count'), (0,))
+
+    def test_connections(self):
+        self.alice.connections.add(self.bob)
+        self.bob.connections.add(self.alice)
+        self.assertEqual(counters(self.alice, 'connections_count'), (1,))
+        self.bob.delete()
+        self.assertEqual(counters(self.alice, 'connections_count'), (0,))
+
+    def test_images(self):
+        image = Image.objects.create(user=self.alice, group=self.group, is_profile=True)
+        Blob.objects.create(image=image)
+        Blob.objects.create(image=image)
+        Album.objects.create(user=self.alice)
+        shared = Image.objects.create(user=self.alice)
+        shared.groups.add(self.group)
+        self.assertEqual(counters(self.alice, 'images_count', 'profile_photos_count', 'photos_count', 'albums_count'),
+                         (1, 1, 2, 1))
+        self.assertEqual(counters(self.group, 'shared_photos_count'), (1,))
+        image.is_profile = False
+        image.save()
+        image.delete()
+        shared.delete()
+        self.assertEqual(counters(self.alice, 'images_count', 'profile_photos_count', 'photos_count'), (0, 0, 0))
+        self.assertEqual(counters(self.group, 'shared_photos_count'), (0,))
+
+    def test_rebuild_counters(self):
+        self.alice.groups.add(self.group)
+        Image.objects.create(user=self.alice, group=self.group)
+        UserCounters.objects.filter(pk=self.alice.pk).update(groups_count=5)
+        GroupCounters.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('groups_count 5, counted 1', out.getvalue())
+        self.assertIn('Found 1 missing and 0 drifted group counters', out.getvalue())
+        call_command('rebuild_counters', '--fix', stdout=StringIO())
+        self.assertEqual(counters(self.alice, 'groups_count', 'images_count'), (1, 1))
+        self.assertEqual(counters(self.group, 'members_count'), (1,))
+        self.assertFalse(UserCounters.objects.drifted().exists())
@@ -1,6 +1,9 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from knox.models import AuthToken
 from users.models import User, Preferences
 from groups.models import Group, GroupCover, Cipher, GroupRequest, TempDisplayName
+from groups.serializers import GroupSerializer
 from notifications.models import Invitation
 from rest_framework.test import APITestCase
 from stick_protocol.models import EncryptionSenderKey, IdentityKey, Party
@@ -33,6 +36,44 @@ class TestFetchGroups(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['id'], 'abc')
 
+    def add_group(self, n):
+        group = Group.objects.create(id='group%d' % n, display_name=Cipher.objects.create(text='name', user=self.user),
+                                     cover=GroupCover.objects.create(stick_id='stick_id', cipher='cipher',
+                                                                     user=self.user))
+        self.user.groups.add(group)
+        for i in range(3):
+            member = User.objects.create(username='member%d_%d' % (n, i), phone='m%d_%d' % (n, i),
+                                         phone_hash='m%d_%d' % (n, i), one_time_id='ot%d_%d' % (n, i),
+                                         finished_registration=i > 0)
+            member.groups.add(group)
+            GroupRequest.objects.create(user=member, group=group)
+        User.objects.create(username='invited%d' % n, phone='i%d' % n, phone_hash='i%d' % n).invited_groups.add(group)
+        TempDisplayName.objects.create(group=group, from_user=member, to_user=self.user, cipher='cipher', stick_id='s')
+        if n % 2:
+            group.admins.add(self.user)
+
+    def test_fetch_groups_queries(self):
+        self.add_group(0)
+        self.client.get('/api/groups/')
+        with CaptureQueriesContext(connection) as one:
+            self.client.get('/api/groups/')
+        for n in range(1, 8):
+            self.add_group(n)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/api/groups/')
+        self.assertEqual(len(one), len(many))
+        groups = {group['id']: group for group in response.data['results']}
+        self.assertEqual(len(groups['group1']['members_ids']), 3)
+        self.assertEqual(len(groups['group1']['members_all_ids']), 4)
+        self.assertEqual((groups['group0']['requests_count'], groups['group1']['requests_count']), (0, 3))
+        self.assertEqual(groups['group1']['temp_display_name']['member_id'], User.objects.get(username='member1_2').id)
+        # The batched read path returns what the per-group queries return.
+        for group in Group.objects.filter(id__in=groups):
+            expected = GroupSerializer(group, context={'request': response.wsgi_request}).data
+            for field in ['members_ids', 'members_otids', 'members_all_ids', 'admins']:
+                self.assertCountEqual(groups[group.id].pop(field), expected.pop(field))
+            self.assertEqual(groups[group.id], expected)
+
 
 class TestCreateGroup(APITestCase):
     def setUp(self):
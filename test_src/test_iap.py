@@ -0,0 +1,73 @@
+import time
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from iap.expiry import sweep
+from iap.models import Transaction, ONE_DAY, GRACE_PERIOD, FREE_STORAGE
+from users.models import User
+from vault.models import File
+
+MB = 1024 * 1024
+
+
+def expired_ago(seconds):
+    return str(int(time.time() - seconds) * 1000)
+
+
+class TestSweep(TestCase):
+
+    def setUp(self):
+        self.users = {}
+        for name in ['active', 'expiring', 'ended', 'undated', 'whitelisted', 'basic']:
+            self.users[name] = User.objects.create(username=name, phone=name, phone_hash=name,
+                                                   subscription='basic' if name == 'basic' else 'premium',
+                                                   whitelist_premium=name == 'whitelisted')
+        self.transaction('active', str(int(time.time() + ONE_DAY) * 1000))
+        self.transaction('expiring', expired_ago(ONE_DAY))
+        self.transaction('ended', expired_ago(GRACE_PERIOD + ONE_DAY))
+        self.transaction('whitelisted', expired_ago(GRACE_PERIOD + ONE_DAY))
+        self.transaction('basic', expired_ago(GRACE_PERIOD + ONE_DAY))
+
+    def transaction(self, name, expires_date_ms):
+        return Transaction.objects.create(user=self.users[name], success=True, expires_date_ms=expires_date_ms)
+
+    def state(self, name):
+        user = User.objects.get(id=self.users[name].id)
+        return user.subscription, user.subscription_expiring
+
+    def test_expires_ms(self):
+        self.assertEqual(Transaction.objects.get(user=self.users['expiring']).expires_ms,
+                         int(expired_ago(ONE_DAY)))
+        self.assertIsNone(Transaction.objects.create(user=self.users['active'], success=False).expires_ms)
+
+    def test_sweep(self):
+        # An undated (failed) transaction made after the latest dated one does not count as an expiry.
+        Transaction.objects.create(user=self.users['active'], success=False)
+        self.assertEqual(sweep(), {'expiring': 1, 'downgraded': 2, 'trimmed': 0})
+        self.assertEqual(self.state('active'), ('premium', False))
+        self.assertEqual(self.state('expiring'), ('premium', True))
+        self.assertEqual(self.state('ended'), ('basic', False))
+        self.assertEqual(self.state('undated'), ('basic', False))
+        self.assertEqual(self.state('whitelisted'), ('premium', False))
+        self.assertEqual(sweep(), {'expiring': 0, 'downgraded': 0, 'trimmed': 0})
+
+    def test_trim(self):
+        user = self.users['ended']
+        files = [File.objects.create(user=user, name='%d.jpg' % i, uri_key='key%d' % i, file_size=300 * MB,
+                                     preview_uri_key='preview%d' % i, preview_file_size=MB) for i in range(5)]
+        File.objects.create(user=user, name='folder', is_folder=True)
+        User.objects.filter(id=user.id).update(vault_storage=5 * 301 * MB, chat_storage=100 * MB)
+        self.assertEqual(sweep()['trimmed'], 2)
+        self.assertEqual(set(File.objects.filter(user=user, is_folder=False)), set(files[:3]))
+        user.refresh_from_db()
+        self.assertEqual(user.vault_storage, 3 * 301 * MB)
+        self.assertLessEqual(user.storage_used(), FREE_STORAGE)
+
+    def test_queries(self):
+        sweep()
+        with CaptureQueriesContext(connection) as queries:
+            sweep()
+        for i in range(20):
+            User.objects.create(username='basic%d' % i, phone='basic%d' % i, phone_hash='basic%d' % i)
+        with self.assertNumQueries(len(queries)):
+            sweep()
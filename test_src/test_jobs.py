@@ -0,0 +1,103 @@
+from datetime import timedelta
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import DatabaseBroker, backoff, enqueue, task_path
+from jobs.tasks import send_email
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+
+
+def fail():
+    raise Exception('failed')
+
+
+def outlive_lease():
+    # The job's lease expires while it runs and another worker claims it again.
+    calls.append(Job.objects.get(task=task_path(outlive_lease)).attempts)
+    if len(calls) == 1:
+        Job.objects.filter(task=task_path(outlive_lease)).update(run_at=timezone.now() - timedelta(hours=1))
+        calls.append(Job.objects.get(args=['b']).status)
+        DatabaseBroker().run_pending(1)
+
+
+class TestDatabaseBroker(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        self.broker = DatabaseBroker()
+
+    def test_run(self):
+        self.broker.enqueue(task_path(record), ['a'])
+        self.broker.enqueue(task_path(record), ['b'], delay=60)
+        self.assertEqual(self.broker.run_pending(), 1)
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(Job.objects.get(args=['a']).status, Job.DONE)
+        self.assertEqual(Job.objects.get(args=['b']).status, Job.PENDING)
+
+    def test_idempotency_key(self):
+        self.broker.enqueue(task_path(record), ['a'], key='record:a')
+        self.broker.enqueue(task_path(record), ['a'], key='record:a')
+        self.assertEqual(Job.objects.count(), 1)
+        self.broker.run_pending()
+        self.broker.enqueue(task_path(record), ['a'], key='record:a')
+        self.assertEqual(self.broker.run_pending(), 0)
+        self.assertEqual(calls, ['a'])
+
+    def test_retry(self):
+        job = self.broker.enqueue(task_path(fail), [], max_attempts=2)
+        self.broker.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=backoff(1) - 5))
+        self.assertEqual(self.broker.run_pending(), 0)
+        Job.objects.update(run_at=timezone.now())
+        self.broker.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('failed', job.last_error)
+
+    def test_expired_lease(self):
+        Job.objects.create(task=task_path(record), args=['a'], status=Job.RUNNING, attempts=1,
+                           run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.broker.run_pending(), 1)
+        self.assertEqual(calls, ['a'])
+
+    def test_outlived_lease(self):
+        job = self.broker.enqueue(task_path(outlive_lease), [])
+        self.broker.enqueue(task_path(record), ['b'])
+        self.assertEqual(self.broker.run_pending(), 2)
+        # The next job of the batch is only leased once it starts, the attempt that lost its lease is not saved.
+        self.assertEqual(calls, [1, Job.PENDING, 2, 'b'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+
+class TestImmediateBroker(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_idempotency_key(self):
+        # Keys are recorded in the test's transaction, so every test starts without any.
+        enqueue(record, 'a', key='record:a')
+        enqueue(record, 'a', key='record:a')
+        enqueue(record, 'b', key='record:b')
+        self.assertEqual(calls, ['a', 'b'])
+
+    def test_idempotency_key_again(self):
+        enqueue(record, 'a', key='record:a')
+        self.assertEqual(calls, ['a'])
+
+    def test_failure(self):
+        self.assertRaises(Exception, enqueue, fail)
+
+    def test_send_email(self):
+        enqueue(send_email, 'Subject', '<p>Hello</p>', 'no-reply@sticknet.org', ['alice@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].body, 'Hello')
@@ -3,7 +3,8 @@ from users.models import User, LimitedAccessToken, Device, Preferences
 from rest_framework.test import APITestCase
 from stick_protocol.models import EncryptionSenderKey, IdentityKey, SignedPreKey, PreKey, DecryptionSenderKey, Party, \
     PendingKey
-from groups.models import Group, Cipher
+from groups.models import Group, Cipher, GroupCover
+from keys.views import get_groups_dsks
 from knox.crypto import create_token_string, hash_token, create_salt_string
 from photos.models import Image
 
@@ -389,6 +390,38 @@ class TestLogin(APITestCase):
         self.assertEqual(len(bundle['pre_keys']), 2)
         self.assertEqual(len(bundle['sender_keys']), 1)
 
+
+class TestGroupsDSKs(APITestCase):
+    def setUp(self):
+        set_up_user(self)
+        self.user_1 = User.objects.create(id='111', phone='+555', username='bob123', finished_registration=True)
+        self.ik = IdentityKey.objects.create(key_id=1, public='ik_public', cipher='ik_cipher', user=self.user_1,
+                                             salt='ik_salt', active=True, timestamp=999)
+
+    def add_groups(self, start, count):
+        for i in range(start, start + count):
+            display_name = Cipher.objects.create(text='text', user=self.user_1, stick_id='name-%d' % i)
+            cover = GroupCover.objects.create(stick_id='cover-%d' % i, cipher='cipher', user=self.user_1)
+            group = Group.objects.create(id='group-%d' % i, chat_id='chat-%d' % i, display_name=display_name,
+                                         cover=cover)
+            self.user.groups.add(group)
+            for stick_id in ['name-%d' % i, 'cover-%d' % i]:
+                pre_key = PreKey.objects.create(key_id=i, public='pk', cipher='pk', user=self.user, salt='pk')
+                DecryptionSenderKey.objects.create(key='key', stick_id=stick_id, of_user=self.user_1,
+                                                   for_user=self.user, identity_key=self.ik, pre_key=pre_key)
+
+    def test_constant_queries(self):
+        self.add_groups(0, 1)
+        with self.assertNumQueries(2):
+            dsks = get_groups_dsks(self.user)
+        self.assertEqual([dsk['stick_id'] for dsk in dsks], ['name-0', 'cover-0'])
+        self.add_groups(1, 49)
+        with self.assertNumQueries(2):
+            dsks = get_groups_dsks(self.user)
+        self.assertEqual(len(dsks), 100)
+        self.assertEqual({dsk['sender_id'] for dsk in dsks}, {self.user_1.id})
+
+
 class TestChangePassword(APITestCase):
     # TODO: important to update (vault cipher)
     def setUp(self):
@@ -0,0 +1,84 @@
+import time
+from io import StringIO
+from unittest.mock import patch
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase
+from iap.models import Transaction, ONE_DAY, FREE_STORAGE
+from mailer import mailing
+from mailer.mailing import CompiledTemplate, run_mailing
+from mailer.models import Mailing
+from users.models import User
+
+
+class TestMailer(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user%d' % i, phone=str(i), phone_hash=str(i), name='User %d' % i,
+                                          email='user%d@example.com' % i) for i in range(5)]
+        User.objects.create(username='no_email', phone='9', phone_hash='9')
+
+    def test_compiled_template(self):
+        template = CompiledTemplate('grace_period.html', ['name_of_user', 'end_date'])
+        html, text = template.render({'name_of_user': '<b>Alice</b>', 'end_date': '01 January 2030'})
+        self.assertIn('Hey &lt;b&gt;Alice&lt;/b&gt;,', html)
+        self.assertIn('after the date of 01 January 2030 will', html)
+        self.assertIn('Hey <b>Alice</b>,', text)
+        self.assertNotIn('mailer', html)
+
+    def test_run_mailing(self):
+        item = Mailing.objects.create(key='update', audience='everyone', template='update.html', subject='Update',
+                                      from_email='no-reply@sticknet.org')
+        with patch.object(mailing, 'BATCH_SIZE', 2):
+            run_mailing(item.id)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(user.email for user in self.users))
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.sent), (Mailing.DONE, 5))
+        self.assertEqual(item.cursor, mailing.everyone().order_by('id').last().id)
+        run_mailing(item.id)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_resume(self):
+        item = Mailing.objects.create(key='update', audience='everyone', template='update.html', subject='Update',
+                                      from_email='no-reply@sticknet.org')
+        send_messages = EmailBackend.send_messages
+        batches = []
+
+        def fail_second_batch(backend, messages):
+            batches.append(messages)
+            if len(batches) == 2:
+                raise Exception('connection lost')
+            return send_messages(backend, messages)
+
+        with patch.object(mailing, 'BATCH_SIZE', 2), patch.object(EmailBackend, 'send_messages', fail_second_batch):
+            with self.assertRaises(Exception):
+                run_mailing(item.id)
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.sent), (Mailing.RUNNING, 2))
+        with patch.object(mailing, 'BATCH_SIZE', 2):
+            run_mailing(item.id)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(user.email for user in self.users))
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.sent), (Mailing.DONE, 5))
+
+    def test_grace_period(self):
+        expires = str((int(time.time()) - ONE_DAY) * 1000)
+        for user in self.users[:2]:
+            Transaction.objects.create(user=user, success=True, expires_date_ms=expires)
+        User.objects.filter(id__in=[user.id for user in self.users[:3]]) \
+            .update(subscription='premium', subscription_expiring=True)
+        User.objects.filter(id__in=[user.id for user in self.users[1:]]).update(vault_storage=FREE_STORAGE + 1)
+        item = Mailing.objects.create(key='grace_period', audience='grace_period', template='grace_period.html',
+                                      subject='Sticknet: Premium subscription expired',
+                                      from_email='support@sticknet.org')
+        run_mailing(item.id)
+        self.assertEqual([message.to for message in mail.outbox], [[self.users[1].email]])
+        self.assertIn('Hey User 1,', mail.outbox[0].body)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('send_mailing', 'update', '--template', 'update.html', '--subject', 'Update', stdout=out)
+        self.assertIn('Mailing update done, sent 5 emails', out.getvalue())
+        call_command('send_mailing', 'update', stdout=out)
+        self.assertEqual(len(mail.outbox), 5)
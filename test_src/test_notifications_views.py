@@ -1,9 +1,19 @@
+import os, time
+from concurrent import futures
+from types import SimpleNamespace
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from knox.models import AuthToken
 from users.models import User
-from groups.models import Group, GroupRequest
-from notifications.models import Invitation
-from rest_framework.test import APITestCase
+from groups.models import Cipher, Group, GroupCover, GroupRequest
+from photos.models import Album, Blob, Image, Note
+from notifications.models import Invitation, PNToken, Broadcast
+from notifications import push_notifications
+from rest_framework.test import APITestCase, APITransactionTestCase
+from sticknet import settings
 from notifications.models import Notification, ConnectionRequest
+from notifications.serializers import NotificationSerializer
 
 
 def set_up_user(self):
@@ -34,6 +44,40 @@ class TestNotificationViewSet(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['id'], 1)
 
+    def add_notification(self, n):
+        bob = User.objects.get(id='1')
+        group = Group.objects.create(id='group%d' % n, display_name=Cipher.objects.create(text='group', user=bob),
+                                     cover=GroupCover.objects.create(stick_id='stick_id', cipher='cipher', user=bob))
+        album = Album.objects.create(user=bob, title=Cipher.objects.create(text='title', user=bob),
+                                     location=Cipher.objects.create(text='location', user=bob))
+        image = Image.objects.create(user=bob, album=album)
+        image.groups.add(group)
+        Blob.objects.create(image=image, uri_key='key%d' % n)
+        Blob.objects.create(image=image, preview_uri_key='preview%d' % n)
+        note = Note.objects.create(image=image, user=bob, is_reply=True, reply_to=self.user, reaction='H')
+        notification = Notification.objects.create(to_user=self.user, from_user=bob, image=image, album=album,
+                                                   group=group, note=note, body='body', channel='channel')
+        notification.shared_photos.add(image, Image.objects.create(user=bob))
+
+    def test_notification_queries(self):
+        self.add_notification(0)
+        self.client.get('/api/notifications/')
+        with CaptureQueriesContext(connection) as one:
+            self.client.get('/api/notifications/')
+        for n in range(1, 10):
+            self.add_notification(n)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/api/notifications/')
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(len(response.data['results']), 10)
+        result = response.data['results'][0]
+        self.assertEqual((result['blobs_length'], len(result['images_ids'])), (2, 2))
+        self.assertEqual(result['reply_to']['id'], self.user.id)
+        self.assertEqual((result['image']['album']['images_count'], len(result['image']['groups_ids'])), (1, 1))
+        # The prefetched page serializes like notifications loaded one by one.
+        notification = Notification.objects.get(id=result['id'])
+        self.assertEqual(result, NotificationSerializer(notification, context={'request': response.wsgi_request}).data)
+
 
 class TestInvitationViewSet(APITestCase):
     def setUp(self):
@@ -111,3 +155,112 @@ class TestConnReqRes(APITestCase):
         self.assertEqual(ConnectionRequest.objects.filter(id=44).exists(), False)
 
 
+class FakeMessaging:
+    """
+    Local stand-in for the FCM transport. Every send_all call takes `latency` seconds and reports the tokens starting
+    with 'stale' as unregistered.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.batches = []
+
+    def send_all(self, messages):
+        time.sleep(self.latency)
+        self.batches.append(len(messages))
+        return self.respond([message.token for message in messages])
+
+    def send_multicast(self, message):
+        time.sleep(self.latency)
+        self.batches.append(len(message.tokens))
+        return self.respond(message.tokens)
+
+    def respond(self, tokens):
+        return SimpleNamespace(responses=[
+            SimpleNamespace(success=False, exception=Exception('Requested entity was not found.'))
+            if token.startswith('stale') else SimpleNamespace(success=True, exception=None)
+            for token in tokens])
+
+
+class TestPushNotification(APITransactionTestCase):
+    def setUp(self):
+        set_up_user(self)
+        members = User.objects.bulk_create([User(id=str(i), username='user%d' % i, phone='+%d' % i,
+                                                 finished_registration=True) for i in range(500)])
+        PNToken.objects.bulk_create([PNToken(user=member, device_id=member.id,
+                                             fcm_token=('stale' if i < 10 else 'token') + member.id,
+                                             platform='ios' if i % 5 == 0 else 'android')
+                                     for i, member in enumerate(members)])
+        PNToken.objects.create(user=self.user, device_id='sender', fcm_token='sender')
+        self.to_user = [self.user.id] + [member.id for member in members]
+
+    def test_group_post(self):
+        fake, batches = FakeMessaging(latency=1), []
+        deliver = push_notifications.deliver
+
+        def capture(*args):
+            batches.extend(deliver(*args))
+            return batches
+
+        with mock.patch.object(push_notifications, 'deliver', capture), \
+                mock.patch.object(push_notifications.messaging, 'send_all', fake.send_all, create=True):
+            start = time.perf_counter()
+            response = self.client.post('/api/push-notification/', {
+                'to_user': self.to_user,
+                'data': {'title': 'title', 'body': 'body', 'channel_id': 'post_channel'}})
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(time.perf_counter() - start, fake.latency)
+
+            futures.wait(batches)
+        # 500 android messages + 100 ios messages, sent concurrently in batches of at most 500
+        self.assertEqual(sorted(fake.batches), [100, 500])
+        self.assertLess(time.perf_counter() - start, 2 * fake.latency)
+        self.assertEqual(PNToken.objects.filter(fcm_token__startswith='stale').count(), 0)
+        self.assertEqual(PNToken.objects.count(), 491)
+
+
+class TestCustomPushNotification(APITestCase):
+    def setUp(self):
+        token = os.environ['SERVER_ADMIN_TOKEN_DEBUG' if settings.DEBUG else 'SERVER_ADMIN_TOKEN_PROD']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        PNToken.objects.bulk_create([PNToken(device_id=str(i), fcm_token=('stale' if i < 10 else 'token') + str(i),
+                                             platform='ios' if i % 4 == 0 else 'android') for i in range(1200)])
+        self.data = {'title': 'title', 'body': 'body', 'channelId': 'other_channel'}
+
+    def test_broadcast(self):
+        fake = FakeMessaging(latency=0)
+        with mock.patch.object(push_notifications.messaging, 'send_multicast', fake.send_multicast, create=True):
+            response = self.client.post('/api/custom-pn/', {'data': self.data})
+        # 900 android tokens in chunks of at most 500, and 2 messages to each of the 300 ios tokens
+        self.assertEqual(sorted(fake.batches), [300, 300, 400, 500])
+        progress = self.client.get('/api/custom-pn/?id=%d' % response.data['id']).data
+        self.assertEqual(progress['status'], Broadcast.DONE)
+        self.assertEqual((progress['total'], progress['processed']), (1200, 1200))
+        # 3 of the stale tokens are ios ones, which get 2 messages each
+        self.assertEqual((progress['sent'], progress['failed'], progress['pruned']), (1487, 13, 10))
+        self.assertEqual(PNToken.objects.count(), 1190)
+
+    def test_resume(self):
+        fake = FakeMessaging(latency=0)
+        calls = []
+
+        def crash_on_second_window(message):
+            calls.append(message)
+            if len(calls) > 3:
+                raise Exception('FCM unavailable')
+            return fake.send_multicast(message)
+
+        broadcast = Broadcast.objects.create(data=self.data, total=1200)
+        with mock.patch.object(push_notifications, 'BROADCAST_WINDOW', 500), \
+                mock.patch.object(push_notifications.messaging, 'send_multicast', crash_on_second_window, create=True):
+            self.assertRaises(Exception, push_notifications.run_broadcast, broadcast.id)
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.processed), (Broadcast.RUNNING, 500))
+        fake.batches.clear()
+        with mock.patch.object(push_notifications, 'BROADCAST_WINDOW', 500), \
+                mock.patch.object(push_notifications.messaging, 'send_multicast', fake.send_multicast, create=True):
+            push_notifications.run_broadcast(broadcast.id)
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.processed), (Broadcast.DONE, 1200))
+        # Only the tokens after the first window are sent again.
+        self.assertEqual(sum(fake.batches), 700 + 175)
@@ -1,9 +1,17 @@
+from unittest import mock
+from django.test import SimpleTestCase
 from knox.models import AuthToken
 from users.models import User, Preferences
-from photos.models import Image, Album, Blob, Note
+from photos.models import Image, ImageVisibility, Album, Blob, Note
 from groups.models import Group
+from notifications.models import Notification
 from rest_framework.test import APITestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from stick_protocol.models import EncryptionSenderKey, IdentityKey, Party
+from photos.serializers import ImageSerializer
+from sticknet import dynamic_fields
+from mock_custom_storages import S3
 
 # Important Note: "photos" models is deprecated
 def set_up_user(self):
@@ -89,6 +97,100 @@ class TestImageViewSetGet(APITestCase):
         self.assertEqual(response.data['results'][2]['id'], '2')
         self.assertEqual(response.data['results'][3]['id'], '1')
 
+    def test_keyset_pagination(self):
+        response = self.client.get('/api/images/?cursor=&limit=2')
+        self.assertNotIn('count', response.data)
+        self.assertEqual([image['id'] for image in response.data['results']], ['4', '3'])
+
+        # a new image does not shift the next page
+        Image.objects.create(id=9, user=self.user)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([image['id'] for image in response.data['results']], ['2', '1'])
+        self.assertEqual(response.data['next'], None)
+
+        response = self.client.get('/api/images/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_presigned_urls(self):
+        for image_id in [1, 2]:
+            Blob.objects.bulk_create([Blob(image_id=image_id, uri_key='%d-%d' % (image_id, i),
+                                           preview_uri_key='p-%d-%d' % (image_id, i)) for i in range(3)])
+        sign = lambda s3, keys, time=3600: {key: 'url:' + key for key in keys}
+        with mock.patch.object(S3, 'get_files', autospec=True, side_effect=sign) as get_files:
+            response = self.client.get('/api/images/')
+        # One batch for the whole page
+        self.assertEqual(get_files.call_count, 1)
+        blobs = [blob for image in response.data['results'] for blob in image['blobs']]
+        self.assertEqual(sorted((blob['presigned_url'], blob['preview_presigned_url']) for blob in blobs),
+                         [('url:%d-%d' % (image_id, i), 'url:p-%d-%d' % (image_id, i)) for image_id in [1, 2]
+                          for i in range(3)])
+
+
+class TestImageVisibility(APITestCase):
+    def setUp(self):
+        set_up_user(self)
+        set_up_images(self)
+
+    def get_ids(self):
+        response = self.client.get('/api/images/')
+        return [image['id'] for image in response.data['results']]
+
+    def test_index_maintenance(self):
+        # unblock
+        self.user.blocked.remove(User.objects.get(username='will123'))
+        self.assertEqual(self.get_ids(), ['6', '4', '3', '2', '1'])
+
+        # unhide
+        self.user.hidden_images = []
+        self.user.save()
+        self.assertEqual(self.get_ids(), ['8', '6', '4', '3', '2', '1'])
+
+        # leave group
+        self.user.groups.remove('abc123')
+        self.assertEqual(self.get_ids(), ['4', '3', '1'])
+
+        # share with a connection
+        user_2 = User.objects.get(username='charles123')
+        image_9 = Image.objects.create(user=user_2, id=9)
+        self.assertEqual(self.get_ids(), ['4', '3', '1'])
+        image_9.connections.add(self.user)
+        self.assertEqual(self.get_ids(), ['9', '4', '3', '1'])
+
+        # deactivate
+        user_2.is_active = False
+        user_2.save()
+        self.assertEqual(self.get_ids(), ['4', '3', '1'])
+
+    def test_group_membership(self):
+        group = Group.objects.get(id='abc123')
+        user = User.objects.create(phone='+111', username='dave123', finished_registration=True)
+        Image.objects.create(id=10, user=user, party_id=Party.objects.create(user=user).id)
+        self.assertEqual(self.get_ids(), ['4', '3', '2', '1'])
+
+        user.groups.add(group)
+        self.assertEqual(self.get_ids(), ['10', '4', '3', '2', '1'])
+        self.assertEqual(set(ImageVisibility.objects.filter(user=user).values_list('image_id', flat=True)),
+                         {2, 6, 7, 8, 10})
+
+        group.user_set.remove(user)
+        self.assertEqual(self.get_ids(), ['4', '3', '2', '1'])
+        self.assertEqual(set(ImageVisibility.objects.filter(user=user).values_list('image_id', flat=True)), {10})
+
+    def test_group_membership_queries(self):
+        group = Group.objects.get(id='abc123')
+
+        def join(username):
+            user = User.objects.create(phone=username, username=username, finished_registration=True)
+            Image.objects.create(user=user, party_id=Party.objects.create(user=user).id)
+            with CaptureQueriesContext(connection) as queries:
+                user.groups.add(group)
+            return len(queries)
+
+        queries = join('user0')
+        for i in range(1, 20):
+            join('user%d' % i)
+        self.assertEqual(join('user20'), queries)
+
 
 class TestImageViewSetDelete(APITestCase):
     def setUp(self):
@@ -373,6 +475,17 @@ class TestGroupSharedImages(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['id'], '2')
 
+    def test_seen_by_page(self):
+        group = Group.objects.get(id='abc123')
+        for i in range(100, 125):
+            Image.objects.create(id=i).groups.add(group)
+        self.client.get('/api/group-shared-images/?id=abc123')
+        seen = Image.objects.filter(seen_by=self.user)
+        self.assertEqual(seen.count(), 10)
+        self.client.get('/api/group-shared-images/?id=abc123')
+        self.client.get('/api/group-shared-images/?id=abc123&page=2')
+        self.assertEqual(seen.count(), 20)
+
 
 class TestSharedImages(APITestCase):
     def setUp(self):
@@ -566,6 +679,15 @@ class TestReactionsCount(APITestCase):
         self.assertEqual(response.data['likes_count'], 1)
         self.assertEqual(len(response.data['liked_by']), 1)
 
+    def test_reaction_count_read(self):
+        Notification.objects.create(id=1, to_user=self.user, image_id=1)
+        Notification.objects.create(id=2, to_user=self.user, image_id=1)
+        Notification.objects.create(id=3, to_user=self.user, image_id=1, read=True)
+        response = self.client.get('/api/reactions-count/?q=1&type=image')
+        self.assertEqual(response.data['count'], 2)
+        self.assertCountEqual(response.data['ids'], [1, 2])
+        self.assertFalse(Notification.objects.filter(read=False).exists())
+
 # TODO: test all cases
 class TestToggleLike(APITestCase):
     def setUp(self):
@@ -581,6 +703,44 @@ class TestToggleLike(APITestCase):
 
 
 
+class TestUploadImagesQueries(APITestCase):
+    def setUp(self):
+        set_up_user(self)
+        self.group = Group.objects.create(id='abc123')
+        self.user.groups.add(self.group)
+        self.user_1 = User.objects.create(phone='+555', username='bob123', finished_registration=True)
+        self.user.connections.add(self.user_1)
+
+    def share(self, prefix, count):
+        body = {'type': 'share', 'is_profile': 'false', 'party_id': 'party', 'stick_id': 'stick', 'caption': '',
+                'share_ext': 'false', 'groups_id': [self.group.id], 'connections_id': [self.user_1.id],
+                'uri_key': ['%s-%d' % (prefix, i) for i in range(count)], 'cipher': ['cipher'] * count,
+                'size': ['S'] * count, 'width': ['100'] * count, 'height': ['100'] * count,
+                'duration': ['0'] * count, 'asset_size': ['10'] * count, 'media_type': ['image/jpeg'] * count}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/upload-images/', body, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_blobs(self):
+        self.share('warm-up', 1)
+        one = self.share('a', 1)
+        hundred = self.share('b', 100)
+        self.assertEqual(one, hundred)
+        self.assertEqual(Blob.objects.filter(image__user=self.user).count(), 102)
+        self.assertEqual(User.objects.get(id=self.user.id).vault_storage, 1020)
+        image = Image.objects.get(blobs__uri_key='b-0')
+        self.assertEqual(list(image.groups.values_list('id', flat=True)), [self.group.id])
+        self.assertEqual(list(image.connections.values_list('id', flat=True)), [self.user_1.id])
+
+    def test_malformed_payload(self):
+        body = {'type': 'share', 'is_profile': 'false', 'party_id': 'party', 'stick_id': 'stick', 'caption': '',
+                'share_ext': 'false', 'uri_key': ['a', 'b'], 'cipher': ['cipher'], 'size': ['S'], 'width': ['100'],
+                'height': ['100'], 'duration': ['0'], 'asset_size': ['10'], 'media_type': ['image/jpeg']}
+        response = self.client.post('/api/upload-images/', body, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Image.objects.count(), 0)
+
 
 # import io
 # from PIL import Image as PILImage
@@ -613,3 +773,14 @@ class TestToggleLike(APITestCase):
 #         response = self.client.post('/api/images/', body, format='multipart')
 #         self.assertIn('id', response.data)
 #         print('USERX', response.data['user'])
+
+
+class TestDynamicFields(SimpleTestCase):
+
+    def test_field_sets(self):
+        with mock.patch.object(dynamic_fields, 'FIELD_SETS', {}):
+            for i in range(50):
+                fields = ImageSerializer(fields=('id', 'cipher', 'unknown%d' % i)).fields
+                self.assertEqual(list(fields), ['id', 'cipher'])
+            self.assertEqual(len(dynamic_fields.FIELD_SETS), 2)
+            self.assertIn('uri', ImageSerializer().fields)
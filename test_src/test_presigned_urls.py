@@ -0,0 +1,79 @@
+from unittest import mock
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from mock_custom_storages import S3
+from users.models import User, ProfilePicture
+from users.serializers import UserBaseSerializer
+from vault.models import File
+from vault.serializers import FileSerializer
+import presigned_urls
+
+
+class TestPresignedUrlCache(SimpleTestCase):
+
+    def setUp(self):
+        caches[settings.PRESIGNED_URL_CACHE].clear()
+        presigned_urls.reset_stats()
+
+    def test_hit_and_miss(self):
+        s3 = S3()
+        with mock.patch.object(S3, 'sign', wraps=s3.sign) as sign:
+            self.assertEqual(s3.get_file('a'), 'http://example.com/presigned_url')
+            self.assertEqual(s3.get_files(['a', 'b', None]), {'a': 'http://example.com/presigned_url',
+                                                               'b': 'http://example.com/presigned_url'})
+            self.assertEqual(sign.call_args_list[0][0][0], ['a'])
+            self.assertEqual(sign.call_args_list[1][0][0], ['b'])
+        self.assertEqual(presigned_urls.get_stats(), {'hits': 1, 'misses': 2})
+
+    def test_safety_margin(self):
+        s3 = S3()
+        s3.get_file('a')
+        with mock.patch('presigned_urls.now', return_value=presigned_urls.now() + 3600 - 299):
+            s3.get_file('a')
+        self.assertEqual(presigned_urls.get_stats(), {'hits': 0, 'misses': 2})
+
+    def test_expires_in(self):
+        s3 = S3()
+        s3.get_file('a')
+        s3.get_file('a', 7 * 24 * 3600)
+        s3.get_file('a', 7 * 24 * 3600)
+        s3.get_file('a')
+        self.assertEqual(presigned_urls.get_stats(), {'hits': 2, 'misses': 2})
+
+    @override_settings(PRESIGNED_URL_SAFETY_MARGIN=3600)
+    def test_short_lived_urls_not_cached(self):
+        s3 = S3()
+        s3.get_file('a')
+        s3.get_file('a')
+        self.assertEqual(presigned_urls.get_stats(), {'hits': 0, 'misses': 2})
+
+
+class TestPresignedFields(SimpleTestCase):
+
+    def setUp(self):
+        caches[settings.PRESIGNED_URL_CACHE].clear()
+        self.user = User(id='user', username='alice123')
+        self.user.profile_picture = ProfilePicture(id=1, uri_key='uri', preview_uri_key='preview')
+
+    def test_batch(self):
+        files = [File(id=i, user=self.user, uri_key='key%d' % i, preview_uri_key='preview%d' % i if i else None)
+                 for i in range(3)] + [File(id=3, user=self.user, is_folder=True)]
+        with mock.patch.object(S3, 'get_files', wraps=S3().get_files) as get_files:
+            data = FileSerializer(files, many=True).data
+            self.assertEqual(get_files.call_args_list, [mock.call(['key0', 'key1', 'preview1', 'key2', 'preview2'])])
+            self.assertEqual([(file['presigned_url'], file['preview_presigned_url']) for file in data],
+                             [('http://example.com/presigned_url', None)] +
+                             [('http://example.com/presigned_url', 'http://example.com/presigned_url')] * 2 +
+                             [(None, None)])
+
+            # Nested serializers are signed with the outermost one
+            get_files.reset_mock()
+            data = UserBaseSerializer([self.user] * 2, many=True, fields=('id', 'profile_picture')).data
+            self.assertEqual(get_files.call_args_list, [mock.call(['uri', 'preview'] * 2)])
+            self.assertEqual(data[1]['profile_picture']['preview_presigned_url'], 'http://example.com/presigned_url')
+            self.assertIsNone(data[1]['profile_picture']['self_presigned_url'])
+
+            get_files.reset_mock()
+            self.assertEqual(FileSerializer(files[0]).data['presigned_url'], 'http://example.com/presigned_url')
+            self.assertEqual(get_files.call_count, 1)
@@ -0,0 +1,71 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Func
+from django.test import TestCase
+from knox.models import AuthToken
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from chat.models import ChatAlbum, ChatFile
+from chat.serializers import ChatFileSerializer
+from groups.models import Group
+from photos.serializers import ImageSerializer
+from sticknet.projection import Projection
+from users.models import User
+from vault.models import File, VaultAlbum
+from vault.serializers import FileSerializer
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+class TestProjectedEndpoints(APITestCase):
+    """
+    The projected list endpoints return the same JSON as their serializers.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username='alice123', phone='1', phone_hash='AX(*$', finished_registration=True)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + AuthToken.objects.create(self.user)[1])
+        self.folder = File.objects.create(user=self.user, folder_type='home', name='Home', is_folder=True)
+        album = VaultAlbum.objects.create(user=self.user, name='Album')
+        for i in range(12):
+            File.objects.create(user=self.user, name='File %d.jpg' % i, folder=self.folder, uri_key='key%d' % i,
+                                preview_uri_key='preview%d' % i if i % 2 else None, is_photo=i % 3 == 0,
+                                album=album if i % 4 == 0 else None, file_size=i * 1000, created_at=i + 0.5,
+                                cipher='cipher', duration=i / 3)
+        File.objects.create(user=self.user, name='folder', folder=self.folder, is_folder=True)
+
+    def assertSameJSON(self, response, queryset, serializer_class):
+        self.assertEqual(response.status_code, 200)
+        expected = serializer_class(queryset, many=True, context={'request': response.wsgi_request}).data
+        self.assertEqual(render(response.data['results']), render(expected))
+
+    def test_fetch_files(self):
+        files = File.objects.filter(folder=self.folder).annotate(lower_name=Func(F('name'), function='LOWER')) \
+            .order_by('-is_folder', 'lower_name')
+        self.assertSameJSON(self.client.get('/api/fetch-files/?folder_id=home'), files[:10], FileSerializer)
+        self.assertSameJSON(self.client.get('/api/fetch-files/?folder_id=home&page=2'), files[10:], FileSerializer)
+
+    def test_fetch_photos(self):
+        photos = File.objects.filter(user=self.user, is_photo=True).order_by('-timestamp', '-id')
+        response = self.client.get('/api/fetch-photos/?album_id=recents&cursor=&limit=2')
+        self.assertSameJSON(response, photos[:2], FileSerializer)
+        response = self.client.get(response.data['next'])
+        self.assertSameJSON(response, photos[2:4], FileSerializer)
+
+    def test_fetch_album_photos(self):
+        group = Group.objects.create(id='group')
+        self.user.groups.add(group)
+        album = ChatAlbum.objects.create(user=self.user, group=group)
+        for i in range(3):
+            ChatFile.objects.create(user=self.user, album=album, group=group, uri_key='key%d' % i, stick_id='stick_id',
+                                    preview_uri_key='preview%d' % i if i else None, created_at=i + 0.5)
+        response = self.client.get('/api/fetch-album-photos/?q=%d' % album.id)
+        self.assertSameJSON(response, ChatFile.objects.filter(album=album).order_by('-timestamp'), ChatFileSerializer)
+
+
+class TestProjection(TestCase):
+
+    def test_unsupported_fields(self):
+        with self.assertRaises(ImproperlyConfigured):
+            Projection(ImageSerializer)
@@ -0,0 +1,91 @@
+import datetime
+import gzip
+import uuid
+import brotli
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from photos.models import Image
+from photos.serializers import ImageSerializer
+from sticknet.middleware import CompressionMiddleware, accepted_encoding
+from sticknet.renderers import FastJSONRenderer
+from users.models import User
+
+FIELDS = ('id', 'cipher', 'stick_id', 'user', 'duration', 'file_size', 'timestamp')
+
+
+class TestFastJSONRenderer(SimpleTestCase):
+
+    def assertSameJSON(self, data, accepted_media_type=None):
+        self.assertEqual(FastJSONRenderer().render(data, accepted_media_type),
+                         JSONRenderer().render(data, accepted_media_type))
+
+    def test_types(self):
+        self.assertSameJSON({'id': 1, 'name': 'Émile \u2028\u2029', 'size': 1.5, 'timestamp': 1600000000000.5,
+                             'none': None, 'ok': True, 'list': [1, 'a'], 'tuple': (1, 2), 1: 'key',
+                             'aware': timezone.now(), 'naive': datetime.datetime.now(),
+                             'date': datetime.date.today(), 'time': datetime.time(1, 2, 3, 4000),
+                             'uuid': uuid.uuid4()})
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_serializer(self):
+        user = User(id='user', username='alice123', name='Alice')
+        user.party_id = None
+        images = [Image(id=i, user=user, cipher='cipher', timestamp=timezone.now()) for i in range(3)]
+        self.assertSameJSON(ImageSerializer(images, many=True, fields=FIELDS).data)
+
+    def test_indent(self):
+        self.assertSameJSON({'a': [1, 2]}, 'application/json; indent=4')
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class TestCompressionMiddleware(SimpleTestCase):
+
+    def setUp(self):
+        self.content = b'{"cipher":"%s"}' % (b'abc' * 100)
+
+    def get(self, response, accept_encoding=None):
+        request = RequestFactory().get('/', **({'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding else {}))
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accepted_encoding(self):
+        self.assertEqual(accepted_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(accepted_encoding('gzip'), 'gzip')
+        self.assertEqual(accepted_encoding('br;q=0.5, gzip;q=1.0'), 'gzip')
+        self.assertEqual(accepted_encoding('br;q=0, gzip;q=0'), None)
+        self.assertEqual(accepted_encoding('*'), 'br')
+        self.assertEqual(accepted_encoding('deflate'), None)
+        self.assertEqual(accepted_encoding(''), None)
+
+    def test_brotli(self):
+        response = self.get(HttpResponse(self.content, content_type='application/json'), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(brotli.decompress(response.content), self.content)
+
+    def test_gzip(self):
+        response = HttpResponse(self.content, content_type='application/json')
+        response['ETag'] = '"etag"'
+        response = self.get(response, 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"etag"')
+        self.assertEqual(gzip.decompress(response.content), self.content)
+
+    def test_uncompressed(self):
+        response = self.get(HttpResponse(self.content), None)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.content)
+        # Too small
+        response = self.get(HttpResponse(b'{"ok":true}'), 'br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+        # Already encoded
+        response = HttpResponse(self.content)
+        response['Content-Encoding'] = 'identity'
+        self.assertEqual(self.get(response, 'br').content, self.content)
+        # Streaming
+        response = self.get(StreamingHttpResponse([self.content]), 'br')
+        self.assertFalse(response.has_header('Content-Encoding'))
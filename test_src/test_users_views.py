@@ -3,10 +3,14 @@ from unittest.mock import MagicMock
 from knox.crypto import create_token_string, hash_token, create_salt_string
 from knox.models import AuthToken
 from users.models import User, AppSettings, LimitedAccessToken, Preferences, Device, EmailVerification
-from photos.models import Image
-from groups.models import Cipher
+from users.serializers import UserSerializer
+from photos.models import Image, Album, Blob, Note
+from groups.models import Cipher, Group, GroupRequest
+from notifications.models import Notification, PNToken, ConnectionRequest
 from rest_framework.test import APITestCase
-from stick_protocol.models import EncryptionSenderKey, IdentityKey
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from stick_protocol.models import EncryptionSenderKey, IdentityKey, Party
 
 
 def set_up_user(self):
@@ -111,6 +115,50 @@ class TestRefreshUser(APITestCase):
         self.assertIn('pre_keys_count', response.data)
         self.assertIn('unread_count', response.data)
 
+    def add_rows(self, n):
+        for i in range(n):
+            user = User.objects.create(username='user%s_%s' % (n, i), phone='%s_%s' % (n, i),
+                                       phone_hash='%s_%s' % (n, i))
+            image = Image.objects.create(user=self.user, group=self.group if i % 2 else None, is_profile=i == 0)
+            Blob.objects.create(image=image)
+            Note.objects.create(user=self.user, image=image)
+            Album.objects.create(user=self.user)
+            Notification.objects.create(to_user=self.user, read=i % 2 == 0)
+            ConnectionRequest.objects.create(from_user=user, to_user=self.user)
+            PNToken.objects.create(user=self.user, device_id='device%s_%s' % (n, i))
+            self.user.blocked.add(user)
+            self.user.connections.add(user)
+            group = Group.objects.create(id='request%s_%s' % (n, i), display_name=Cipher.objects.create(text='x'))
+            GroupRequest.objects.create(user=self.user, group=group,
+                                        display_name=Cipher.objects.create(text='name', stick_id='stick_id'))
+
+    def test_refresh_user_queries(self):
+        self.group = Group.objects.create(id='group', display_name=Cipher.objects.create(text='group', user=self.user))
+        self.user.groups.add(self.group)
+        Party.objects.create(id='party', user=self.user)
+        Party.objects.create(id='room', user=self.user, individual=True)
+        self.client.get('/api/refresh-user/')
+        self.add_rows(1)
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get('/api/refresh-user/')
+        self.add_rows(20)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/api/refresh-user/')
+        self.assertEqual(len(one), len(many))
+        user = response.data['user']
+        self.assertEqual((user['photos_count'], user['notes_count'], user['albums_count'], user['cr_count']),
+                         (21, 21, 21, 21))
+        self.assertEqual((user['images_count'], user['shared_count'], user['profile_photos_count']), (10, 11, 2))
+        self.assertEqual((user['party_id'], user['room_id']), ('party', 'room'))
+        self.assertEqual(len(user['blocked_ids']), 21)
+        self.assertEqual(len(user['group_requests']), 21)
+        self.assertEqual(response.data['unread_count'], 10)
+        # The aggregate read path returns what the per-field queries return.
+        expected = UserSerializer(User.objects.get(id=self.user.id), context={'request': response.wsgi_request}).data
+        for field in ['blocked_ids', 'pnt_devices', 'group_requests']:
+            self.assertCountEqual(user.pop(field), expected.pop(field))
+        self.assertEqual(user, expected)
+
 
 class TestUserSearch(APITestCase):
     def setUp(self):
@@ -397,10 +445,27 @@ class TestToggleHideImage(APITestCase):
         self.assertEqual(updated_user.hidden_images, [])
 
 
-
-
-
-
-
-
-
+class TestConnectionsPartiesIds(APITestCase):
+    def setUp(self):
+        set_up_user(self)
+        self.group = Group.objects.create(id='abc123')
+        self.user.groups.add(self.group)
+
+    def add_connections(self, start, total):
+        for i in range(start, start + total):
+            user = User.objects.create(phone='+%d' % i, username='user%d' % i, finished_registration=True)
+            Party.objects.create(user=user)
+            Party.objects.create(user=user, individual=True)
+            if i % 2:
+                user.groups.add(self.group)
+            else:
+                user.connections.add(self.user)
+
+    def test_query_count(self):
+        self.add_connections(0, 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(self.user.get_connections_parties_ids())), 4)
+
+        self.add_connections(4, 16)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(self.user.get_connections_parties_ids())), 20)
@@ -1,7 +1,11 @@
+import base64
 from knox.models import AuthToken
 from users.models import User, Preferences
 from vault.models import File, VaultAlbum, VaultNote
 from rest_framework.test import APITestCase
+import mock_custom_storages
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 def set_up_user(self):
     self.user = User.objects.create(username='alice123', phone='1', phone_hash='AX(*$', finished_registration=True)
@@ -35,6 +39,24 @@ class TestUploadFiles(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 2)
 
+    def upload(self, prefix, count):
+        files = [{'uri_key': '%s-%d' % (prefix, i), 'cipher': 'cipher', 'file_size': 1, 'name': 'IMG_0001.jpg',
+                  'type': 'image', 'duration': 0, 'is_photo': True, 'created_at': 1234} for i in range(count)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/upload-files/', {'files': files, 'folder_id': 'home'})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_upload_duplicate_names(self):
+        response, one = self.upload('a', 1)
+        self.assertEqual(response.data[0]['name'], 'IMG_0001.jpg')
+        response, many = self.upload('b', 200)
+        self.assertEqual(one, many)
+        self.assertEqual([file['name'] for file in response.data],
+                         ['IMG_0001(%d).jpg' % i for i in range(2, 202)])
+        home = File.objects.get(user=self.user, folder_type='home')
+        self.assertEqual(File.objects.filter(folder=home, name__startswith='IMG_0001').count(), 201)
+
 class TestGetUploadUrls(APITestCase):
     def setUp(self):
         set_up_user(self)
@@ -96,6 +118,26 @@ class TestFetchPhotos(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data['results']), 2)
 
+    def test_keyset_null_timestamps(self):
+        photos = [File.objects.create(user=self.user, name='photo%d.jpg' % i, is_photo=True, uri_key='key%d' % i)
+                  for i in range(3)]
+        File.objects.filter(id__in=[photos[0].id, photos[1].id]).update(timestamp=None)
+        ids = []
+        response = self.client.get('/api/fetch-photos/?album_id=recents&cursor=&limit=1')
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [photo['id'] for photo in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, [photos[1].id, photos[0].id, photos[2].id, self.file_4.id, self.file_3.id])
+
+    def test_invalid_cursor(self):
+        for cursor in ['2024-01-01T00:00:00|abc', '|abc', 'abc|1']:
+            cursor = base64.urlsafe_b64encode(cursor.encode()).decode()
+            response = self.client.get('/api/fetch-photos/?album_id=recents&cursor=' + cursor)
+            self.assertEqual(response.status_code, 404)
+
 class TestFetchVaultAlbums(APITestCase):
     def setUp(self):
         set_up_user(self)
@@ -145,6 +187,26 @@ class TestDeleteFiles(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(File.objects.filter(id__in=[self.file_1.id, self.file_2.id]).count(), 0)
 
+    def test_delete_folder_tree(self):
+        User.objects.filter(id=self.user.id).update(vault_storage=3000)
+        parent = self.file_5
+        keys = []
+        for depth in range(3):
+            File.objects.bulk_create([File(user=self.user, folder=parent, name='%d-%d' % (depth, i),
+                                           uri_key='key-%d-%d' % (depth, i), file_size=1) for i in range(600)])
+            keys += ['key-%d-%d' % (depth, i) for i in range(600)]
+            parent = File.objects.create(user=self.user, folder=parent, name='folder-%d' % depth, is_folder=True)
+        s3 = mock_custom_storages.get_client()
+        s3.delete_objects.reset_mock()
+        response = self.client.post('/api/delete-files/', {'ids': [self.file_5.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(File.objects.filter(name__startswith='folder-').exists())
+        self.assertEqual(File.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(User.objects.get(id=self.user.id).vault_storage, 1200)
+        batches = [call[1]['Delete']['Objects'] for call in s3.delete_objects.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [1000, 800])
+        self.assertEqual(sorted(object['Key'] for batch in batches for object in batch), sorted(keys))
+
 class TestFetchHomeItems(APITestCase):
     def setUp(self):
         set_up_user(self)